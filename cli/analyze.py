@@ -1,4 +1,8 @@
 import click
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from internal.common.pipeline import DEFAULT_QUEUE_SIZE, OrderedEmitter, prefetch
 
 @click.command()
 @click.option('--org', multiple=True, help='Specific organizations to collect')
@@ -13,7 +17,37 @@ import click
 @click.option('--failed-only', is_flag=True, help='Only show violated policies')
 @click.option('--scm', default='github', type=click.Choice(['github', 'gitlab']), help='Source Control Management system')
 @click.option('--ignore-policies-file', help='Path to a file containing newline separated policy names to ignore')
-def analyze(org, repo, enterprise, token, output_format, output_scheme, policies_path, namespace, scorecard, failed_only, scm, ignore_policies_file):
+@click.option('--policy', multiple=True, help='Only evaluate this policy (rule name or title); can be repeated')
+@click.option('--min-severity', type=click.Choice(['LOW', 'MEDIUM', 'HIGH', 'CRITICAL'], case_sensitive=False), help='Only evaluate policies of at least this severity')
+@click.option('--opa-mode', default='eval', type=click.Choice(['eval', 'server', 'wasm']), help='OPA evaluation backend: "opa eval" subprocesses, a long-lived local "opa run --server", or in-process Wasm (requires wasmtime)')
+@click.option('--eval-batch-size', default=100, type=click.IntRange(min=1), help='Number of repositories evaluated per OPA query')
+@click.option('--eval-workers', default=1, type=click.IntRange(min=1), help='Number of concurrent OPA evaluations')
+@click.option('--concurrency', default=8, type=click.IntRange(min=1), help='Number of concurrent per-repository API calls during collection')
+@click.option('--graphql-enrichment', is_flag=True, help='Fetch vulnerability alert status and rulesets for batches of repositories via GraphQL, using REST only for the rest')
+@click.option('--http-pool-size', default=10, type=click.IntRange(min=1), help='Maximum number of pooled keep-alive connections to the GitHub API')
+@click.option('--http-cache-dir', envvar='LEGITIFY_HTTP_CACHE_DIR', help='Directory for an ETag cache of GitHub REST responses (disabled if not set)')
+@click.option('--http-cache-size', default=256, type=click.IntRange(min=1), help='Maximum size of the HTTP cache in MB')
+@click.option('--policy-cache-dir', envvar='LEGITIFY_POLICY_CACHE_DIR', help='Directory for compiled policy bundles (default: ~/.cache/legitify/policies)')
+@click.option('--no-policy-cache', is_flag=True, help='Load the raw policy files on every evaluation instead of a cached compiled bundle')
+@click.option('--incremental-state', envvar='LEGITIFY_INCREMENTAL_STATE', help='State file for incremental scans: repositories unchanged since the previous run reuse its violations')
+@click.option('--org-concurrency', default=4, type=click.IntRange(min=1), help='Number of organizations analyzed in parallel')
+@click.option('--namespace-concurrency', default=2, type=click.IntRange(min=1), help='Number of namespaces collected in parallel within each organization')
+@click.option('--pipeline-queue-size', default=200, type=click.IntRange(min=1), help='Maximum number of collected repositories waiting for evaluation')
+@click.option('--snapshot-out', help='Also write every collected entity to this snapshot directory for later offline evaluation')
+@click.option('--from-snapshot', help='Evaluate a snapshot directory written by --snapshot-out instead of collecting (no token or network needed)')
+@click.option('--incremental-max-age', default=7.0, type=click.FloatRange(min=0), help='Days after which an unchanged repository is rescanned anyway')
+@click.option('--extra-token', multiple=True, envvar='SCM_EXTRA_TOKENS', help='Additional GitHub token to spread requests over, as TOKEN or ORG=TOKEN to use it for one organization only (repeatable)')
+@click.option('--no-eval-memo', is_flag=True, help='Evaluate every entity even when the policies would see the same input as an earlier one')
+@click.option('--eval-memo-dir', envvar='LEGITIFY_EVAL_MEMO_DIR', help='Directory to keep memoized evaluation results in across runs (in memory only if not set)')
+@click.option('--eval-memo-size', default=256, type=click.IntRange(min=1), help='Maximum size of the evaluation memo directory in MB')
+@click.option('--eval-memo-time-window', default=24.0, type=click.FloatRange(min=0), help='Hours for which results of clock-dependent policies (e.g. stale secrets) may be reused; 0 never reuses them')
+@click.option('--checkpoint', envvar='LEGITIFY_CHECKPOINT', help='File to record finished organization namespaces and repository pages in, for --resume')
+@click.option('--resume', is_flag=True, help='Continue the --org scan recorded in --checkpoint instead of starting over')
+@click.option('--work-queue', envvar='LEGITIFY_WORK_QUEUE', help='SQLite work queue file shared by a distributed scan (see --queue-role)')
+@click.option('--queue-role', type=click.Choice(['coordinator', 'worker', 'merge']), help='With --work-queue: queue the scan units, run queued units, or print the combined report')
+@click.option('--queue-lease', default=600, type=click.IntRange(min=10), help='Seconds a worker holds a unit before it is handed to another worker (extended while the worker is alive)')
+@click.option('--github-app', multiple=True, help='GitHub App installation to mint tokens for, as APP_ID:INSTALLATION_ID:PRIVATE_KEY_FILE (repeatable, requires PyJWT)')
+def analyze(org, repo, enterprise, token, output_format, output_scheme, policies_path, namespace, scorecard, failed_only, scm, ignore_policies_file, policy, min_severity, opa_mode, eval_batch_size, eval_workers, concurrency, graphql_enrichment, http_pool_size, http_cache_dir, http_cache_size, policy_cache_dir, no_policy_cache, incremental_state, incremental_max_age, org_concurrency, namespace_concurrency, pipeline_queue_size, snapshot_out, from_snapshot, no_eval_memo, eval_memo_dir, eval_memo_size, eval_memo_time_window, checkpoint, resume, work_queue, queue_role, queue_lease, extra_token, github_app):
     """Analyze GitHub/GitLab organization or repository for security issues."""
     from internal.common.namespace import Namespace, validate_namespaces, ALL_NAMESPACES
     from internal.common.config import ConfigManager
@@ -35,12 +69,70 @@ def analyze(org, repo, enterprise, token, output_format, output_scheme, policies
         "scorecard": scorecard,
         "failed_only": failed_only,
         "scm": scm,
-        "ignore_policies_file": ignore_policies_file
+        "ignore_policies_file": ignore_policies_file,
+        "policy": policy,
+        "min_severity": min_severity,
+        "opa_mode": opa_mode,
+        "eval_batch_size": eval_batch_size,
+        "eval_workers": eval_workers,
+        "concurrency": concurrency,
+        "graphql_enrichment": graphql_enrichment,
+        "http_pool_size": http_pool_size,
+        "http_cache_dir": http_cache_dir,
+        "http_cache_size": http_cache_size,
+        "policy_cache_dir": policy_cache_dir,
+        "no_policy_cache": no_policy_cache,
+        "incremental_state": incremental_state,
+        "incremental_max_age": incremental_max_age,
+        "org_concurrency": org_concurrency,
+        "namespace_concurrency": namespace_concurrency,
+        "pipeline_queue_size": pipeline_queue_size,
+        "snapshot_out": snapshot_out,
+        "from_snapshot": from_snapshot,
+        "no_eval_memo": no_eval_memo,
+        "eval_memo_dir": eval_memo_dir,
+        "eval_memo_size": eval_memo_size,
+        "eval_memo_time_window": eval_memo_time_window,
+        "checkpoint": checkpoint,
+        "resume": resume,
+        "work_queue": work_queue,
+        "queue_role": queue_role,
+        "queue_lease": queue_lease,
+        "extra_token": extra_token,
+        "github_app": github_app
     }
     config_manager.set_args(args_dict)
     config = config_manager.get_config()
 
-    if not config.token:
+    if config.from_snapshot and config.snapshot_out:
+        click.echo("Error: Cannot use --from-snapshot and --snapshot-out options together.")
+        return
+
+    if config.snapshot_out and config.incremental_state:
+        # Unchanged repositories are never collected, so they could not be written out
+        click.echo("Error: Cannot use --snapshot-out and --incremental-state options together.")
+        return
+
+    if config.resume and not config.checkpoint:
+        click.echo("Error: --resume requires --checkpoint.")
+        return
+
+    if config.checkpoint and (config.repos or config.snapshot_out or config.from_snapshot or config.incremental_state
+                              or config.work_queue or config.scm_type != "github"):
+        click.echo("Error: --checkpoint only supports GitHub --org scans without snapshots, incremental state or a work queue.")
+        return
+
+    if bool(config.work_queue) != bool(config.queue_role):
+        click.echo("Error: --work-queue and --queue-role must be used together.")
+        return
+
+    if config.work_queue and (config.snapshot_out or config.from_snapshot or config.incremental_state
+                              or config.scm_type != "github"):
+        click.echo("Error: --work-queue only supports GitHub scans without snapshots or incremental state.")
+        return
+
+    merging = config.queue_role == "merge"
+    if not config.token and not config.from_snapshot and not merging and not (config.scm_type == "github" and config.github_apps):
         click.echo("Error: Token is required. Set SCM_TOKEN environment variable or use --token.")
         return
 
@@ -59,7 +151,10 @@ def analyze(org, repo, enterprise, token, output_format, output_scheme, policies
 
     from internal.common.scm_type import ScmType
     from internal.opa.opa_engine import OpaEngine
+    from internal.opa.bundle_cache import DEFAULT_CACHE_DIR
     from internal.opa.skipper import Skipper
+    from internal.opa.collection_plan import CollectionPlan, unknown_policies
+    from internal.opa.policy_metadata import MetadataIndex
     from internal.outputer.base_outputer import ConsoleOutputer
     import os
 
@@ -67,154 +162,620 @@ def analyze(org, repo, enterprise, token, output_format, output_scheme, policies
     final_policies_path = config.policies_path
     if final_policies_path == './policies':
         final_policies_path = os.path.join(os.getcwd(), 'policies')
+        # The default tree has one directory per SCM, and their packages and rule names overlap
+        scm_policies_path = os.path.join(final_policies_path, config.scm_type)
+        if os.path.isdir(scm_policies_path):
+            final_policies_path = scm_policies_path
     
-    skipper = Skipper(config.ignore_policies_file)
+    cache_dir = None
+    if config.policy_cache:
+        cache_dir = config.policy_cache_dir or DEFAULT_CACHE_DIR
+
+    skipper = Skipper(config.ignore_policies_file, policies=config.policies, min_severity=config.min_severity)
+
+    policy_plan = None
+    if not merging:
+        for name in unknown_policies(final_policies_path, config.policies):
+            click.echo(f"Warning: --policy {name} matches no policy rule name or title", err=True)
+        policy_plan = CollectionPlan.from_policies(final_policies_path, skipper)
+        if not policy_plan.enabled_packages:
+            click.echo("Error: No policy is left to evaluate after applying --policy, --min-severity and the ignore file.")
+            return
     
-    click.echo(f"Starting analysis...")
+    click.echo(f"Starting analysis...", err=True)
     
+    engine = None
+    snapshot = None
+    outputer = None
+    failed = False
     try:
-        # Initialize Engine
-        engine = OpaEngine(final_policies_path)
-        all_violations = []
-        
-        if config.scm_type == ScmType.GITHUB:
-             _analyze_github(config, namespaces_to_run, engine, all_violations, skipper)
-        elif config.scm_type == ScmType.GITLAB:
-             _analyze_gitlab(config, namespaces_to_run, engine, all_violations, skipper)
+        # Initialize Engine; merging a work queue only prints results that were already evaluated
+        if not merging:
+            engine = OpaEngine(final_policies_path, mode=config.opa_mode, batch_size=config.eval_batch_size,
+                               cache_dir=cache_dir, workers=config.eval_workers, memo=config.eval_memo,
+                               memo_dir=config.eval_memo_dir, memo_max_bytes=config.eval_memo_size * 1024 * 1024,
+                               memo_time_window=config.eval_memo_time_window)
+            # Disabled rules are left out of the OPA queries altogether
+            engine.select_rules(policy_plan.enabled_rules)
 
-        # Output
-        # Filter failed only
-        if config.failed_only:
-             all_violations = [v for v in all_violations if v.get("status") == "FAILED" or True] 
-             pass 
+        if config.work_queue and not merging:
+            # Coordinators and workers only write to the queue; the report comes from the merge step
+            if config.queue_role == "coordinator":
+                _coordinate_work_queue(config, namespaces_to_run, engine, skipper, policy_plan)
+            else:
+                _run_work_queue_worker(config, engine, skipper, policy_plan)
+            return
 
+        # Violations only name their rule; the outputer adds the full METADATA from the index
+        metadata = engine.metadata_cache if engine else MetadataIndex.from_policies(final_policies_path)
         if config.output_format == 'sarif':
              from internal.outputer.sarif_outputer import SarifOutputter
-             outputer = SarifOutputter()
-             outputer.print_violations(all_violations)
+             outputer = SarifOutputter(metadata=metadata)
         else:
-             outputer = ConsoleOutputer(output_format=config.output_format)
-             outputer.print_violations(all_violations)
+             outputer = ConsoleOutputer(output_format=config.output_format, metadata=metadata)
+
+        # Violations go to the outputer as soon as they are evaluated, from any collection thread
+        outputer.begin()
+        emit = _synchronized(outputer.emit)
+
+        if merging:
+             _merge_work_queue(config.work_queue, emit)
+        elif config.from_snapshot:
+             _analyze_snapshot(config.from_snapshot, namespaces_to_run, engine, emit, skipper)
+        elif config.scm_type == ScmType.GITHUB:
+             if config.snapshot_out:
+                 from internal.common.snapshot import SnapshotWriter
+                 snapshot = SnapshotWriter(config.snapshot_out, scm=config.scm_type)
+             # A snapshot is meant for trying other policies later, so it keeps every field
+             plan = None if snapshot else policy_plan
+             _analyze_github(config, namespaces_to_run, engine, emit, skipper, snapshot, plan)
+        elif config.scm_type == ScmType.GITLAB:
+             _analyze_gitlab(config, namespaces_to_run, engine, emit, skipper)
 
     except Exception as e:
-        click.echo(f"Error during analysis: {e}")
+        failed = True
+        click.echo(f"Error during analysis: {e}", err=True)
         import traceback
         traceback.print_exc()
+    finally:
+        # Results may already be streamed; always close the report so stdout stays well-formed
+        if outputer:
+            outputer.end()
+        if snapshot:
+            # A failed scan still leaves what it collected, marked as incomplete
+            snapshot.close(complete=not failed)
+        if engine:
+            if engine.memo:
+                click.echo(engine.memo.report(), err=True)
+            engine.close()
+    if failed:
+        raise SystemExit(1)
+
+def _synchronized(func):
+    lock = threading.Lock()
+    def wrapper(*args, **kwargs):
+        with lock:
+            return func(*args, **kwargs)
+    return wrapper
 
-def _analyze_repos(repos, engine, all_violations, skipper):
+def _repo_inputs(repos):
     for r in repos:
         input_data = {
             "repository": r.model_dump(by_alias=True),
             "hooks": [h.model_dump() for h in r.hooks],
             "collaborators": r.collaborators
         }
-        violations = engine.eval(input_data, package="repository")
-        for v in violations:
-            if skipper.should_skip(v.get("policyName", "")) or skipper.should_skip(v.get("rule", "")):
-                continue
-            v["target"] = r.name
-            all_violations.append(v)
+        yield r, input_data
 
-def _analyze_github(config, namespaces_to_run, engine, all_violations, skipper):
-    from internal.clients.github_client import GitHubClient
+def _add_violations(violations, target, emit, skipper):
+    for v in violations:
+        if skipper.should_skip_violation(v):
+            continue
+        v["target"] = target
+        emit(v)
+
+def _eval_entity(engine, package, target, input_data, emit, skipper, snapshot=None):
+    if snapshot:
+        snapshot.write(package, target, input_data)
+    _add_violations(engine.eval(input_data, package=package), target, emit, skipper)
+
+def _snapshot_inputs(inputs, snapshot):
+    for repo, input_data in inputs:
+        snapshot.write("repository", repo.name, input_data)
+        yield repo, input_data
+
+def _analyze_repos(repos, engine, emit, skipper, state=None, org=None, snapshot=None):
+    inputs = _repo_inputs(repos)
+    if snapshot:
+        inputs = _snapshot_inputs(inputs, snapshot)
+    for repo, violations in engine.eval_many(inputs, package="repository"):
+        if state:
+            state.record(org, repo, violations)
+        _add_violations(violations, repo.name, emit, skipper)
+
+def _analyze_snapshot(path, namespaces_to_run, engine, emit, skipper):
+    from internal.common.snapshot import SnapshotReader
+    import click
+
+    reader = SnapshotReader(path)
+    if not reader.complete:
+        click.echo(f"Warning: snapshot {path} was written by a scan that failed; its results are incomplete", err=True)
+    click.echo(f"Evaluating snapshot {path}...", err=True)
+    for namespace in reader.namespaces():
+        if namespace not in namespaces_to_run:
+            continue
+        click.echo(f"  - Evaluating {reader.manifest['counts'][namespace]} {namespace} entities...", err=True)
+        for target, violations in engine.eval_many(reader.entries(namespace), package=namespace):
+            _add_violations(violations, target, emit, skipper)
+
+def _changed_repos(repo_collector, org, state, seen_ids):
+    # Only repositories whose change markers moved are enriched again; the rest carry their stored violations
+    for page in repo_collector.pages():
+        changed = []
+        for r in page:
+            seen_ids.append(r.id)
+            if state.is_unchanged(org, r):
+                yield r, state.violations(r)
+            else:
+                changed.append(r)
+        repo_collector.enrich(changed)
+        for r in changed:
+            yield r, None
+
+def _repos_to_evaluate(items, emit, skipper):
+    for repo, stored_violations in items:
+        if stored_violations is None:
+            yield repo
+        else:
+            _add_violations(stored_violations, repo.name, emit, skipper)
+
+def _analyze_org_repos_incremental(repo_collector, org, engine, emit, skipper, state, queue_size=DEFAULT_QUEUE_SIZE):
+    seen_ids = []
+    items = prefetch(_changed_repos(repo_collector, org, state, seen_ids), queue_size)
+    _analyze_repos(_repos_to_evaluate(items, emit, skipper), engine, emit, skipper, state=state, org=org)
+    state.prune(org, seen_ids)
+
+def _repo_names_by_owner(repos_to_scan):
+    import click
+
+    names_by_owner = {}
+    for r_str in repos_to_scan:
+        if '/' not in r_str:
+            click.echo(f"  - Warning: Skipping invalid repo string '{r_str}'. Expected 'owner/repo'.", err=True)
+            continue
+        owner, name = r_str.split('/')
+        names_by_owner.setdefault(owner, []).append(name)
+    return names_by_owner
+
+def _requested_repos(client, repos_to_scan, config, plan=None):
+    from internal.collectors.github.repository_collector import RepositoryCollector
+    import click
+
+    # Only the requested repositories are fetched and enriched, not their whole organization
+    for owner, names in _repo_names_by_owner(repos_to_scan).items():
+        click.echo(f"  - Collecting {', '.join(f'{owner}/{n}' for n in names)}...", err=True)
+        repo_collector = RepositoryCollector(client, owner, concurrency=config.concurrency * len(client.credentials),
+                                             graphql_enrichment=config.graphql_enrichment, plan=plan)
+        repos = repo_collector.collect_by_name(names)
+        found = {r.name for r in repos}
+        for name in names:
+            if name not in found:
+                click.echo(f"  - Warning: Repository '{owner}/{name}' not found or not accessible.", err=True)
+        yield from repos
+
+def _checkpointed(checkpoint, unit, task):
+    # A finished unit replays its recorded violations instead of running again
+    def run(emit):
+        recorded = checkpoint.completed(unit)
+        if recorded is not None:
+            for violation in recorded:
+                emit(violation)
+            return
+        violations = []
+        def record(violation):
+            violations.append(violation)
+            emit(violation)
+        task(record)
+        checkpoint.record_unit(unit, violations)
+    return run
+
+def _analyze_org_repos_resumable(repo_collector, org, engine, emit, skipper, checkpoint, queue_size=DEFAULT_QUEUE_SIZE):
+    from internal.collectors.github.repository_collector import PAGE_SIZE
+
+    unit = f"{org}/repository"
+    cursor, violations = checkpoint.repo_progress(org)
+    for violation in violations:
+        emit(violation)
+    if checkpoint.completed(unit) is not None:
+        return
+    # Each page is checkpointed with its listing cursor once all of its repositories are evaluated
+    for page, end_cursor in prefetch(repo_collector.resumable_pages(cursor), max(1, queue_size // PAGE_SIZE)):
+        page_violations = []
+        _analyze_repos(page, engine, page_violations.append, skipper)
+        for violation in page_violations:
+            emit(violation)
+        checkpoint.record_repo_page(org, end_cursor, page_violations)
+    checkpoint.record_unit(unit, [])
+
+def _org_namespace_tasks(client, config, current_org, engine, skipper, snapshot=None, state=None, plan=None,
+                         checkpoint=None):
+    """Returns (namespace, label, task) for every namespace of an organization.
+
+    Each task takes the emit callable and collects and evaluates its namespace.
+    """
     from internal.collectors.github.repository_collector import RepositoryCollector
     from internal.collectors.github.organization_collector import OrganizationCollector
     from internal.collectors.github.member_collector import MemberCollector
     from internal.collectors.github.actions_collector import ActionsCollector
     from internal.collectors.github.runners_collector import RunnersCollector
     from internal.common.namespace import Namespace
+
+    def analyze_organization(emit):
+        org_collector = OrganizationCollector(client, current_org, plan=plan)
+        organizations = org_collector.collect()
+        for organization in organizations:
+            input_data = {
+                "organization": organization.model_dump(by_alias=True),
+                "hooks": [h.model_dump() for h in organization.hooks],
+                "organization_secrets": [s.model_dump(by_alias=True) for s in organization.organization_secrets],
+                "saml_enabled": organization.saml_enabled
+            }
+            _eval_entity(engine, "organization", current_org, input_data, emit, skipper, snapshot)
+
+    def analyze_members(emit):
+        member_collector = MemberCollector(client, current_org)
+        members = member_collector.collect()
+        input_data = {"members": [m.model_dump() for m in members]}
+        _eval_entity(engine, "member", f"{current_org} (Members)", input_data, emit, skipper, snapshot)
+
+    def analyze_actions(emit):
+        actions_collector = ActionsCollector(client, current_org)
+        actions_data_list = actions_collector.collect()
+        for actions_data in actions_data_list:
+            input_data = {"actions": actions_data.model_dump()}
+            _eval_entity(engine, "actions", f"{current_org} (Actions)", input_data, emit, skipper, snapshot)
+
+    def analyze_runner_groups(emit):
+        runners_collector = RunnersCollector(client, current_org)
+        runners = runners_collector.collect()
+        for rg in runners:
+            input_data = {"runner_group": rg.model_dump()}
+            _eval_entity(engine, "runner_group", f"{current_org} (RunnerGroup: {rg.name})", input_data,
+                         emit, skipper, snapshot)
+
+    def analyze_repositories(emit):
+        repo_collector = RepositoryCollector(client, current_org, concurrency=config.concurrency * len(client.credentials),
+                                             graphql_enrichment=config.graphql_enrichment, plan=plan)
+        if checkpoint:
+            _analyze_org_repos_resumable(repo_collector, current_org, engine, emit, skipper, checkpoint,
+                                         queue_size=config.pipeline_queue_size)
+        elif state:
+            _analyze_org_repos_incremental(repo_collector, current_org, engine, emit, skipper, state,
+                                           queue_size=config.pipeline_queue_size)
+            state.save()
+        else:
+            # Collection runs ahead on a producer thread while this thread evaluates
+            repos = prefetch(repo_collector.stream(), config.pipeline_queue_size)
+            _analyze_repos(repos, engine, emit, skipper, snapshot=snapshot)
+
+    tasks = [
+        (Namespace.ORGANIZATION, "Organization details", analyze_organization),
+        (Namespace.MEMBER, "Members", analyze_members),
+        (Namespace.ACTIONS, "Actions settings", analyze_actions),
+        (Namespace.RUNNER_GROUP, "Runner Groups", analyze_runner_groups),
+        (Namespace.REPOSITORY, "Repositories", analyze_repositories),
+    ]
+    if checkpoint:
+        # Repositories checkpoint every page themselves
+        tasks = [(namespace, label, task if namespace == Namespace.REPOSITORY
+                  else _checkpointed(checkpoint, f"{current_org}/{namespace.value}", task))
+                 for namespace, label, task in tasks]
+    return tasks
+
+def _analyze_github_org(client, config, current_org, namespaces_to_run, engine, emit, skipper, snapshot=None, state=None,
+                        plan=None, checkpoint=None):
+    import click
+    import time
+
+    click.echo(f"Analyzing Organization: {current_org}", err=True)
+
+    namespace_tasks = _org_namespace_tasks(client, config, current_org, engine, skipper, snapshot, state, plan, checkpoint)
+    namespace_tasks = [(label, task) for namespace, label, task in namespace_tasks
+                       if namespace in namespaces_to_run and (plan is None or plan.needs_package(namespace))]
+
+    # Violations still come out in namespace order, whichever namespace finishes first
+    ordered = OrderedEmitter(emit, len(namespace_tasks))
+    failed = []
+
+    def run(index, label, task):
+        click.echo(f"  - [{current_org}] Collecting {label}...", err=True)
+        start = time.monotonic()
+        try:
+            task(ordered.channel(index))
+        except Exception as e:
+            # A failing namespace does not stop the others, but the scan is reported as failed
+            click.echo(f"  - [{current_org}] {label} failed: {e}", err=True)
+            failed.append(label)
+            return
+        finally:
+            ordered.finish(index)
+        click.echo(f"  - [{current_org}] {label} done in {time.monotonic() - start:.1f}s", err=True)
+
+    # The namespaces are independent API workloads, so a few are collected concurrently
+    with ThreadPoolExecutor(max_workers=max(1, min(config.namespace_concurrency, len(namespace_tasks)))) as executor:
+        for future in [executor.submit(run, index, label, task) for index, (label, task) in enumerate(namespace_tasks)]:
+            future.result()
+    if failed:
+        raise Exception(f"{', '.join(sorted(failed))} of {current_org} failed")
+
+def _check_token_scopes(client, engine, skipper, namespaces, plan=None):
+    from internal.clients.negative_cache import missing_scopes
+    import click
+
+    try:
+        granted = client.get_token_scopes()
+    except Exception:
+        return
+    if granted is None:
+        return
+
+    rules_by_scope = {}
+    for meta in engine.metadata_cache.values():
+        # Only policies this scan evaluates; e.g. enterprise policies never run under analyze
+        if meta.package not in namespaces or (plan and not plan.needs_package(meta.package)):
+            continue
+        if skipper.should_skip_rule(meta.rule, meta.title, meta.severity):
+            continue
+        for scope in missing_scopes(meta.required_scopes, granted):
+            rules_by_scope.setdefault(scope, []).append(meta.rule)
+    for scope, rules in sorted(rules_by_scope.items()):
+        click.echo(f"Warning: the token lacks the '{scope}' scope required by {len(rules)} policies "
+                   f"(e.g. {', '.join(sorted(rules)[:3])}); their results may be incomplete", err=True)
+
+def _github_client(config):
+    from internal.clients.github_client import GitHubClient
+    from internal.clients.credentials import load_credentials
+
+    # Each credential runs up to --concurrency calls; keep a pooled connection available for every one
+    credentials = load_credentials(config.extra_tokens, config.github_apps)
+    return GitHubClient(config.token, pool_size=max(config.http_pool_size, config.concurrency * (len(credentials) + 1)),
+                        max_concurrency=config.concurrency, cache_dir=config.http_cache_dir,
+                        cache_max_bytes=config.http_cache_size * 1024 * 1024, credentials=credentials)
+
+def _report_plan(plan, namespaces_to_run):
+    import click
+
+    for namespace in namespaces_to_run:
+        if not plan.needs_package(namespace):
+            click.echo(f"Skipping the {namespace} namespace: all of its policies are ignored", err=True)
+        elif plan.skipped_steps(namespace):
+            click.echo(f"Not collecting {namespace} {', '.join(plan.skipped_steps(namespace))}: "
+                       "no enabled policy reads them", err=True)
+
+def _analyze_github(config, namespaces_to_run, engine, emit, skipper, snapshot=None, plan=None):
+    from internal.common.namespace import Namespace
     import click
 
-    client = GitHubClient(config.token)
+    client = _github_client(config)
     orgs_to_scan = config.orgs
     repos_to_scan = config.repos
-    
-    # Organizations
-    if orgs_to_scan:
-        for current_org in orgs_to_scan:
-            click.echo(f"Analyzing Organization: {current_org}")
-            
-            if Namespace.ORGANIZATION in namespaces_to_run:
-                click.echo("  - Collecting Organization details...")
-                org_collector = OrganizationCollector(client, current_org)
-                organizations = org_collector.collect()
-                for organization in organizations:
-                    input_data = {
-                        "organization": organization.model_dump(by_alias=True),
-                        "hooks": [h.model_dump() for h in organization.hooks],
-                        "organization_secrets": [s.model_dump(by_alias=True) for s in organization.organization_secrets],
-                        "saml_enabled": organization.saml_enabled
-                    }
-                    violations = engine.eval(input_data, package="organization")
-                    for v in violations:
-                        if skipper.should_skip(v.get("policyName", "")) or skipper.should_skip(v.get("rule", "")):
-                             continue
-                        v["target"] = current_org
-                        all_violations.append(v)
-
-            if Namespace.MEMBER in namespaces_to_run:
-                click.echo("  - Collecting Members...")
-                member_collector = MemberCollector(client, current_org)
-                members = member_collector.collect()
-                input_data = {"members": [m.model_dump() for m in members]}
-                violations = engine.eval(input_data, package="member")
-                for v in violations:
-                   if skipper.should_skip(v.get("policyName", "")) or skipper.should_skip(v.get("rule", "")):
-                        continue
-                   v["target"] = f"{current_org} (Members)"
-                   all_violations.append(v)
-
-            if Namespace.ACTIONS in namespaces_to_run:
-                click.echo("  - Collecting Actions settings...")
-                actions_collector = ActionsCollector(client, current_org)
-                actions_data_list = actions_collector.collect()
-                for actions_data in actions_data_list:
-                    input_data = {"actions": actions_data.model_dump()}
-                    violations = engine.eval(input_data, package="actions")
-                    for v in violations:
-                        if skipper.should_skip(v.get("policyName", "")) or skipper.should_skip(v.get("rule", "")):
-                             continue
-                        v["target"] = f"{current_org} (Actions)"
-                        all_violations.append(v)
-
-            if Namespace.RUNNER_GROUP in namespaces_to_run:
-                click.echo("  - Collecting Runner Groups...")
-                runners_collector = RunnersCollector(client, current_org)
-                runners = runners_collector.collect()
-                for rg in runners:
-                        input_data = {"runner_group": rg.model_dump()}
-                        violations = engine.eval(input_data, package="runner_group")
-                        for v in violations:
-                            if skipper.should_skip(v.get("policyName", "")) or skipper.should_skip(v.get("rule", "")):
-                                 continue
-                            v["target"] = f"{current_org} (RunnerGroup: {rg.name})"
-                            all_violations.append(v)
-            
-            if Namespace.REPOSITORY in namespaces_to_run:
-                click.echo("  - Collecting Repositories...")
-                repo_collector = RepositoryCollector(client, current_org)
-                repos = repo_collector.collect()
-                _analyze_repos(repos, engine, all_violations, skipper)
+
+    _check_token_scopes(client, engine, skipper, namespaces_to_run, plan)
+
+    if plan:
+        _report_plan(plan, namespaces_to_run)
+
+    state = None
+    if config.incremental_state:
+        from internal.common.incremental_state import IncrementalState
+        # Stored results are only valid for the same policies and the same collected fields
+        state_key = f"{engine.policy_hash}:{plan.fingerprint()}" if plan else engine.policy_hash
+        state = IncrementalState(config.incremental_state, state_key, max_age_days=config.incremental_max_age)
+
+    checkpoint = None
+    if config.checkpoint:
+        import hashlib
+        from internal.common.checkpoint import ScanCheckpoint
+        # Only a scan of the same targets, namespaces and policies can pick up the recorded work
+        scope = [engine.policy_hash, plan.fingerprint() if plan else "", sorted(orgs_to_scan), sorted(namespaces_to_run)]
+        checkpoint_key = hashlib.sha256(repr(scope).encode()).hexdigest()
+        checkpoint = ScanCheckpoint(config.checkpoint, checkpoint_key, resume=config.resume)
+        if config.resume:
+            click.echo(checkpoint.report(), err=True)
+
+    # Organizations that failed; the others still finish before the scan is reported as failed
+    failed_orgs = []
+    try:
+        # Organizations
+        if orgs_to_scan:
+            if config.org_concurrency <= 1 or len(orgs_to_scan) == 1:
+                for current_org in orgs_to_scan:
+                    try:
+                        _analyze_github_org(client, config, current_org, namespaces_to_run, engine, emit, skipper,
+                                            snapshot, state, plan, checkpoint)
+                    except Exception as e:
+                        click.echo(f"Error analyzing organization {current_org}: {e}", err=True)
+                        failed_orgs.append(current_org)
+            else:
+                # Organizations report in the order they were given, as in a sequential scan
+                ordered = OrderedEmitter(emit, len(orgs_to_scan))
+
+                def analyze_org(index, current_org):
+                    try:
+                        _analyze_github_org(client, config, current_org, namespaces_to_run, engine,
+                                            ordered.channel(index), skipper, snapshot, state, plan, checkpoint)
+                    finally:
+                        ordered.finish(index)
+
+                with ThreadPoolExecutor(max_workers=config.org_concurrency) as executor:
+                    futures = {executor.submit(analyze_org, index, current_org): current_org
+                               for index, current_org in enumerate(orgs_to_scan)}
+                    for future in as_completed(futures):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            click.echo(f"Error analyzing organization {futures[future]}: {e}", err=True)
+                            failed_orgs.append(futures[future])
+    finally:
+        if checkpoint:
+            checkpoint.close()
 
     # Repositories
     if repos_to_scan:
-        click.echo(f"Analyzing {len(repos_to_scan)} specific repositories...")
+        click.echo(f"Analyzing {len(repos_to_scan)} specific repositories...", err=True)
         if Namespace.REPOSITORY in namespaces_to_run:
-            collected_repos = []
-            for r_str in repos_to_scan:
-                    if '/' not in r_str:
-                         click.echo(f"  - Warning: Skipping invalid repo string '{r_str}'. Expected 'owner/repo'.")
-                         continue
-                    owner, name = r_str.split('/')
-                    click.echo(f"  - Collecting {owner}/{name}...")
-                    repo_collector = RepositoryCollector(client, owner)
-                    all_from_org = repo_collector.collect() 
-                    for r in all_from_org:
-                        if r.name == name:
-                            collected_repos.append(r)
-            _analyze_repos(collected_repos, engine, all_violations, skipper)
-
-def _analyze_gitlab(config, namespaces_to_run, engine, all_violations, skipper):
+            repos = prefetch(_requested_repos(client, repos_to_scan, config, plan), config.pipeline_queue_size)
+            _analyze_repos(repos, engine, emit, skipper, snapshot=snapshot)
+
+    if client.response_cache:
+        click.echo(client.response_cache.report(), err=True)
+    for line in client.negative_cache.report():
+        click.echo(line, err=True)
+    if state:
+        click.echo(state.report(), err=True)
+    if failed_orgs:
+        raise Exception(f"Analysis of {len(failed_orgs)} organizations failed: {', '.join(sorted(failed_orgs))}")
+
+def _repository_units(org, names, page_size):
+    return [{"id": f"{org}/repository/{page}", "org": org, "namespace": "repository",
+             "repos": names[start:start + page_size]}
+            for page, start in enumerate(range(0, len(names), page_size))]
+
+def _coordinate_work_queue(config, namespaces_to_run, engine, skipper, plan):
+    from internal.collectors.github.repository_collector import PAGE_SIZE
+    from internal.common.namespace import Namespace
+    from internal.common.work_queue import WorkQueue
+    import click
+
+    client = _github_client(config)
+    _check_token_scopes(client, engine, skipper, namespaces_to_run, plan)
+    _report_plan(plan, namespaces_to_run)
+    namespaces = [n for n in namespaces_to_run if plan.needs_package(n)]
+
+    queue = WorkQueue(config.work_queue)
+    try:
+        # Every worker has to evaluate the units with the policies they were planned for
+        planned_hash = queue.get_meta("policy_hash")
+        if planned_hash and planned_hash != engine.policy_hash:
+            raise Exception(f"{config.work_queue} was planned with different policies; use a new queue file")
+        if planned_hash and _queue_plan_mismatch(queue, plan):
+            raise Exception(f"{config.work_queue} was planned with a different rule selection (--policy, "
+                            "--min-severity, ignore file); use a new queue file")
+        queue.set_meta("policy_hash", engine.policy_hash)
+        for key, value in _queue_plan_meta(plan).items():
+            queue.set_meta(key, value)
+
+        if config.repos:
+            units = []
+            if Namespace.REPOSITORY in namespaces:
+                for owner, names in _repo_names_by_owner(config.repos).items():
+                    units += _repository_units(owner, names, PAGE_SIZE)
+            click.echo(f"Queued {queue.add(units)} units for {len(config.repos)} repositories", err=True)
+        else:
+            for org in config.orgs or client.get_user_organizations():
+                # Organization-wide namespaces are one unit each; repositories are split into pages
+                units = [{"id": f"{org}/{namespace}", "org": org, "namespace": namespace}
+                         for namespace in namespaces if namespace != Namespace.REPOSITORY]
+                if Namespace.REPOSITORY in namespaces:
+                    names = [r["name"] for r in client.iter_repository_summaries(org)]
+                    units += _repository_units(org, names, PAGE_SIZE)
+                click.echo(f"  - [{org}] Queued {queue.add(units)} units", err=True)
+        click.echo(f"Work queue {config.work_queue}: {queue.counts()}", err=True)
+    finally:
+        queue.close()
+
+def _run_work_unit(client, config, unit, engine, emit, skipper, plan=None):
+    from internal.collectors.github.repository_collector import RepositoryCollector
+    from internal.common.namespace import Namespace
+
+    if unit["namespace"] == Namespace.REPOSITORY:
+        repo_collector = RepositoryCollector(client, unit["org"], concurrency=config.concurrency * len(client.credentials),
+                                             graphql_enrichment=config.graphql_enrichment, plan=plan)
+        _analyze_repos(repo_collector.collect_by_name(unit["repos"]), engine, emit, skipper)
+        return
+    for namespace, _, task in _org_namespace_tasks(client, config, unit["org"], engine, skipper, plan=plan):
+        if namespace == unit["namespace"]:
+            task(emit)
+
+def _queue_plan_meta(plan):
+    import json
+
+    return {
+        "plan_fingerprint": plan.fingerprint() if plan else "",
+        "enabled_rules": json.dumps(plan.enabled_rules if plan else {}, sort_keys=True),
+    }
+
+def _queue_plan_mismatch(queue, plan) -> bool:
+    return any(queue.get_meta(key) != value for key, value in _queue_plan_meta(plan).items())
+
+def _run_work_queue_worker(config, engine, skipper, plan):
+    from internal.common.work_queue import WorkQueue, LeaseKeeper, LEASED
+    import click
+    import os
+    import socket
+    import time
+
+    queue = WorkQueue(config.work_queue)
+    try:
+        planned_hash = queue.get_meta("policy_hash")
+        if planned_hash is None:
+            raise Exception(f"Nothing was queued in {config.work_queue}; run the coordinator first")
+        if planned_hash != engine.policy_hash:
+            raise Exception(f"{config.work_queue} was planned with different policies than {config.policies_path}")
+        # Results for another rule set would be mixed into the merged report
+        if _queue_plan_mismatch(queue, plan):
+            raise Exception(f"{config.work_queue} was planned with a different rule selection (--policy, "
+                            "--min-severity, ignore file) or collection plan than this worker's")
+
+        client = _github_client(config)
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        completed = 0
+        while True:
+            unit = queue.lease(worker, config.queue_lease)
+            if unit is None:
+                if queue.counts().get(LEASED):
+                    # Units held by other workers are handed out again if those workers die
+                    time.sleep(min(30, config.queue_lease / 3))
+                    continue
+                break
+
+            click.echo(f"  - [{worker}] Running {unit['id']}...", err=True)
+            violations = []
+            try:
+                with LeaseKeeper(queue, unit["id"], worker, config.queue_lease):
+                    _run_work_unit(client, config, unit, engine, violations.append, skipper, plan)
+            except Exception as e:
+                click.echo(f"  - [{worker}] {unit['id']} failed: {e}", err=True)
+                queue.fail(unit["id"], worker, str(e))
+                continue
+            if queue.complete(unit["id"], worker, violations):
+                completed += 1
+            else:
+                click.echo(f"  - [{worker}] Lost the lease on {unit['id']}; its results were discarded", err=True)
+
+        click.echo(f"Worker {worker} completed {completed} units; work queue: {queue.counts()}", err=True)
+    finally:
+        queue.close()
+
+def _merge_work_queue(path, emit):
+    from internal.common.work_queue import WorkQueue, PENDING, LEASED
+    import click
+
+    queue = WorkQueue(path)
+    try:
+        counts = queue.counts()
+        unfinished = counts.get(PENDING, 0) + counts.get(LEASED, 0)
+        if unfinished:
+            click.echo(f"Warning: {unfinished} units of {path} are not finished yet; the report is partial", err=True)
+        for failure in queue.failures():
+            click.echo(f"Warning: {failure['id']} failed after {failure['attempts']} attempts: {failure['error']}",
+                       err=True)
+        for violation in queue.results():
+            emit(violation)
+    finally:
+        queue.close()
+
+def _analyze_gitlab(config, namespaces_to_run, engine, emit, skipper):
     from internal.clients.gitlab_client import GitLabClient
     from internal.collectors.gitlab.group_collector import GroupCollector
     from internal.collectors.gitlab.repository_collector import RepositoryCollector
@@ -231,10 +792,10 @@ def _analyze_gitlab(config, namespaces_to_run, engine, all_violations, skipper):
     # In this MVP GitLab client, we fetch *all* available groups if none specified, or we might need filtering.
     # The Collector `collect()` fetches all. We should filter here if `groups_to_scan` is set.
     
-    click.echo(f"Analyzing GitLab...")
+    click.echo(f"Analyzing GitLab...", err=True)
 
     if Namespace.ORGANIZATION in namespaces_to_run: # Group
-        click.echo("  - Collecting Groups...")
+        click.echo("  - Collecting Groups...", err=True)
         collector = GroupCollector(None, client) # Context is unused in current impl
         all_groups = collector.collect()
         
@@ -242,17 +803,17 @@ def _analyze_gitlab(config, namespaces_to_run, engine, all_violations, skipper):
             if groups_to_scan and g.name not in groups_to_scan and g.full_name not in groups_to_scan:
                  continue
 
-            click.echo(f"    Scanning Group: {g.name}")
+            click.echo(f"    Scanning Group: {g.name}", err=True)
             input_data = {"organization": g.model_dump()} # Mapping Group -> Organization for OPA
             violations = engine.eval(input_data, package="organization")
             for v in violations:
-                if skipper.should_skip(v.get("policyName", "")) or skipper.should_skip(v.get("rule", "")):
+                if skipper.should_skip_violation(v):
                      continue
                 v["target"] = g.name
-                all_violations.append(v)
+                emit(v)
     
     if Namespace.REPOSITORY in namespaces_to_run: # Project
-        click.echo("  - Collecting Projects...")
+        click.echo("  - Collecting Projects...", err=True)
         collector = RepositoryCollector(None, client)
         all_projects = collector.collect()
         
@@ -263,19 +824,19 @@ def _analyze_gitlab(config, namespaces_to_run, engine, all_violations, skipper):
              input_data = {"repository": p.model_dump()}
              violations = engine.eval(input_data, package="repository")
              for v in violations:
-                 if skipper.should_skip(v.get("policyName", "")) or skipper.should_skip(v.get("rule", "")):
+                 if skipper.should_skip_violation(v):
                       continue
                  v["target"] = p.name
-                 all_violations.append(v)
+                 emit(v)
 
     if Namespace.MEMBER in namespaces_to_run: # User
-        click.echo("  - Collecting Users...")
+        click.echo("  - Collecting Users...", err=True)
         collector = UserCollector(None, client)
         users = collector.collect()
         input_data = {"members": [u.model_dump() for u in users]}
         violations = engine.eval(input_data, package="member")
         for v in violations:
-             if skipper.should_skip(v.get("policyName", "")) or skipper.should_skip(v.get("rule", "")):
+             if skipper.should_skip_violation(v):
                   continue
              v["target"] = "GitLab Users"
-             all_violations.append(v)
+             emit(v)
@@ -2,38 +2,40 @@ import click
 from internal.common.scm_type import ScmType
 from internal.clients.github_client import GitHubClient
 from internal.clients.gitlab_client import GitLabClient
+from internal.outputer.listing_outputer import ListingOutputer
 
 @click.command('list-orgs')
 @click.option('--token', envvar='SCM_TOKEN', help='SCM Token')
 @click.option('--scm', default='github', type=click.Choice(['github', 'gitlab']), help='Source Control Management system')
-def list_orgs(token, scm):
+@click.option('--format', 'output_format', default='text', type=click.Choice(['text', 'json']), help='Output format')
+def list_orgs(token, scm, output_format):
     """List organizations/groups associated with the token."""
     if not token:
-        click.echo("Error: Token is required.")
+        click.echo("Error: Token is required.", err=True)
         return
 
+    outputer = None
+    failed = False
     try:
         if scm == ScmType.GITHUB:
             client = GitHubClient(token)
-            # GitHub doesn't have a simple "list my orgs" in the client yet explicitly public,
-            # but we can assume get_organizations or similar exists or we use GraphQL.
-            # Checking GitHubClient... 
-            # If not present, we should implement it. 
-            # For now, let's try assuming a method or using one.
-            # Actually, `get_organization_details` fetches one.
-            # We need a method to list authenticated user's orgs.
-            # Let's check GitHubClient in next step. For now, writing placeholder logic that calls client.
-            orgs = client.get_user_organizations() 
-            click.echo(f"Organizations ({len(orgs)}):")
-            for org in orgs:
-                click.echo(f"- {org}")
-                
+            outputer = ListingOutputer(output_format, lambda o: f"- {o['login']}", "Total Organizations")
+            for org in client.iter_user_organizations():
+                outputer.emit({"login": org["login"], "name": org.get("name"), "url": org.get("url")})
+
         elif scm == ScmType.GITLAB:
             client = GitLabClient(token)
             groups = client.get_groups()
-            click.echo(f"GitLab Groups ({len(groups)}):")
+            outputer = ListingOutputer(output_format, lambda g: f"- {g['full_name']} (path: {g['name']})", "Total Groups")
             for g in groups:
-                 click.echo(f"- {g.full_name} (path: {g.name})")
+                 outputer.emit({"name": g.name, "full_name": g.full_name, "url": g.web_url})
 
     except Exception as e:
-        click.echo(f"Error listing organizations: {e}")
+        failed = True
+        click.echo(f"Error listing organizations: {e}", err=True)
+    finally:
+        # Entries may already be streamed; always close the listing so stdout stays well-formed
+        if outputer:
+            outputer.end()
+    if failed:
+        raise SystemExit(1)
@@ -2,27 +2,32 @@ import click
 from internal.common.scm_type import ScmType
 from internal.clients.github_client import GitHubClient
 from internal.clients.gitlab_client import GitLabClient
+from internal.outputer.listing_outputer import ListingOutputer
 
 @click.command('list-repos')
 @click.option('--token', envvar='SCM_TOKEN', help='SCM Token')
 @click.option('--scm', default='github', type=click.Choice(['github', 'gitlab']), help='Source Control Management system')
 @click.option('--org', help='Organization/Group to list repositories for')
-def list_repos(token, scm, org):
+@click.option('--format', 'output_format', default='text', type=click.Choice(['text', 'json']), help='Output format')
+def list_repos(token, scm, org, output_format):
     """List repositories associated with the token or organization."""
     if not token:
-        click.echo("Error: Token is required.")
+        click.echo("Error: Token is required.", err=True)
         return
 
+    outputer = None
+    failed = False
     try:
         if scm == ScmType.GITHUB:
             client = GitHubClient(token)
             if org:
-                repos = client.get_repositories(org)
-                click.echo(f"Repositories for {org} ({len(repos)}):")
-                for r in repos:
-                    click.echo(f"- {r.get('name')} ({r.get('url')})")
+                # Entries are printed page by page as they arrive
+                outputer = ListingOutputer(output_format, lambda r: f"- {r['name']} ({r['url']})", "Total Repositories")
+                for r in client.iter_repository_summaries(org):
+                    outputer.emit({"name": r["name"], "full_name": r["nameWithOwner"], "url": r["url"],
+                                   "private": r["isPrivate"], "pushed_at": r["pushedAt"]})
             else:
-                 click.echo("Error: --org is required for GitHub list-repos currently.")
+                 click.echo("Error: --org is required for GitHub list-repos currently.", err=True)
 
         elif scm == ScmType.GITLAB:
             client = GitLabClient(token)
@@ -33,7 +38,7 @@ def list_repos(token, scm, org):
             # Client `get_projects` fetches all.
             # We can filter locally.
             
-            count = 0
+            outputer = ListingOutputer(output_format, lambda p: f"- {p['name']} ({p['url']})", "Total Projects")
             for p in projects:
                  # Logic to check if p belongs to group 'org'
                  # p.namespace['name'] or p.path_with_namespace
@@ -42,10 +47,14 @@ def list_repos(token, scm, org):
                      # Filter by partial match or namespace
                      pass # TODO implement filtering
                  
-                 click.echo(f"- {p.name} ({p.web_url})")
-                 count += 1
-            
-            click.echo(f"Total Projects: {count}")
+                 outputer.emit({"name": p.name, "url": p.web_url, "visibility": p.visibility})
 
     except Exception as e:
-        click.echo(f"Error listing repositories: {e}")
+        failed = True
+        click.echo(f"Error listing repositories: {e}", err=True)
+    finally:
+        # Entries may already be streamed; always close the listing so stdout stays well-formed
+        if outputer:
+            outputer.end()
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,174 @@
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import requests
+
+from internal.clients.rate_limiter import RateLimitScheduler
+
+# Installation tokens live for an hour; refresh them this long before they expire
+TOKEN_REFRESH_MARGIN = 300
+
+
+class PersonalAccessToken:
+    """A static token, usable for every owner unless bound to one organization."""
+
+    def __init__(self, token: str, owner: Optional[str] = None):
+        self.token = token
+        self.owner = owner
+        self.scheduler: Optional[RateLimitScheduler] = None
+
+    def get_token(self) -> str:
+        return self.token
+
+    def can_access(self, owner: Optional[str]) -> bool:
+        # Calls without an owner (viewer queries, /rate_limit) go to unbound tokens
+        if owner is None or self.owner is None:
+            return self.owner is None
+        return owner.lower() == self.owner.lower()
+
+    def bound_owner(self) -> Optional[str]:
+        return self.owner
+
+    def identity(self) -> str:
+        return self.token
+
+
+class AppInstallation:
+    """A GitHub App installation that mints and refreshes its own installation tokens.
+
+    The installation's account is looked up once, so requests for other owners
+    are never routed to it.
+    """
+
+    def __init__(self, app_id: str, installation_id: str, private_key: str,
+                 session: Optional[requests.Session] = None, api_url: str = "https://api.github.com"):
+        self.app_id = app_id
+        self.installation_id = installation_id
+        self.private_key = private_key
+        self.session = session or requests.Session()
+        self.api_url = api_url
+        self.scheduler: Optional[RateLimitScheduler] = None
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._account: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _app_jwt(self) -> str:
+        try:
+            import jwt
+        except ImportError:
+            raise Exception("GitHub App credentials require the 'PyJWT' package. Install it with 'pip install PyJWT[crypto]'.")
+        now = int(time.time())
+        # Backdated to allow for clock drift, as GitHub recommends
+        return jwt.encode({"iat": now - 60, "exp": now + 540, "iss": str(self.app_id)},
+                          self.private_key, algorithm="RS256")
+
+    def _app_request(self, method: str, path: str) -> dict:
+        headers = {"Authorization": f"Bearer {self._app_jwt()}", "Accept": "application/vnd.github+json"}
+        response = self.session.request(method, f"{self.api_url}{path}", headers=headers, timeout=30)
+        if response.status_code >= 400:
+            raise Exception(f"GitHub App request {path} failed ({response.status_code}): {response.text}")
+        return response.json()
+
+    def get_token(self) -> str:
+        with self._lock:
+            if self._token is None or time.time() > self._expires_at - TOKEN_REFRESH_MARGIN:
+                data = self._app_request("POST", f"/app/installations/{self.installation_id}/access_tokens")
+                self._token = data["token"]
+                self._expires_at = datetime.fromisoformat(data["expires_at"].replace("Z", "+00:00")).timestamp()
+            return self._token
+
+    @property
+    def account(self) -> str:
+        with self._lock:
+            if self._account is None:
+                data = self._app_request("GET", f"/app/installations/{self.installation_id}")
+                self._account = data["account"]["login"]
+            return self._account
+
+    def can_access(self, owner: Optional[str]) -> bool:
+        return owner is not None and owner.lower() == self.account.lower()
+
+    def bound_owner(self) -> Optional[str]:
+        return self.account
+
+    def identity(self) -> str:
+        return f"app:{self.app_id}:{self.installation_id}"
+
+
+class CredentialPool:
+    """Spreads requests over several credentials, each with its own rate limit budget.
+
+    Every credential gets its own RateLimitScheduler; a request goes to the
+    credential with the most budget left among those that can access the
+    request's owner, so throughput grows with the number of credentials.
+    """
+
+    def __init__(self, credentials: List, max_concurrency: int = 8):
+        if not credentials:
+            raise Exception("At least one GitHub credential is required")
+        self.credentials = credentials
+        for credential in credentials:
+            credential.scheduler = RateLimitScheduler(max_concurrency=max_concurrency)
+
+    def __len__(self):
+        return len(self.credentials)
+
+    def _rank(self, credential, resource: str, now: float):
+        budget = credential.scheduler.budgets[resource]
+        blocked = credential.scheduler._blocked_for(budget, now) > 0
+        # A budget not seen yet is a fresh one; ties go to the least busy credential
+        remaining = float("inf") if budget.remaining is None else budget.remaining - budget.in_flight * budget.cost
+        return not blocked, remaining, -budget.in_flight
+
+    def eligible(self, owner: Optional[str] = None) -> List:
+        """The credentials a request for owner may go out with."""
+        candidates = [c for c in self.credentials if c.can_access(owner)]
+        if not candidates and owner is None:
+            candidates = self.credentials
+        if not candidates:
+            raise Exception(f"No configured credential has access to '{owner}'")
+        return candidates
+
+    def select(self, resource: str, owner: Optional[str] = None, candidates: Optional[List] = None):
+        candidates = candidates or self.eligible(owner)
+        now = time.time()
+        return max(candidates, key=lambda c: self._rank(c, resource, now))
+
+    def has_unbound(self) -> bool:
+        return any(c.bound_owner() is None for c in self.credentials)
+
+    def bound_owners(self) -> List[str]:
+        """Owners of the org-bound tokens and App installations, in configuration order."""
+        owners = []
+        for credential in self.credentials:
+            owner = credential.bound_owner()
+            if owner is not None and owner not in owners:
+                owners.append(owner)
+        return owners
+
+    def identity(self) -> str:
+        """Identifies the pool for caches whose entries depend on the credentials' access."""
+        return "\0".join(sorted(c.identity() for c in self.credentials))
+
+
+def load_credentials(extra_tokens=(), github_apps=()) -> List:
+    """Builds credentials from "TOKEN" / "ORG=TOKEN" and "APP_ID:INSTALLATION_ID:KEY_FILE" specs."""
+    credentials = []
+    for spec in extra_tokens or ():
+        owner, _, token = spec.rpartition("=")
+        credentials.append(PersonalAccessToken(token, owner or None))
+    for spec in github_apps or ():
+        parts = spec.split(":", 2)
+        if len(parts) != 3 or not all(parts):
+            raise Exception(f"Invalid GitHub App spec '{spec}', expected APP_ID:INSTALLATION_ID:KEY_FILE")
+        app_id, installation_id, key_file = parts
+        try:
+            with open(key_file, 'r', encoding='utf-8') as f:
+                private_key = f.read()
+        except OSError as e:
+            raise Exception(f"Failed to read GitHub App private key {key_file}: {e}")
+        credentials.append(AppInstallation(app_id, installation_id, private_key))
+    return credentials
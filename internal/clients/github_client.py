@@ -1,122 +1,392 @@
 import requests
 import os
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from internal.clients.rate_limiter import REST, GRAPHQL
+from internal.clients.credentials import CredentialPool, PersonalAccessToken
+from internal.clients.response_cache import ResponseCache, DEFAULT_MAX_BYTES
+from internal.clients.negative_cache import NegativeResultCache, endpoint_class, parse_scopes, expand_scopes
+
+# Secondary rate limits without a Retry-After header: GitHub asks for at least a minute
+SECONDARY_RATE_LIMIT_WAIT = 60
+
+# Repository fields shared by the organization listing and targeted lookups
+REPOSITORY_FIELDS = """
+fragment RepositoryFields on Repository {
+    name
+    id
+    url
+    isPrivate
+    isArchived
+    pushedAt
+    updatedAt
+    allowForking
+    description
+    defaultBranchRef {
+        name
+        branchProtectionRule {
+            allowsDeletions
+            allowsForcePushes
+            requiresStatusChecks
+            requiresStrictStatusChecks
+            requiresCodeOwnerReviews
+            requiredApprovingReviewCount
+            dismissesStaleReviews
+            requiresLinearHistory
+            requiresConversationResolution
+            requiresCommitSignatures
+            restrictsReviewDismissals
+            restrictsPushes
+        }
+    }
+    viewerPermission
+    collaborators(first: 100) @include(if: $withCollaborators) {
+        nodes {
+            login
+            permissions {
+                admin
+                maintain
+                push
+                triage
+                pull
+            }
+        }
+    }
+    webhooks(first: 20) @include(if: $withWebhooks) {
+        nodes {
+            id
+            url
+            active
+        }
+    }
+}
+"""
+
+# Repositories per aliased `repository(owner:, name:)` query
+TARGETED_BATCH_SIZE = 20
 
 class GitHubClient:
-    def __init__(self, token: str):
+    def __init__(self, token: str, pool_size: int = 10, max_retries: int = 5,
+                 backoff_factor: float = 1.0, timeout: float = 30, max_concurrency: int = 8,
+                 cache_dir: str = None, cache_max_bytes: int = DEFAULT_MAX_BYTES, credentials: list = None):
         self.token = token
         self.endpoint = "https://api.github.com/graphql"
         self.rest_endpoint = "https://api.github.com"
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        # One pooled keep-alive session for every GraphQL and REST call.
+        # 5xx responses and connection resets are retried with exponential backoff;
+        # GraphQL POSTs are read-only so they are safe to retry too.
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if self.token:
+            self.session.headers.update({"Authorization": f"Bearer {self.token}"})
+
+        # Every request goes out with the pooled credential that has the most budget
+        # left for its owner; each credential is paced by its own scheduler
+        self.credentials = CredentialPool(
+            ([PersonalAccessToken(token)] if token else []) + list(credentials or []),
+            max_concurrency=max_concurrency)
+        self.scheduler = self.credentials.credentials[0].scheduler
+
+        # Optional ETag cache for REST GETs; 304s do not count against the rate limit
+        self.response_cache = ResponseCache(cache_dir, self.credentials.identity(), cache_max_bytes) if cache_dir else None
+
+        # Endpoint classes this token keeps getting 403/404 for are not called again
+        self.negative_cache = NegativeResultCache()
+
+    def _request(self, method: str, url: str, resource: str = REST, owner: str = None, **kwargs) -> requests.Response:
+        return self._request_with_credential(method, url, resource, owner, **kwargs)[0]
 
-    def query(self, query: str, variables: dict = None):
+    def _request_with_credential(self, method: str, url: str, resource: str = REST, owner: str = None,
+                                 candidates: list = None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if owner is None and resource == REST:
+            owner = endpoint_class(url[len(self.rest_endpoint):])[0] or None
+        for attempt in range(self.max_retries + 1):
+            # Reselected on every attempt, so a rate limited credential hands over to the next one
+            credential = self.credentials.select(resource, owner, candidates)
+            request_headers = {**headers, "Authorization": f"Bearer {credential.get_token()}"}
+            with credential.scheduler.slot(resource):
+                response = self.session.request(method, url, headers=request_headers, **kwargs)
+            credential.scheduler.update_from_headers(resource, response.headers)
+
+            wait = self._rate_limit_wait(response)
+            if wait is None or attempt == self.max_retries:
+                return response, credential
+            # Pause every caller of this budget, not only this thread
+            credential.scheduler.pause(resource, wait)
+        return response, credential
+
+    def _rate_limit_wait(self, response: requests.Response):
+        """Returns how long to wait before retrying a rate limited response, or None."""
+        if response.status_code not in (403, 429):
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            # The scheduler already holds requests until X-RateLimit-Reset
+            return 0
+
+        if "secondary rate limit" in response.text.lower():
+            return SECONDARY_RATE_LIMIT_WAIT
+
+        # A plain permission error
+        return None
+
+    def query(self, query: str, variables: dict = None, allow_partial: bool = False, owner: str = None):
+        """Runs a GraphQL query; owner routes it to a credential with access to that org or user."""
         headers = {
-            "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json",
         }
         json_data = {"query": query, "variables": variables or {}}
-        response = requests.post(self.endpoint, json=json_data, headers=headers)
+        response, credential = self._request_with_credential("POST", self.endpoint, resource=GRAPHQL, owner=owner,
+                                                             json=json_data, headers=headers)
         response.raise_for_status()
         data = response.json()
-        if "errors" in data:
+        rate_limit = (data.get("data") or {}).get("rateLimit")
+        if rate_limit:
+            credential.scheduler.update_from_graphql(rate_limit)
+        # With allow_partial, field-level errors (e.g. no admin access on one repo) leave those fields null
+        if "errors" in data and not (allow_partial and data.get("data")):
             raise Exception(f"GraphQL Error: {data['errors']}")
         return data
 
     def get_user_organizations(self):
+        if not self.credentials.has_unbound():
+            # Only org-bound tokens and App installations: their owners are the scan scope
+            return self.credentials.bound_owners()
+        return [org["login"] for org in self.iter_user_organizations()]
+
+    def iter_user_organizations(self):
+        """Yields {login, name, url} for every organization of the viewer, 100 per page."""
         query = """
-        query {
+        query($cursor: String) {
             viewer {
-                organizations(first: 100) {
+                organizations(first: 100, after: $cursor) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
                     nodes {
                         login
+                        name
+                        url
                     }
                 }
             }
         }
         """
-        data = self.query(query)
-        if data and "data" in data and "viewer" in data["data"]:
-             return [node["login"] for node in data["data"]["viewer"]["organizations"]["nodes"]]
-        return []
+        yield from self._paginate(query, {}, ["viewer", "organizations"])
+
+    def iter_repository_summaries(self, org_name: str):
+        """Yields minimal {name, nameWithOwner, url, isPrivate, pushedAt} nodes, 100 per page.
 
-    def get_repositories(self, org_name: str):
+        For listings only: unlike get_repositories, it requests no branch
+        protection, collaborators or webhooks, so each page costs a single point.
+        """
         query = """
         query($login: String!, $cursor: String) {
             organization(login: $login) {
-                repositories(first: 50, after: $cursor, isArchived: false) {
+                repositories(first: 100, after: $cursor, isArchived: false) {
                     pageInfo {
                         hasNextPage
                         endCursor
                     }
                     nodes {
                         name
-                        id
+                        nameWithOwner
                         url
                         isPrivate
-                        isArchived
                         pushedAt
-                        allowForking
-                        description
-                        defaultBranchRef {
-                            name
-                            branchProtectionRule {
-                                allowsDeletions
-                                allowsForcePushes
-                                requiresStatusChecks
-                                requiresStrictStatusChecks
-                                requiresCodeOwnerReviews
-                                requiredApprovingReviewCount
-                                dismissesStaleReviews
-                                requiresLinearHistory
-                                requiresConversationResolution
-                                requiresCommitSignatures
-                                restrictsReviewDismissals
-                                restrictsPushes
-                            }
-                        }
-                        viewerPermission
-                        collaborators(first: 100) {
-                            nodes {
-                                login
-                                permissions {
-                                    admin
-                                    maintain
-                                    push
-                                    triage
-                                    pull
-                                }
-                            }
-                        }
-                        webhooks(first: 20) {
-                            nodes {
-                                id
-                                url
-                                active
-                            }
-                        }
                     }
                 }
             }
         }
         """
-        
-        all_repos = []
+        yield from self._paginate(query, {"login": org_name}, ["organization", "repositories"], owner=org_name)
+
+    def _paginate(self, query: str, variables: dict, path: list, owner: str = None):
         cursor = None
+        while True:
+            data = self.query(query, {**variables, "cursor": cursor}, owner=owner)
+            connection = data["data"]
+            for key in path:
+                connection = connection.get(key) if connection else None
+            if not connection:
+                return
+            yield from connection["nodes"]
+            if not connection["pageInfo"]["hasNextPage"]:
+                return
+            cursor = connection["pageInfo"]["endCursor"]
+
+    def get_repositories(self, org_name: str, include_collaborators: bool = True, include_webhooks: bool = True):
+        """Yields the organization's repository nodes page by page as they are fetched."""
+        for nodes, _ in self.get_repository_pages(org_name, include_collaborators, include_webhooks):
+            yield from nodes
+
+    def get_repository_pages(self, org_name: str, include_collaborators: bool = True, include_webhooks: bool = True,
+                             cursor: str = None):
+        """Yields (nodes, end cursor) per page of 50 repositories, starting after cursor if given."""
+        query = """
+        query($login: String!, $cursor: String, $withCollaborators: Boolean = true, $withWebhooks: Boolean = true) {
+            rateLimit {
+                limit
+                cost
+                remaining
+                resetAt
+            }
+            organization(login: $login) {
+                repositories(first: 50, after: $cursor, isArchived: false) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                    nodes {
+                        ...RepositoryFields
+                    }
+                }
+            }
+        }
+        """ + REPOSITORY_FIELDS
+        
         has_next = True
 
         while has_next:
-            variables = {"login": org_name, "cursor": cursor}
-            data = self.query(query, variables)
+            variables = {"login": org_name, "cursor": cursor,
+                         "withCollaborators": include_collaborators, "withWebhooks": include_webhooks}
+            data = self.query(query, variables, owner=org_name)
             org_data = data["data"]["organization"]
             
             if not org_data: # Handle case where org might not be found or empty
                  break
 
             repos = org_data["repositories"]
-            all_repos.extend(repos["nodes"])
-            
             has_next = repos["pageInfo"]["hasNextPage"]
             cursor = repos["pageInfo"]["endCursor"]
+            yield repos["nodes"], cursor
+
+    def get_repositories_by_name(self, full_names: list, include_collaborators: bool = True,
+                                 include_webhooks: bool = True) -> dict:
+        """Fetches specific "owner/name" repositories, TARGETED_BATCH_SIZE per aliased query.
+
+        Returns {"owner/name": node} with the same node shape as get_repositories.
+        Repositories that do not exist or are not visible to the token are left out.
+        """
+        found = {}
+        for start in range(0, len(full_names), TARGETED_BATCH_SIZE):
+            batch = full_names[start:start + TARGETED_BATCH_SIZE]
+            params = ["$withCollaborators: Boolean = true", "$withWebhooks: Boolean = true"]
+            selections = []
+            variables = {"withCollaborators": include_collaborators, "withWebhooks": include_webhooks}
+            for i, full_name in enumerate(batch):
+                owner, name = full_name.split("/", 1)
+                params.append(f"$owner{i}: String!, $name{i}: String!")
+                selections.append(f"r{i}: repository(owner: $owner{i}, name: $name{i}) {{ ...RepositoryFields }}")
+                variables[f"owner{i}"] = owner
+                variables[f"name{i}"] = name
+
+            query = (f"query({', '.join(params)}) {{\n"
+                     "    rateLimit { limit cost remaining resetAt }\n    "
+                     + "\n    ".join(selections)
+                     + "\n}\n" + REPOSITORY_FIELDS)
+            owners = {full_name.split("/", 1)[0] for full_name in batch}
+            # A missing repository is a NOT_FOUND error on its alias only
+            data = self.query(query, variables, allow_partial=True, owner=owners.pop() if len(owners) == 1 else None)
+            result = data.get("data") or {}
+            for i, full_name in enumerate(batch):
+                if result.get(f"r{i}"):
+                    found[full_name] = result[f"r{i}"]
+        return found
+
+    def get_repositories_security_settings(self, repo_ids: list, owner: str = None) -> dict:
+        """Fetches the GraphQL-available per-repo settings for up to 100 repository node ids.
+
+        Returns {id: {"vulnerability_alerts_enabled": ..., "rules_set": ...}} with values
+        shaped like their REST counterparts. A value is None when GraphQL could not
+        provide it, so the caller can fall back to REST for that field only.
+        """
+        query = """
+        query($ids: [ID!]!) {
+            nodes(ids: $ids) {
+                ... on Repository {
+                    id
+                    hasVulnerabilityAlertsEnabled
+                    rulesets(first: 100, includeParents: true) {
+                        pageInfo {
+                            hasNextPage
+                        }
+                        nodes {
+                            id
+                            databaseId
+                            name
+                            target
+                            enforcement
+                            createdAt
+                            updatedAt
+                            source {
+                                __typename
+                                ... on Repository {
+                                    nameWithOwner
+                                }
+                                ... on Organization {
+                                    login
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+        """
+        data = self.query(query, {"ids": repo_ids}, allow_partial=True, owner=owner)
 
-        return all_repos
+        settings = {}
+        for node in (data.get("data") or {}).get("nodes") or []:
+            if not node or "id" not in node:
+                continue
+
+            rules_set = None
+            rulesets = node.get("rulesets")
+            if rulesets is not None and not rulesets["pageInfo"]["hasNextPage"]:
+                rules_set = [self._map_ruleset(r) for r in rulesets["nodes"]]
+
+            settings[node["id"]] = {
+                "vulnerability_alerts_enabled": node.get("hasVulnerabilityAlertsEnabled"),
+                "rules_set": rules_set,
+            }
+        return settings
+
+    def _map_ruleset(self, node: dict) -> dict:
+        # Same shape as GET /repos/{owner}/{repo}/rulesets
+        source = node.get("source") or {}
+        source_type = source.get("__typename", "")
+        return {
+            "id": node.get("databaseId"),
+            "node_id": node.get("id"),
+            "name": node.get("name"),
+            "target": (node.get("target") or "").lower(),
+            "source_type": source_type,
+            "source": source.get("nameWithOwner") if source_type == "Repository" else source.get("login"),
+            "enforcement": (node.get("enforcement") or "").lower(),
+            "created_at": node.get("createdAt"),
+            "updated_at": node.get("updatedAt"),
+        }
 
     def get_organization_details(self, org_name: str) -> dict:
         query = """
@@ -136,12 +406,18 @@ class GitHubClient:
         }
         """
         variables = {"login": org_name}
-        data = self.query(query, variables)
+        data = self.query(query, variables, owner=org_name)
         return data["data"]["organization"]
 
     def get_members(self, org_name: str) -> list:
         query = """
         query($login: String!, $cursor: String) {
+            rateLimit {
+                limit
+                cost
+                remaining
+                resetAt
+            }
             organization(login: $login) {
                 membersWithRole(first: 50, after: $cursor) {
                     pageInfo {
@@ -170,7 +446,7 @@ class GitHubClient:
 
         while has_next:
             variables = {"login": org_name, "cursor": cursor}
-            data = self.query(query, variables)
+            data = self.query(query, variables, owner=org_name)
             org_data = data["data"]["organization"]
             
             if not org_data:
@@ -199,16 +475,71 @@ class GitHubClient:
         return all_members
 
     # REST API Helpers
+    def get_token_scopes(self):
+        """Returns the OAuth scopes of a classic token, or None if the token does not report them
+        (fine-grained and GitHub App tokens)."""
+        response = self._request("GET", f"{self.rest_endpoint}/rate_limit")
+        header = response.headers.get("X-OAuth-Scopes")
+        return None if header is None else parse_scopes(header)
+
+    def _record_rest_failure(self, key, credential, response: requests.Response) -> bool:
+        """Records a 403/404 of credential; True if no other repository or org will accept it here."""
+        reason = f"{response.status_code} {'Forbidden' if response.status_code == 403 else 'Not Found'}"
+        accepted = parse_scopes(response.headers.get("X-Accepted-OAuth-Scopes"))
+        granted = response.headers.get("X-OAuth-Scopes")
+        token_wide = False
+        if accepted and granted is not None and not accepted & expand_scopes(parse_scopes(granted)):
+            # No repository or org will accept this token here
+            token_wide = True
+            reason += f", token lacks one of the scopes: {', '.join(sorted(accepted))}"
+        self.negative_cache.record_failure(key, credential, reason, token_wide=token_wide)
+        return token_wide
+
+    def _get_rest_response(self, path: str, headers: dict, not_found_ok: bool = False):
+        """GETs path with a credential the endpoint class is not blocked for, or returns None.
+
+        A credential that lacks the scope altogether hands the call over to the
+        next eligible one, so one under-scoped token in the pool does not hide
+        the endpoint from the others.
+        """
+        key = endpoint_class(path)
+        candidates = self.negative_cache.unblocked(key, self.credentials.eligible(key[0] or None))
+        while candidates:
+            response, credential = self._request_with_credential("GET", f"{self.rest_endpoint}{path}",
+                                                                 candidates=candidates, headers=headers)
+            if response.status_code == 403 or (response.status_code == 404 and not not_found_ok):
+                if self._record_rest_failure(key, credential, response):
+                    candidates = [c for c in candidates if c is not credential]
+                    if candidates:
+                        continue
+            elif response.status_code < 400:
+                self.negative_cache.record_success(key, credential)
+            return response
+        return None
+
     def _get_rest(self, path: str):
         url = f"{self.rest_endpoint}{path}"
         headers = {
-            "Authorization": f"Bearer {self.token}",
             "Accept": "application/vnd.github.v3+json",
             "X-GitHub-Api-Version": "2022-11-28"
         }
-        response = requests.get(url, headers=headers)
+        cached = None
+        if self.response_cache:
+            cached = self.response_cache.get(url)
+            headers.update(self.response_cache.conditional_headers(cached))
+
+        response = self._get_rest_response(path, headers)
+        if response is None:
+            return None
+
+        if response.status_code == 304 and cached:
+            self.response_cache.record_hit()
+            return cached["body"]
         if response.status_code == 200:
-            return response.json()
+            body = response.json()
+            if self.response_cache:
+                self.response_cache.store(url, response.headers, body)
+            return body
         elif response.status_code == 204: # No content, sometimes used for boolean checks
             return True
         return None
@@ -230,10 +561,10 @@ class GitHubClient:
         return self._get_rest(f"/repos/{owner}/{repo}/rulesets") or []
 
     def check_vulnerability_alerts(self, owner: str, repo: str) -> bool:
-        url = f"{self.rest_endpoint}/repos/{owner}/{repo}/vulnerability-alerts"
-        headers = {"Authorization": f"Bearer {self.token}", "Accept": "application/vnd.github.v3+json"}
-        resp = requests.get(url, headers=headers)
-        return resp.status_code == 204
+        path = f"/repos/{owner}/{repo}/vulnerability-alerts"
+        # A 404 here means "alerts disabled", so only 403s count as failures
+        resp = self._get_rest_response(path, {"Accept": "application/vnd.github.v3+json"}, not_found_ok=True)
+        return resp is not None and resp.status_code == 204
 
     def get_security_analysis(self, owner: str, repo: str) -> dict:
         # Fetch full repo details via REST to get security_and_analysis
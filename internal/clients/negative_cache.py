@@ -0,0 +1,112 @@
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Consecutive failures of one endpoint class in one org, without any success,
+# before the remaining calls are skipped. Kept high since per-repository admin
+# rights differ: a few 403s can be genuine per-repository results.
+DEFAULT_FAILURE_THRESHOLD = 20
+
+# Classic token scopes that grant narrower ones
+SCOPE_IMPLIES = {
+    "repo": {"repo:status", "repo_deployment", "public_repo", "repo:invite", "security_events",
+             "admin:repo_hook", "write:repo_hook", "read:repo_hook"},
+    "admin:org": {"write:org", "read:org", "manage_runners:org"},
+    "write:org": {"read:org"},
+    "admin:repo_hook": {"write:repo_hook", "read:repo_hook"},
+    "write:repo_hook": {"read:repo_hook"},
+    "admin:enterprise": {"manage_runners:enterprise", "manage_billing:enterprise", "read:enterprise"},
+    "user": {"read:user", "user:email", "user:follow"},
+}
+
+repo_path_pattern = re.compile(r'^/repos/([^/]+)/[^/]+(/.*)?$')
+org_path_pattern = re.compile(r'^/orgs/([^/]+)(/.*)?$')
+
+
+def parse_scopes(value: Optional[str]) -> Set[str]:
+    """Parses an X-OAuth-Scopes header or a `requiredScopes: [a, b]` metadata value."""
+    if not value:
+        return set()
+    return {scope.strip() for scope in value.strip("[] ").split(",") if scope.strip()}
+
+
+def expand_scopes(scopes: Iterable[str]) -> Set[str]:
+    expanded = set(scopes)
+    pending = list(expanded)
+    while pending:
+        for implied in SCOPE_IMPLIES.get(pending.pop(), ()):
+            if implied not in expanded:
+                expanded.add(implied)
+                pending.append(implied)
+    return expanded
+
+
+def missing_scopes(required: Iterable[str], granted: Iterable[str]) -> Set[str]:
+    return set(required) - expand_scopes(granted)
+
+
+def endpoint_class(path: str) -> Tuple[str, str]:
+    """Maps a REST path to (owner, endpoint class), e.g. ("my-org", "/repos/{repo}/actions/secrets")."""
+    match = repo_path_pattern.match(path)
+    if match:
+        return match.group(1), "/repos/{repo}" + (match.group(2) or "")
+    match = org_path_pattern.match(path)
+    if match:
+        return match.group(1), "/orgs/{org}" + (match.group(2) or "")
+    return "", path
+
+
+class NegativeResultCache:
+    """Remembers REST endpoint classes that are forbidden for a credential, per owner.
+
+    A class is blocked for a credential immediately when GitHub reports a
+    missing OAuth scope (a token-wide failure), or after threshold consecutive
+    403/404 responses in an org where it never succeeded for that credential.
+    Other credentials in the pool may still have access, so calls are only
+    skipped once every eligible credential is blocked; skipped calls are
+    counted so the skipped checks can be reported once at the end of the scan.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_FAILURE_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._failures: Dict[Tuple[str, str, object], int] = {}
+        self._succeeded: Set[Tuple[str, str, object]] = set()
+        self.blocked: Dict[Tuple[str, str, object], str] = {}
+        self.skipped: Dict[Tuple[str, str], int] = {}
+
+    def unblocked(self, key: Tuple[str, str], credentials: Iterable) -> List:
+        """The credentials that may still call key; an empty list counts as a skipped call."""
+        with self._lock:
+            usable = [c for c in credentials if (*key, c) not in self.blocked]
+            if not usable:
+                self.skipped[key] = self.skipped.get(key, 0) + 1
+            return usable
+
+    def record_success(self, key: Tuple[str, str], credential):
+        with self._lock:
+            self._succeeded.add((*key, credential))
+            self._failures.pop((*key, credential), None)
+
+    def record_failure(self, key: Tuple[str, str], credential, reason: str, token_wide: bool = False):
+        entry = (*key, credential)
+        with self._lock:
+            if entry in self.blocked:
+                return
+            if token_wide:
+                self.blocked[entry] = reason
+                return
+            if entry in self._succeeded:
+                return
+            self._failures[entry] = self._failures.get(entry, 0) + 1
+            if self._failures[entry] >= self.threshold:
+                self.blocked[entry] = reason
+
+    def report(self) -> List[str]:
+        reasons: Dict[Tuple[str, str], str] = {}
+        for (owner, endpoint, _), reason in self.blocked.items():
+            reasons.setdefault((owner, endpoint), reason)
+        lines = []
+        for (owner, endpoint), count in sorted(self.skipped.items()):
+            lines.append(f"Skipped {count} calls to {endpoint} in {owner or 'all owners'}: {reasons[(owner, endpoint)]}")
+        return lines
@@ -0,0 +1,134 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+REST = "rest"
+GRAPHQL = "graphql"
+
+
+class RateLimitBudget:
+    """Last known state of one GitHub rate limit bucket."""
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None  # epoch seconds
+        self.blocked_until: float = 0.0        # secondary rate limit pause
+        self.next_request_at: float = 0.0      # pacing slot
+        self.cost: int = 1                     # points per request (GraphQL queries can cost more)
+        self.in_flight: int = 0
+
+    def fraction_left(self) -> float:
+        if not self.limit or self.remaining is None:
+            return 1.0
+        return max(0.0, self.remaining / self.limit)
+
+
+class RateLimitScheduler:
+    """Central gate every GitHub API call goes through.
+
+    Tracks the REST and GraphQL budgets separately from the X-RateLimit-* headers
+    (and the GraphQL rateLimit object when a query asks for it), and before each
+    request:
+      - sleeps until the reset time when the budget is exhausted, or until a
+        Retry-After pause ends,
+      - shrinks the number of concurrent requests as the budget drains,
+      - once less than pace_threshold of the budget is left, spaces requests
+        evenly so the rest lasts until the reset instead of being burnt at once.
+    """
+
+    def __init__(self, max_concurrency: int = 8, pace_threshold: float = 0.5):
+        self.max_concurrency = max_concurrency
+        self.pace_threshold = pace_threshold
+        self.budgets: Dict[str, RateLimitBudget] = {REST: RateLimitBudget(), GRAPHQL: RateLimitBudget()}
+        self._cond = threading.Condition()
+
+    def concurrency_limit(self, resource: str) -> int:
+        fraction = self.budgets[resource].fraction_left()
+        if fraction >= self.pace_threshold:
+            return self.max_concurrency
+        return max(1, math.ceil(self.max_concurrency * fraction / self.pace_threshold))
+
+    def _blocked_for(self, budget: RateLimitBudget, now: float) -> float:
+        wait = budget.blocked_until - now
+        if budget.remaining is not None and budget.remaining <= 0 and budget.reset_at:
+            wait = max(wait, budget.reset_at - now)
+        return max(0.0, wait)
+
+    def _pacing_interval(self, budget: RateLimitBudget, now: float) -> float:
+        if budget.fraction_left() >= self.pace_threshold or not budget.reset_at or not budget.remaining:
+            return 0.0
+        return max(0.0, budget.reset_at - now) * budget.cost / budget.remaining
+
+    def acquire(self, resource: str):
+        budget = self.budgets[resource]
+        with self._cond:
+            while True:
+                now = time.time()
+                blocked = self._blocked_for(budget, now)
+                if blocked > 0:
+                    self._cond.release()
+                    try:
+                        time.sleep(blocked)
+                    finally:
+                        self._cond.acquire()
+                    continue
+                if budget.in_flight < self.concurrency_limit(resource):
+                    break
+                self._cond.wait(timeout=1.0)
+
+            budget.in_flight += 1
+            start = max(now, budget.next_request_at)
+            budget.next_request_at = start + self._pacing_interval(budget, now)
+
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, resource: str):
+        with self._cond:
+            self.budgets[resource].in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, resource: str):
+        self.acquire(resource)
+        try:
+            yield
+        finally:
+            self.release(resource)
+
+    def update_from_headers(self, resource: str, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        with self._cond:
+            budget = self.budgets[resource]
+            budget.remaining = int(remaining)
+            if headers.get("X-RateLimit-Limit"):
+                budget.limit = int(headers["X-RateLimit-Limit"])
+            if headers.get("X-RateLimit-Reset"):
+                budget.reset_at = float(headers["X-RateLimit-Reset"])
+            self._cond.notify_all()
+
+    def update_from_graphql(self, rate_limit: dict):
+        """Updates the GraphQL budget from a `rateLimit { limit cost remaining resetAt }` object."""
+        with self._cond:
+            budget = self.budgets[GRAPHQL]
+            if rate_limit.get("remaining") is not None:
+                budget.remaining = rate_limit["remaining"]
+            if rate_limit.get("limit") is not None:
+                budget.limit = rate_limit["limit"]
+            if rate_limit.get("cost"):
+                budget.cost = rate_limit["cost"]
+            if rate_limit.get("resetAt"):
+                budget.reset_at = datetime.fromisoformat(rate_limit["resetAt"].replace("Z", "+00:00")).timestamp()
+            self._cond.notify_all()
+
+    def pause(self, resource: str, seconds: float):
+        """Blocks every caller of this resource for the given time (e.g. Retry-After)."""
+        with self._cond:
+            budget = self.budgets[resource]
+            budget.blocked_until = max(budget.blocked_until, time.time() + seconds)
@@ -0,0 +1,50 @@
+import hashlib
+from typing import Any, Dict, Optional
+
+from internal.common.disk_lru import CacheStats, DiskLRUStore
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ResponseCache(CacheStats):
+    """On-disk cache of REST responses for conditional (If-None-Match) requests.
+
+    Each entry holds the body plus the ETag / Last-Modified validators of one URL.
+    Entries are keyed per token so a cache directory can be shared between
+    credentials with different access. Hits count 304s served from the cache,
+    misses count responses fetched and stored.
+    """
+
+    def __init__(self, cache_dir: str, token: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        super().__init__()
+        self.cache_dir = cache_dir
+        self.disk = DiskLRUStore(cache_dir, max_bytes)
+        self._token_key = hashlib.sha256(token.encode()).hexdigest()[:16]
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(f"{self._token_key}:{url}".encode()).hexdigest()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        return self.disk.get(self._key(url))
+
+    def conditional_headers(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, response_headers, body: Any):
+        self.record_miss()
+
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+
+        self.disk.put(self._key(url), {"url": url, "etag": etag, "last_modified": last_modified, "body": body})
+
+    def report(self) -> str:
+        return f"HTTP cache: {self.stats_summary()}, {self.disk.usage()}"
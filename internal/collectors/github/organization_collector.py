@@ -4,9 +4,13 @@ from internal.common.types import Organization, Hook, OrganizationSecret
 from internal.collectors.base_collector import Collector
 
 class OrganizationCollector(Collector):
-    def __init__(self, client: GitHubClient, org: str):
+    def __init__(self, client: GitHubClient, org: str, plan=None):
         self.client = client
         self.org = org
+        self.plan = plan  # CollectionPlan; None collects everything
+
+    def _needs(self, step: str) -> bool:
+        return self.plan is None or self.plan.needs("organization", step)
 
     def get_namespace(self) -> str:
         return "organization"
@@ -16,7 +20,7 @@ class OrganizationCollector(Collector):
         details = self.client.get_organization_details(self.org)
         
         # Collect webhooks (REST)
-        hooks_data = self.client.get_organization_webhooks(self.org)
+        hooks_data = self.client.get_organization_webhooks(self.org) if self._needs("hooks") else []
         hooks = []
         for h in hooks_data:
             hooks.append(Hook(
@@ -26,7 +30,7 @@ class OrganizationCollector(Collector):
             ))
 
         # Collect Organization Secrets
-        secrets_data = self.client.get_organization_secrets(self.org)
+        secrets_data = self.client.get_organization_secrets(self.org) if self._needs("organization_secrets") else []
         org_secrets = []
         for s in secrets_data:
             org_secrets.append(OrganizationSecret(
@@ -1,57 +1,125 @@
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 from internal.clients.github_client import GitHubClient
 from internal.common.types import Repository, Ref, BranchProtectionRule, Hook, RepositorySecret
 from internal.common import types
 from internal.collectors.base_collector import Collector
 
+# Repositories per aliased `nodes(ids: [...])` GraphQL query
+GRAPHQL_BATCH_SIZE = 50
+
+# Repositories mapped and enriched at a time while streaming (one listing page)
+PAGE_SIZE = 50
+
 class RepositoryCollector(Collector):
-    def __init__(self, client: GitHubClient, org: str):
+    def __init__(self, client: GitHubClient, org: str, concurrency: int = 1, graphql_enrichment: bool = False,
+                 plan=None):
         self.client = client
         self.org = org
+        self.concurrency = concurrency
+        self.graphql_enrichment = graphql_enrichment
+        self.plan = plan  # CollectionPlan; None collects everything
+
+    def _needs(self, field: str) -> bool:
+        return self.plan is None or self.plan.needs("repository", field)
+
+    def _listing_options(self) -> Dict[str, bool]:
+        return {"include_collaborators": self._needs("collaborators"), "include_webhooks": self._needs("hooks")}
 
     def get_namespace(self) -> str:
         return "repository"
 
     def collect(self) -> List[Repository]:
-        raw_repos = self.client.get_repositories(self.org)
-        collected_repos = []
+        return list(self.stream())
 
-        for raw in raw_repos:
-            repo = self._map_repo(raw)
-            
-            # Fetch extra data via REST
-            owner = self.org
-            repo_name = repo.name
-            
+    def stream(self) -> Iterator[Repository]:
+        """Yields enriched repositories one page at a time, so memory is bounded by the page size."""
+        for page in self.pages():
+            self.enrich(page)
+            yield from page
+
+    def collect_by_name(self, names: List[str]) -> List[Repository]:
+        """Fetches and enriches only the named repositories of this owner, skipping the org listing."""
+        raw_repos = self.client.get_repositories_by_name([f"{self.org}/{name}" for name in names],
+                                                         **self._listing_options())
+        repos = [self._map_repo(raw_repos[f"{self.org}/{name}"]) for name in names if f"{self.org}/{name}" in raw_repos]
+        self.enrich(repos)
+        return repos
+
+    def pages(self) -> Iterator[List[Repository]]:
+        """Yields pages of repositories from the GraphQL listing only, without REST enrichment."""
+        raw_repos = iter(self.client.get_repositories(self.org, **self._listing_options()))
+        while True:
+            page = [self._map_repo(raw) for raw in islice(raw_repos, PAGE_SIZE)]
+            if not page:
+                return
+            yield page
+
+    def resumable_pages(self, cursor: str = None) -> Iterator[Tuple[List[Repository], str]]:
+        """Yields (enriched page, end cursor) starting after cursor, so a scan can resume where it stopped."""
+        for raw_page, end_cursor in self.client.get_repository_pages(self.org, cursor=cursor, **self._listing_options()):
+            page = [self._map_repo(raw) for raw in raw_page]
+            self.enrich(page)
+            yield page, end_cursor
+
+    def _enrichments(self) -> List[Tuple[str, Callable[[str], Any]]]:
+        # (Repository field, REST fetcher) pairs filled in after the GraphQL listing
+        enrichments = [
+            ("repo_secrets", self._fetch_secrets),
+            ("actions_token_permissions", lambda name: self.client.get_actions_permissions(self.org, name)),
+            ("rules_set", lambda name: self.client.get_rulesets(self.org, name)),
+            ("vulnerability_alerts_enabled", lambda name: self.client.check_vulnerability_alerts(self.org, name)),
+            ("security_and_analysis", lambda name: self.client.get_security_analysis(self.org, name)),
+        ]
+        return [(field, fetch) for field, fetch in enrichments if self._needs(field)]
+
+    def _fetch_secrets(self, repo_name: str) -> List[RepositorySecret]:
+        secrets = self.client.get_repository_secrets(self.org, repo_name)
+        return [types.RepositorySecret(name=s["name"], update_date=s.get("updated_at", "")) for s in secrets]
+
+    def _fetch_graphql_settings(self, repos: List[Repository]) -> Dict[str, Dict[str, Any]]:
+        settings = {}
+        for start in range(0, len(repos), GRAPHQL_BATCH_SIZE):
+            ids = [r.id for r in repos[start:start + GRAPHQL_BATCH_SIZE]]
             try:
-                # Secrets
-                secrets = self.client.get_repository_secrets(owner, repo_name)
-                for s in secrets:
-                    repo.repo_secrets.append(types.RepositorySecret(
-                        name=s["name"],
-                        update_date=s.get("updated_at", "")
-                    ))
-                
-                # Actions Permissions
-                repo.actions_token_permissions = self.client.get_actions_permissions(owner, repo_name)
-                
-                # Rulesets
-                repo.rules_set = self.client.get_rulesets(owner, repo_name)
-                
-                # Vulnerability Alerts
-                repo.vulnerability_alerts_enabled = self.client.check_vulnerability_alerts(owner, repo_name)
-                
-                # Security & Analysis
-                repo.security_and_analysis = self.client.get_security_analysis(owner, repo_name)
-                
-            except Exception as e:
-                # Log error but continue
-                # print(f"Error collecting details for {repo_name}: {e}")
+                settings.update(self.client.get_repositories_security_settings(ids, owner=self.org))
+            except Exception:
+                # The whole batch falls back to REST
                 pass
-            
-            collected_repos.append(repo)
+        return settings
+
+    def enrich(self, repos: List[Repository]):
+        enrichments = self._enrichments()
+        graphql_fields = {"vulnerability_alerts_enabled", "rules_set"} & {field for field, _ in enrichments}
+        graphql_settings = self._fetch_graphql_settings(repos) if self.graphql_enrichment and graphql_fields else {}
+
+        # Every (repo, field) call is independent, so a failure only leaves that field at its default
+        tasks = []
+        for repo in repos:
+            settings = graphql_settings.get(repo.id, {})
+            for field, fetch in enrichments:
+                if settings.get(field) is not None:
+                    setattr(repo, field, settings[field])
+                else:
+                    tasks.append((repo, field, fetch))
+
+        if self.concurrency <= 1:
+            for repo, field, fetch in tasks:
+                try:
+                    setattr(repo, field, fetch(repo.name))
+                except Exception:
+                    pass
+            return
 
-        return collected_repos
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(fetch, repo.name): (repo, field) for repo, field, fetch in tasks}
+            for future in as_completed(futures):
+                repo, field = futures[future]
+                try:
+                    setattr(repo, field, future.result())
+                except Exception:
+                    pass
 
     def _map_repo(self, raw: dict) -> Repository:
         default_branch = None
@@ -102,6 +170,7 @@ class RepositoryCollector(Collector):
             is_private=raw["isPrivate"],
             is_archived=raw["isArchived"],
             pushed_at=raw["pushedAt"],
+            updated_at=raw.get("updatedAt"),
             default_branch=default_branch,
             collaborators=collaborators,
             hooks=hooks
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+CHECKPOINT_VERSION = 2
+
+
+class ScanCheckpoint:
+    """Append-only log of the finished parts of a scan, so an interrupted scan can be resumed.
+
+    Each line records either a finished unit (an organization namespace) or a
+    finished page of an organization's repositories with its listing cursor,
+    together with the violations they produced. Lines are flushed and synced
+    as they are written, so at most the unit or page in progress is lost. On
+    resume, recorded violations are replayed and the repository listing
+    continues after the last recorded cursor.
+    """
+
+    def __init__(self, path: str, key: str, resume: bool = False):
+        self.path = path
+        self.key = key
+        self.units: Dict[str, List[Dict[str, Any]]] = {}
+        self.repo_pages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()  # namespaces and organizations finish on different threads
+
+        resumed = resume and os.path.exists(path)
+        if resumed:
+            self._load()
+        self._file = open(path, 'a' if resumed else 'w', encoding='utf-8')
+        if not resumed:
+            self._append({"version": CHECKPOINT_VERSION, "key": key})
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            lines = f.read().split(b"\n")
+        valid_bytes = 0
+        for i, line in enumerate(lines):
+            if i == len(lines) - 1:
+                break  # after the last newline; anything here was cut off mid-write
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if i == 0:
+                if entry.get("version") != CHECKPOINT_VERSION or entry.get("key") != self.key:
+                    raise Exception(f"Checkpoint {self.path} belongs to a different scan (other targets, namespaces "
+                                    "or policies); remove it or drop --resume")
+            elif "unit" in entry:
+                self.units[entry["unit"]] = entry["violations"]
+            else:
+                progress = self.repo_pages.setdefault(entry["org"], {"cursor": None, "violations": []})
+                progress["cursor"] = entry["cursor"]
+                progress["violations"].extend(entry["violations"])
+            valid_bytes += len(line) + 1
+        if valid_bytes == 0:
+            raise Exception(f"Checkpoint {self.path} is empty or corrupt")
+        # Drop a partially written last line so new entries start on a line of their own
+        with open(self.path, 'r+b') as f:
+            f.truncate(valid_bytes)
+
+    def _append(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def completed(self, unit: str) -> Optional[List[Dict[str, Any]]]:
+        """The violations of a finished unit, or None if it still has to run."""
+        return self.units.get(unit)
+
+    def repo_progress(self, org: str) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """The cursor after the last finished repository page of org and the violations found so far."""
+        progress = self.repo_pages.get(org, {"cursor": None, "violations": []})
+        return progress["cursor"], progress["violations"]
+
+    def record_unit(self, unit: str, violations: List[Dict[str, Any]]):
+        self._append({"unit": unit, "violations": violations})
+
+    def record_repo_page(self, org: str, cursor: Optional[str], violations: List[Dict[str, Any]]):
+        self._append({"org": org, "cursor": cursor, "violations": violations})
+
+    def report(self) -> str:
+        return (f"Resumed from {self.path}: {len(self.units)} finished units, "
+                f"repository progress in {len(self.repo_pages)} organizations")
+
+    def close(self):
+        self._file.close()
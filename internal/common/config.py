@@ -1,5 +1,5 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, List
 
 @dataclass
@@ -16,6 +16,36 @@ class Config:
     scm_type: str
     ignore_policies_file: Optional[str] = None
     enterprise_url: Optional[str] = None
+    opa_mode: str = "eval"
+    eval_batch_size: int = 100
+    eval_workers: int = 1
+    http_pool_size: int = 10
+    http_cache_dir: Optional[str] = None
+    http_cache_size: int = 256
+    concurrency: int = 8
+    graphql_enrichment: bool = False
+    policy_cache: bool = True
+    policy_cache_dir: Optional[str] = None
+    incremental_state: Optional[str] = None
+    incremental_max_age: float = 7.0
+    org_concurrency: int = 4
+    namespace_concurrency: int = 2
+    pipeline_queue_size: int = 200
+    snapshot_out: Optional[str] = None
+    from_snapshot: Optional[str] = None
+    eval_memo: bool = True
+    eval_memo_dir: Optional[str] = None
+    eval_memo_size: int = 256
+    eval_memo_time_window: float = 24.0
+    checkpoint: Optional[str] = None
+    resume: bool = False
+    work_queue: Optional[str] = None
+    queue_role: Optional[str] = None
+    queue_lease: int = 600
+    extra_tokens: List[str] = field(default_factory=list)
+    github_apps: List[str] = field(default_factory=list)
+    policies: List[str] = field(default_factory=list)
+    min_severity: Optional[str] = None
 
 class ConfigManager:
     _instance = None
@@ -69,6 +99,66 @@ class ConfigManager:
             self.config.scm_type = args.get("scm")
         if args.get("ignore_policies_file"):
             self.config.ignore_policies_file = args.get("ignore_policies_file")
+        if args.get("policy"):
+            self.config.policies = list(args.get("policy"))
+        if args.get("min_severity"):
+            self.config.min_severity = args.get("min_severity").upper()
+        if args.get("opa_mode"):
+            self.config.opa_mode = args.get("opa_mode")
+        if args.get("eval_batch_size"):
+            self.config.eval_batch_size = args.get("eval_batch_size")
+        if args.get("eval_workers"):
+            self.config.eval_workers = args.get("eval_workers")
+        if args.get("concurrency"):
+            self.config.concurrency = args.get("concurrency")
+        if args.get("graphql_enrichment"):
+            self.config.graphql_enrichment = True
+        if args.get("http_pool_size"):
+            self.config.http_pool_size = args.get("http_pool_size")
+        if args.get("http_cache_dir"):
+            self.config.http_cache_dir = args.get("http_cache_dir")
+        if args.get("http_cache_size"):
+            self.config.http_cache_size = args.get("http_cache_size")
+        if args.get("policy_cache_dir"):
+            self.config.policy_cache_dir = args.get("policy_cache_dir")
+        if args.get("no_policy_cache"):
+            self.config.policy_cache = False
+        if args.get("incremental_state"):
+            self.config.incremental_state = args.get("incremental_state")
+        if args.get("incremental_max_age") is not None:
+            self.config.incremental_max_age = args.get("incremental_max_age")
+        if args.get("org_concurrency"):
+            self.config.org_concurrency = args.get("org_concurrency")
+        if args.get("namespace_concurrency"):
+            self.config.namespace_concurrency = args.get("namespace_concurrency")
+        if args.get("pipeline_queue_size"):
+            self.config.pipeline_queue_size = args.get("pipeline_queue_size")
+        if args.get("snapshot_out"):
+            self.config.snapshot_out = args.get("snapshot_out")
+        if args.get("from_snapshot"):
+            self.config.from_snapshot = args.get("from_snapshot")
+        if args.get("no_eval_memo"):
+            self.config.eval_memo = False
+        if args.get("eval_memo_dir"):
+            self.config.eval_memo_dir = args.get("eval_memo_dir")
+        if args.get("eval_memo_size"):
+            self.config.eval_memo_size = args.get("eval_memo_size")
+        if args.get("eval_memo_time_window") is not None:
+            self.config.eval_memo_time_window = args.get("eval_memo_time_window")
+        if args.get("checkpoint"):
+            self.config.checkpoint = args.get("checkpoint")
+        if args.get("resume"):
+            self.config.resume = True
+        if args.get("work_queue"):
+            self.config.work_queue = args.get("work_queue")
+        if args.get("queue_role"):
+            self.config.queue_role = args.get("queue_role")
+        if args.get("queue_lease"):
+            self.config.queue_lease = args.get("queue_lease")
+        if args.get("extra_token"):
+            self.config.extra_tokens = list(args.get("extra_token"))
+        if args.get("github_app"):
+            self.config.github_apps = list(args.get("github_app"))
         if args.get("enterprise"):
             # Enterprise collector usually takes slugs, but client might need URL?
             # Go analyze args: enterprise (slugs).
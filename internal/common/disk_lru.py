@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+from typing import Any, Optional
+
+
+class CacheStats:
+    """Hit and miss counters shared by the caches, safe to update from several threads."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def record_hit(self):
+        with self._stats_lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._stats_lock:
+            self.misses += 1
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats_summary(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_ratio():.1%} hit ratio)"
+
+
+class DiskLRUStore:
+    """Directory of JSON entries bounded to max_bytes.
+
+    Entries are written atomically (a temporary file renamed into place), so
+    concurrent runs sharing the directory never read a partial entry. Reads
+    touch the file's mtime, and once the directory grows past max_bytes the
+    least recently used entries are removed until 90% of the budget is left.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.size = sum(os.path.getsize(p) for p in self._entry_paths())
+
+    def _entry_paths(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                yield os.path.join(self.directory, name)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)  # mark as recently used
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: Any):
+        data = json.dumps(value).encode("utf-8")
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.size += len(data) - old_size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(((os.path.getmtime(p), p) for p in self._entry_paths()))
+        for _, path in entries:
+            if self.size <= target:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+            self.evictions += 1
+
+    def usage(self) -> str:
+        return f"{self.evictions} evictions, {self.size / (1024 * 1024):.1f} MB on disk"
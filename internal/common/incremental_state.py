@@ -0,0 +1,103 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+from internal.common.types import Repository
+
+STATE_VERSION = 2
+
+# Fields filled by REST enrichment; excluded from the listing hash since they are not known yet.
+# Collaborators and hooks come with the listing itself, so a change to them invalidates the entry.
+ENRICHED_FIELDS = {
+    "repo_secrets", "actions_token_permissions",
+    "rules_set", "vulnerability_alerts_enabled", "security_and_analysis",
+}
+
+
+class IncrementalState:
+    """Local store of per-repository change markers and the violations of the last scan.
+
+    A repository is considered unchanged when its pushedAt / updatedAt markers
+    and the hash of its listing-stage settings match the stored entry. Entries
+    are dropped when the policies change, and are rescanned once older than
+    max_age_days so settings that move neither marker (secrets, rulesets, alert
+    toggles) are still picked up eventually.
+    """
+
+    def __init__(self, path: str, policy_hash: str, max_age_days: float = 7):
+        self.path = path
+        self.policy_hash = policy_hash
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.repos: Dict[str, Dict[str, Any]] = {}
+        self.reused = 0
+        self.rescanned = 0
+        self._lock = threading.Lock()  # organizations may be scanned concurrently
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("version") != STATE_VERSION or state.get("policy_hash") != self.policy_hash:
+            return
+        self.repos = state.get("repos", {})
+
+    @staticmethod
+    def settings_hash(repo: Repository) -> str:
+        data = repo.model_dump(mode="json", exclude=ENRICHED_FIELDS)
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def is_unchanged(self, org: str, repo: Repository) -> bool:
+        entry = self.repos.get(repo.id)
+        if not entry:
+            return False
+        return (entry["org"] == org
+                and entry["pushed_at"] == repo.pushed_at
+                and entry["updated_at"] == repo.updated_at
+                and entry["settings_hash"] == self.settings_hash(repo)
+                and time.time() - entry["scanned_at"] < self.max_age_seconds)
+
+    def violations(self, repo: Repository) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.reused += 1
+            return copy.deepcopy(self.repos[repo.id]["violations"])
+
+    def record(self, org: str, repo: Repository, violations: List[Dict[str, Any]]):
+        """Stores the violations of a freshly evaluated repository."""
+        entry = {
+            "org": org,
+            "name": repo.name,
+            "pushed_at": repo.pushed_at,
+            "updated_at": repo.updated_at,
+            "settings_hash": self.settings_hash(repo),
+            "scanned_at": time.time(),
+            "violations": copy.deepcopy(violations),
+        }
+        with self._lock:
+            self.rescanned += 1
+            self.repos[repo.id] = entry
+
+    def prune(self, org: str, seen_ids: Iterable[str]):
+        """Forgets repositories of org that no longer show up in its listing."""
+        seen = set(seen_ids)
+        with self._lock:
+            for repo_id in [k for k, v in self.repos.items() if v["org"] == org and k not in seen]:
+                del self.repos[repo_id]
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": STATE_VERSION, "policy_hash": self.policy_hash, "repos": self.repos}, f)
+            os.replace(tmp_path, self.path)
+
+    def report(self) -> str:
+        return f"Incremental scan: {self.rescanned} repositories rescanned, {self.reused} unchanged"
@@ -0,0 +1,90 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+# Items buffered between a producer and its consumer
+DEFAULT_QUEUE_SIZE = 200
+
+_DONE = object()
+
+
+def prefetch(iterable: Iterable[T], maxsize: int = DEFAULT_QUEUE_SIZE) -> Iterator[T]:
+    """Iterates iterable on a background thread, handing items over through a bounded queue.
+
+    Lets a network-bound producer (collection) run ahead of a CPU-bound consumer
+    (evaluation) by at most maxsize items; a full queue blocks the producer.
+    Exceptions raised by the producer are re-raised in the consumer, and closing
+    the returned iterator early stops the producer after its current item.
+    """
+    items: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    producer = threading.Thread(target=produce, name="pipeline-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+class OrderedEmitter:
+    """Keeps the output of concurrent tasks in their planned order.
+
+    Each task emits through its own channel. The earliest unfinished task
+    streams straight through to emit; later tasks are buffered until every
+    task before them has finished, and are then flushed in order.
+    """
+
+    def __init__(self, emit: Callable[[T], None], count: int):
+        self._emit = emit
+        self._buffers: List[List[T]] = [[] for _ in range(count)]
+        self._finished = [False] * count
+        self._head = 0
+        self._lock = threading.Lock()
+
+    def channel(self, index: int) -> Callable[[T], None]:
+        def emit(item: T):
+            with self._lock:
+                if index == self._head:
+                    self._emit(item)
+                else:
+                    self._buffers[index].append(item)
+        return emit
+
+    def finish(self, index: int):
+        """Marks a task done, whether it succeeded or failed."""
+        with self._lock:
+            self._finished[index] = True
+            while self._head < len(self._finished) and self._finished[self._head]:
+                self._head += 1
+                if self._head < len(self._buffers):
+                    for item in self._buffers[self._head]:
+                        self._emit(item)
+                    self._buffers[self._head] = []
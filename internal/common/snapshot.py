@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def _stream_path(path: str, namespace: str) -> str:
+    return os.path.join(path, f"{namespace}.jsonl.gz")
+
+
+class SnapshotWriter:
+    """Writes collected entities to a snapshot directory, one gzipped JSON-lines stream per namespace.
+
+    Each line holds the evaluation target name and the exact OPA input built for
+    it, so a snapshot can be evaluated later without a token or network access.
+    """
+
+    def __init__(self, path: str, scm: str = "github"):
+        self.path = path
+        self.scm = scm
+        self.counts: Dict[str, int] = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def write(self, namespace: str, target: str, input_data: Dict[str, Any]):
+        line = json.dumps({"target": target, "input": input_data}, separators=(",", ":")) + "\n"
+        with self._lock:
+            stream = self._streams.get(namespace)
+            if stream is None:
+                stream = gzip.open(_stream_path(self.path, namespace), 'wt', encoding='utf-8')
+                self._streams[namespace] = stream
+                self.counts[namespace] = 0
+            stream.write(line)
+            self.counts[namespace] += 1
+
+    def close(self, complete: bool = True):
+        """Closes the streams and writes the manifest; complete=False marks a scan that failed part way."""
+        for stream in self._streams.values():
+            stream.close()
+        self._streams = {}
+        manifest = {"version": SNAPSHOT_VERSION, "scm": self.scm, "created_at": time.time(), "counts": self.counts,
+                    "complete": complete}
+        with open(os.path.join(self.path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(complete=exc_type is None)
+
+
+class SnapshotReader:
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise Exception(f"Not a valid snapshot directory: {path} ({e})")
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise Exception(f"Unsupported snapshot version: {self.manifest.get('version')}")
+
+    @property
+    def complete(self) -> bool:
+        return self.manifest.get("complete", True)
+
+    def namespaces(self) -> List[str]:
+        return list(self.manifest.get("counts", {}))
+
+    def entries(self, namespace: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Streams (target, input) pairs of one namespace without loading the whole file."""
+        path = _stream_path(self.path, namespace)
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                yield entry["target"], entry["input"]
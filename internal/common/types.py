@@ -83,6 +83,7 @@ class Repository(BaseModel):
     is_private: bool
     is_archived: bool
     pushed_at: Optional[str] = None
+    updated_at: Optional[str] = None
     default_branch: Optional[Ref] = None
     
     # Extra data collected
@@ -0,0 +1,180 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+QUEUE_VERSION = 2
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS units (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS units_status ON units (status, lease_expires);
+CREATE TABLE IF NOT EXISTS results (unit_id TEXT PRIMARY KEY, violations TEXT NOT NULL);
+"""
+
+
+class WorkQueue:
+    """Durable SQLite queue of scan units shared by a coordinator, its workers and the merge step.
+
+    Workers lease a unit for lease_seconds and keep extending the lease while
+    they work on it. A unit whose lease expired (its worker crashed or hung) is
+    handed out again; a unit that keeps failing is given up after max_attempts.
+    A unit's violations are stored in the same transaction that completes it,
+    and only by the worker that still holds the lease, so a re-queued unit is
+    never counted twice.
+    """
+
+    def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()  # the lease keeper thread shares the connection
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', ?)", (str(QUEUE_VERSION),))
+        if self.get_meta("version") != str(QUEUE_VERSION):
+            raise Exception(f"Unsupported work queue version in {path}: {self.get_meta('version')}")
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self, statements):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def set_meta(self, key: str, value: str):
+        self._transaction(lambda c: c.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, units: Iterable[Dict[str, Any]]) -> int:
+        """Enqueues units (dicts with an "id"); units already in the queue are left as they are."""
+        rows = [(unit["id"], json.dumps(unit), PENDING) for unit in units]
+
+        def insert(c):
+            before = c.total_changes
+            c.executemany("INSERT OR IGNORE INTO units (id, payload, status) VALUES (?, ?, ?)", rows)
+            return c.total_changes - before
+
+        return self._transaction(insert)
+
+    def lease(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """Hands out the oldest pending unit, or one whose lease expired. None when nothing is available."""
+        def take(c):
+            now = time.time()
+            c.execute("UPDATE units SET status = ?, error = 'lease expired' "
+                      "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                      (FAILED, LEASED, now, self.max_attempts))
+            row = c.execute(
+                "SELECT id, payload FROM units WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY seq LIMIT 1",
+                (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            c.execute("UPDATE units SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                      (LEASED, worker, now + lease_seconds, row[0]))
+            return json.loads(row[1])
+
+        return self._transaction(take)
+
+    def extend(self, unit_id: str, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        def update(c):
+            cursor = c.execute("UPDATE units SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?",
+                               (time.time() + lease_seconds, unit_id, worker, LEASED))
+            return cursor.rowcount == 1
+
+        return self._transaction(update)
+
+    def complete(self, unit_id: str, worker: str, violations: List[Dict[str, Any]]) -> bool:
+        """Stores the unit's violations and marks it done. False if the lease was lost meanwhile."""
+        def finish(c):
+            cursor = c.execute("UPDATE units SET status = ?, lease_expires = NULL, error = NULL "
+                               "WHERE id = ? AND worker = ? AND status = ?", (DONE, unit_id, worker, LEASED))
+            if cursor.rowcount != 1:
+                return False
+            c.execute("INSERT OR REPLACE INTO results (unit_id, violations) VALUES (?, ?)",
+                      (unit_id, json.dumps(violations)))
+            return True
+
+        return self._transaction(finish)
+
+    def fail(self, unit_id: str, worker: str, error: str):
+        """Puts the unit back in the queue, or gives it up once it failed max_attempts times."""
+        def release(c):
+            c.execute("UPDATE units SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                      "worker = NULL, lease_expires = NULL, error = ? WHERE id = ? AND worker = ? AND status = ?",
+                      (self.max_attempts, FAILED, PENDING, error, unit_id, worker, LEASED))
+
+        self._transaction(release)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def failures(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, attempts, error FROM units WHERE status = ? ORDER BY seq",
+                                      (FAILED,)).fetchall()
+        return [{"id": unit_id, "attempts": attempts, "error": error} for unit_id, attempts, error in rows]
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        """Streams the stored violations of every completed unit, in the order the units were planned."""
+        # A separate connection, so the rows are streamed instead of loaded at once
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            rows = conn.execute("SELECT r.violations FROM results r JOIN units u ON u.id = r.unit_id ORDER BY u.seq")
+            for (violations,) in rows:
+                yield from json.loads(violations)
+        finally:
+            conn.close()
+
+
+class LeaseKeeper:
+    """Extends a unit's lease in the background while a worker is busy with it."""
+
+    def __init__(self, queue: WorkQueue, unit_id: str, worker: str, lease_seconds: float):
+        self.queue = queue
+        self.unit_id = unit_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            if not self.queue.extend(self.unit_id, self.worker, self.lease_seconds):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "legitify", "policies")
+
+BUNDLE_FILE = "bundle.tar.gz"
+METADATA_FILE = "metadata.json"
+WASM_FILE = "policy.wasm"
+
+package_pattern = re.compile(r'^\s*package\s+([a-zA-Z_][a-zA-Z0-9_.]*)', re.MULTILINE)
+
+
+def find_packages(policies_path: str) -> List[str]:
+    packages = set()
+    for root, _, names in os.walk(policies_path):
+        for name in names:
+            if name.endswith(".rego"):
+                with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                    packages.update(package_pattern.findall(f.read()))
+    return sorted(packages)
+
+
+def _digest_policy_tree(policies_path: str):
+    digest = hashlib.sha256()
+    packages = set()
+    files = []
+    for root, _, names in os.walk(policies_path):
+        for name in names:
+            if name.endswith(".rego"):
+                files.append(os.path.join(root, name))
+
+    for path in sorted(files):
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest.update(os.path.relpath(path, policies_path).replace(os.sep, "/").encode())
+        digest.update(b"\0")
+        digest.update(content)
+        digest.update(b"\0")
+        packages.update(package_pattern.findall(content.decode("utf-8", errors="ignore")))
+    return digest, sorted(packages)
+
+
+def hash_policy_tree(policies_path: str) -> str:
+    """Content hash of every .rego file under policies_path."""
+    return _digest_policy_tree(policies_path)[0].hexdigest()
+
+
+class PolicyBundleCache:
+    """Stores an optimized `opa build` bundle and the parsed METADATA index per policy tree.
+
+    Entries live in <cache_dir>/<hash>, where the hash covers every .rego file
+    under policies_path (path and content) and the OPA binary in use, so any
+    policy edit or OPA upgrade produces a fresh entry.
+    """
+
+    def __init__(self, policies_path: str, opa_binary: str, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.policies_path = policies_path
+        self.opa_binary = opa_binary
+        self.cache_dir = cache_dir
+        self.packages: List[str] = []
+        self.policy_hash = self._hash_policies()
+
+    def _hash_policies(self) -> str:
+        digest, packages = _digest_policy_tree(self.policies_path)
+        try:
+            stat = os.stat(self.opa_binary)
+            digest.update(f"{self.opa_binary}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        except OSError:
+            digest.update(str(self.opa_binary).encode())
+
+        self.packages = packages
+        return digest.hexdigest()
+
+    @property
+    def entry_dir(self) -> str:
+        return os.path.join(self.cache_dir, self.policy_hash)
+
+    @property
+    def bundle_path(self) -> str:
+        return os.path.join(self.entry_dir, BUNDLE_FILE)
+
+    @property
+    def metadata_path(self) -> str:
+        return os.path.join(self.entry_dir, METADATA_FILE)
+
+    def entrypoints(self) -> List[str]:
+        # Shared helper packages are only reached through the namespace packages
+        return [p.replace(".", "/") for p in self.packages if not p.startswith("common")]
+
+    def get_bundle(self) -> str:
+        """Returns the cached bundle path, building it with `opa build -O=1` on a miss."""
+        if os.path.exists(self.bundle_path):
+            return self.bundle_path
+
+        os.makedirs(self.entry_dir, exist_ok=True)
+        tmp_path = f"{self.bundle_path}.{os.getpid()}.tmp"
+        cmd = [self.opa_binary, "build", "-O=1", "-o", tmp_path]
+        for entrypoint in self.entrypoints():
+            cmd.extend(["-e", entrypoint])
+        cmd.append(self.policies_path)
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise Exception(f"OPA bundle build failed: {result.stderr}")
+
+        # Atomic so that concurrent runs never read a half-written bundle
+        os.replace(tmp_path, self.bundle_path)
+        return self.bundle_path
+
+    def get_wasm_module(self, entrypoints: List[str]) -> str:
+        """Returns the cached policy.wasm for the given entrypoints, compiling it on a miss."""
+        from internal.opa.wasm_engine import build_wasm_module
+
+        wasm_path = os.path.join(self.entry_dir, "-".join(entrypoints) + "-" + WASM_FILE)
+        if not os.path.exists(wasm_path):
+            os.makedirs(self.entry_dir, exist_ok=True)
+            build_wasm_module(self.opa_binary, self.policies_path, entrypoints, wasm_path)
+        return wasm_path
+
+    def load_metadata(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.metadata_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_metadata(self, metadata: Dict[str, Any]):
+        os.makedirs(self.entry_dir, exist_ok=True)
+        tmp_path = f"{self.metadata_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, self.metadata_path)
@@ -0,0 +1,232 @@
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+# Input paths that each optional collection step fills, per package. A step is
+# only run when an enabled policy rule (or a helper it calls) reads one of them.
+OPTIONAL_INPUTS: Dict[str, Dict[str, List[str]]] = {
+    "repository": {
+        "repo_secrets": ["input.repository_secrets", "input.repository.repo_secrets"],
+        "actions_token_permissions": ["input.actions_token_permissions", "input.repository.actions_token_permissions"],
+        "rules_set": ["input.rules_set", "input.repository.rules_set"],
+        "vulnerability_alerts_enabled": ["input.vulnerability_alerts_enabled",
+                                         "input.repository.vulnerability_alerts_enabled"],
+        "security_and_analysis": ["input.security_and_analysis", "input.repository.security_and_analysis"],
+        "collaborators": ["input.collaborators", "input.repository.collaborators"],
+        "hooks": ["input.hooks", "input.repository.hooks"],
+    },
+    "organization": {
+        "hooks": ["input.hooks", "input.organization.hooks"],
+        "organization_secrets": ["input.organization_secrets", "input.organization.organization_secrets"],
+    },
+}
+
+package_pattern = re.compile(r'^package\s+([a-zA-Z_][\w.]*)', re.MULTILINE)
+import_pattern = re.compile(r'^import\s+data\.([\w.]+)(?:\s+as\s+(\w+))?', re.MULTILINE)
+rule_start_pattern = re.compile(r'^(?:default\s+)?([a-zA-Z_]\w*)')
+input_ref_pattern = re.compile(r'\binput((?:\.[a-zA-Z_]\w*)*)')
+identifier_pattern = re.compile(r'\b([a-zA-Z_]\w*)\b')
+data_ref_pattern = re.compile(r'\bdata\.([a-zA-Z_][\w.]*)')
+# Builtins whose result changes between evaluations of the same input
+nondeterministic_pattern = re.compile(r'\b(?:time\.now_ns|rand\.\w+|uuid\.\w+|http\.send|opa\.runtime)\s*\(')
+title_pattern = re.compile(r'^#\s*title:\s*(.+)$')
+severity_pattern = re.compile(r'^#\s*severity:\s*(\w+)')
+
+
+class _Rule:
+    def __init__(self, name: str, is_policy: bool, title: Optional[str], severity: Optional[str]):
+        self.name = name
+        self.is_policy = is_policy
+        self.title = title
+        self.severity = severity
+        self.inputs: Set[str] = set()
+        self.identifiers: Set[str] = set()
+        self.data_refs: Set[str] = set()
+        self.nondeterministic = False
+
+
+class _Package:
+    def __init__(self):
+        self.rules: Dict[str, _Rule] = {}
+        self.imports: Dict[str, str] = {}  # alias -> package
+
+
+def _parse_file(content: str, packages: Dict[str, _Package]):
+    match = package_pattern.search(content)
+    if not match:
+        return
+    package = packages.setdefault(match.group(1), _Package())
+    for imported, alias in import_pattern.findall(content):
+        package.imports[alias or imported.rsplit(".", 1)[-1]] = imported
+
+    rule = None
+    in_metadata = False
+    title = severity = None
+    for line in content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            if stripped.startswith("# METADATA"):
+                in_metadata, title, severity = True, None, None
+            elif in_metadata and title_pattern.match(stripped):
+                title = title_pattern.match(stripped).group(1).strip()
+            elif in_metadata and severity_pattern.match(stripped):
+                severity = severity_pattern.match(stripped).group(1).upper()
+            continue
+        if not stripped:
+            continue
+
+        start = rule_start_pattern.match(line)
+        if start and start.group(1) not in ("package", "import"):
+            name = start.group(1)
+            rule = package.rules.get(name)
+            if rule is None:
+                rule = _Rule(name, in_metadata, title, severity)
+                package.rules[name] = rule
+            elif in_metadata:
+                rule.is_policy, rule.title, rule.severity = True, title, severity
+            in_metadata = False
+        elif start:
+            rule = None
+            continue
+
+        if rule is None:
+            continue
+        code = line.split("#", 1)[0]
+        for path in input_ref_pattern.findall(code):
+            # A bare or dynamically indexed `input` may read anything
+            rule.inputs.add("input" + path)
+        rule.identifiers.update(identifier_pattern.findall(code))
+        rule.data_refs.update(data_ref_pattern.findall(code))
+        if nondeterministic_pattern.search(code):
+            rule.nondeterministic = True
+
+
+def _parse_policies(policies_path: str) -> Dict[str, _Package]:
+    packages: Dict[str, _Package] = {}
+    for root, _, names in os.walk(policies_path):
+        for name in sorted(names):
+            if name.endswith(".rego") and not name.endswith("_test.rego"):
+                with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                    _parse_file(f.read(), packages)
+    return packages
+
+
+def _referenced_package(packages: Dict[str, _Package], ref: str) -> Optional[str]:
+    # data.common.secrets.is_stale -> common.secrets
+    parts = ref.split(".")
+    for end in range(len(parts), 0, -1):
+        name = ".".join(parts[:end])
+        if name in packages:
+            return name
+    return None
+
+
+def _reachable_rules(packages: Dict[str, _Package], roots) -> List[_Rule]:
+    rules = []
+    seen = set()
+    pending = list(roots)
+    while pending:
+        package_name, rule = pending.pop()
+        if (package_name, rule.name) in seen:
+            continue
+        seen.add((package_name, rule.name))
+        rules.append(rule)
+
+        package = packages[package_name]
+        for identifier in rule.identifiers:
+            if identifier in package.rules:
+                pending.append((package_name, package.rules[identifier]))
+            imported = package.imports.get(identifier)
+            if imported in packages:
+                # Conservatively count every rule of an imported helper package
+                pending.extend((imported, r) for r in packages[imported].rules.values())
+        for ref in rule.data_refs:
+            referenced = _referenced_package(packages, ref)
+            if referenced:
+                pending.extend((referenced, r) for r in packages[referenced].rules.values())
+    return rules
+
+
+def package_inputs(policies_path: str) -> Dict[str, Tuple[Set[str], bool]]:
+    """Maps every package to the input paths its rules (and the helpers they use) read,
+    and whether any of them calls a nondeterministic builtin such as time.now_ns."""
+    packages = _parse_policies(policies_path)
+    result = {}
+    for package_name, package in packages.items():
+        rules = _reachable_rules(packages, [(package_name, r) for r in package.rules.values()])
+        result[package_name] = (set().union(*(r.inputs for r in rules)), any(r.nondeterministic for r in rules))
+    return result
+
+
+def unknown_policies(policies_path: str, names: List[str]) -> List[str]:
+    """The names of a --policy allow-list that match no policy rule name or title."""
+    known = set()
+    for package in _parse_policies(policies_path).values():
+        for rule in package.rules.values():
+            if rule.is_policy:
+                known.update(n for n in (rule.name, rule.title) if n)
+    return [name for name in names if name not in known]
+
+
+def _covers(reference: str, path: str) -> bool:
+    return reference == path or path.startswith(reference + ".") or reference.startswith(path + ".")
+
+
+class CollectionPlan:
+    """Decides which optional collection steps the enabled policy rules actually need.
+
+    Built from the `input.*` references of every rule in the policy tree: a step
+    is needed when an enabled METADATA rule, a helper rule it calls, or an
+    imported package it uses reads one of the step's input paths. Rules the
+    Skipper disables (ignored, outside the --policy allow-list or below the
+    minimum severity) do not count, and enabled_rules lists the policy rules
+    left in each package so the engine only evaluates those.
+    """
+
+    def __init__(self, required_inputs: Dict[str, Set[str]], enabled_packages: Set[str],
+                 enabled_rules: Dict[str, List[str]] = None):
+        self.required_inputs = required_inputs
+        self.enabled_packages = enabled_packages
+        self.enabled_rules = enabled_rules or {}
+
+    @classmethod
+    def from_policies(cls, policies_path: str, skipper=None) -> "CollectionPlan":
+        packages = _parse_policies(policies_path)
+
+        def skipped(rule: _Rule) -> bool:
+            return skipper is not None and skipper.should_skip_rule(rule.name, rule.title, rule.severity)
+
+        required = {}
+        enabled = set()
+        enabled_rules = {}
+        for package_name, package in packages.items():
+            policy_rules = [r for r in package.rules.values() if r.is_policy]
+            roots = [(package_name, r) for r in policy_rules if not skipped(r)]
+            if roots:
+                enabled.add(package_name)
+            if policy_rules:
+                enabled_rules[package_name] = sorted(r.name for _, r in roots)
+            required[package_name] = set().union(*(r.inputs for r in _reachable_rules(packages, roots)))
+        return cls(required, enabled, enabled_rules)
+
+    def needs_package(self, package: str) -> bool:
+        """False when no enabled policy rule is left in the package."""
+        return package in self.enabled_packages
+
+    def needs(self, package: str, step: str) -> bool:
+        paths = OPTIONAL_INPUTS.get(package, {}).get(step)
+        if paths is None:
+            return True
+        references = self.required_inputs.get(package, set())
+        return any(_covers(reference, path) for reference in references for path in paths)
+
+    def skipped_steps(self, package: str) -> List[str]:
+        return [step for step in OPTIONAL_INPUTS.get(package, {}) if not self.needs(package, step)]
+
+    def fingerprint(self) -> str:
+        """Identifies what gets collected, for callers that persist results across runs."""
+        skipped = sorted(f"{package}.{step}" for package in OPTIONAL_INPUTS for step in self.skipped_steps(package))
+        skipped += sorted(f"{package}" for package in self.required_inputs if not self.needs_package(package))
+        skipped += sorted(f"{package}:{'+'.join(rules)}" for package, rules in self.enabled_rules.items())
+        return hashlib.sha256(",".join(skipped).encode()).hexdigest()[:16]
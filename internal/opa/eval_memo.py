@@ -0,0 +1,118 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from internal.common.disk_lru import CacheStats, DiskLRUStore
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TIME_WINDOW_HOURS = 24.0
+# Results kept in memory for deduplication within a run
+MEMORY_ENTRIES = 10000
+
+
+def _path_tree(paths: Set[str]) -> Optional[Dict[str, Any]]:
+    """Builds a tree of input path segments; None marks a subtree that is read as a whole."""
+    tree: Dict[str, Any] = {}
+    for path in sorted(paths, key=len):
+        segments = path.split(".")[1:]  # drop "input"
+        if not segments:
+            return None
+        node = tree
+        for segment in segments[:-1]:
+            if node.get(segment, {}) is None:
+                break
+            node = node.setdefault(segment, {})
+        else:
+            node[segments[-1]] = None
+    return tree
+
+
+def _project(value: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    if tree is None or not isinstance(value, dict):
+        return value
+    return {key: _project(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+class EvalMemo(CacheStats):
+    """Content-addressed cache of OPA package results.
+
+    The key hashes the policy hash, the package and the part of the input that
+    the package's rules actually read (so repository names, ids and URLs do
+    not make otherwise identical inputs differ). Results are deduplicated in
+    memory within a run and, with a cache_dir, kept on disk across runs in a
+    DiskLRUStore bounded to max_bytes.
+
+    Packages whose rules call a clock-dependent builtin such as time.now_ns are
+    only reused within a time window of time_window_hours; a window of 0 never
+    memoizes them.
+    """
+
+    def __init__(self, policy_hash: str, package_inputs: Dict[str, Tuple[Set[str], bool]], cache_dir: str = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, time_window_hours: float = DEFAULT_TIME_WINDOW_HOURS):
+        super().__init__()
+        self.policy_hash = policy_hash
+        self.cache_dir = cache_dir
+        self.time_window = time_window_hours * 3600
+        self._trees = {package: _path_tree(paths) for package, (paths, _) in package_inputs.items()}
+        self._nondeterministic = {package for package, (_, nondeterministic) in package_inputs.items() if nondeterministic}
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = DiskLRUStore(cache_dir, max_bytes) if cache_dir else None
+        self.bypassed = 0
+
+    def key(self, package: str, input_data: Dict[str, Any], rules: Optional[List[str]] = None) -> Optional[str]:
+        """The memo key of an input, or None when results of this package must not be reused.
+
+        rules is the subset of the package's rules being evaluated, if any.
+        """
+        scope = [self.policy_hash, package, rules]
+        if package in self._nondeterministic:
+            if self.time_window <= 0:
+                with self._lock:
+                    self.bypassed += 1
+                return None
+            scope.append(int(time.time() // self.time_window))
+        projected = _project(input_data, self._trees.get(package))
+        canonical = json.dumps([scope, projected], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        if key is None:
+            return None
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+        if result is None and self.disk:
+            result = self.disk.get(key)
+            if result is not None:
+                with self._lock:
+                    self._remember(key, result)
+        if result is None:
+            self.record_miss()
+        else:
+            self.record_hit()
+        return result
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        if len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def put(self, key: Optional[str], result: Dict[str, Any]):
+        if key is None:
+            return
+        with self._lock:
+            self._remember(key, result)
+        if self.disk:
+            self.disk.put(key, result)
+
+    def report(self) -> str:
+        line = f"Evaluation memo: {self.stats_summary()}, {self.bypassed} bypassed"
+        if self.disk:
+            line += f", {self.disk.usage()}"
+        return line
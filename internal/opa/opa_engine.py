@@ -2,11 +2,36 @@ import json
 import subprocess
 import os
 import shutil
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+import click
+
+ENGINE_MODES = ["eval", "server", "wasm"]
+DEFAULT_BATCH_SIZE = 100
+
+# Evaluates a package document once per element of input.batch, keyed by index
+BATCH_QUERY = "batch_result := {{i: r | x := input.batch[i]; r := {document} with input as x}}"
+# Only the named rules of a package; OPA evaluates just the rules it is asked for
+SELECTED_RULES_QUERY = "{{name: value | name := {rules}[_]; value := data.{package}[name]}}"
 
 class OpaEngine:
-    def __init__(self, policies_path: str):
+    def __init__(self, policies_path: str, mode: str = "eval", batch_size: int = DEFAULT_BATCH_SIZE,
+                 cache_dir: str = None, workers: int = 1, memo: bool = False, memo_dir: str = None,
+                 memo_max_bytes: int = None, memo_time_window: float = None):
+        if mode not in ENGINE_MODES:
+            raise ValueError(f"invalid OPA engine mode {mode}")
+        if batch_size < 1:
+            raise ValueError(f"invalid batch size {batch_size}")
+        if workers < 1:
+            raise ValueError(f"invalid worker count {workers}")
+
         self.policies_path = policies_path
+        self.mode = mode
+        self.batch_size = batch_size
+        self.workers = workers
         self.opa_binary = shutil.which("opa")
         
         # Fallback to local opa.exe if not in PATH
@@ -18,70 +43,251 @@ class OpaEngine:
         if not self.opa_binary:
             raise Exception("OPA binary not found. Please install OPA or place opa.exe in the current directory.")
             
-        self.metadata_cache = {}
+        # Optional on-disk cache of the compiled bundle and METADATA index
+        self.bundle_cache = None
+        self.bundle_path = None
+        if cache_dir:
+            from internal.opa.bundle_cache import PolicyBundleCache
+            self.bundle_cache = PolicyBundleCache(self.policies_path, self.opa_binary, cache_dir)
+
+        self.metadata_cache = None
         self._load_metadata()
 
+        if self.bundle_cache and self.mode != "wasm":
+            try:
+                self.bundle_path = self.bundle_cache.get_bundle()
+            except Exception as e:
+                click.echo(f"Warning: Failed to build policy bundle, loading policies directly: {e}", err=True)
+
+        self.server = None
+        if self.mode == "server":
+            from internal.opa.opa_server import OpaServer
+            self.server = OpaServer(self.opa_binary, self.bundle_path or self.policies_path,
+                                    pool_size=max(10, self.workers), bundle=self.bundle_path is not None)
+            self.server.start()
+
+        self.wasm = None
+        if self.mode == "wasm":
+            self.wasm = self._load_wasm()
+
+        # Policy rules to evaluate per package (see select_rules); packages not listed are evaluated whole
+        self.rule_selection: Dict[str, List[str]] = {}
+
+        # Optional memo of package results for inputs that look the same to the policies
+        self.memo = None
+        if memo:
+            from internal.opa.collection_plan import package_inputs
+            from internal.opa.eval_memo import EvalMemo, DEFAULT_MAX_BYTES, DEFAULT_TIME_WINDOW_HOURS
+            self.memo = EvalMemo(self.policy_hash, package_inputs(self.policies_path), cache_dir=memo_dir,
+                                 max_bytes=memo_max_bytes or DEFAULT_MAX_BYTES,
+                                 time_window_hours=DEFAULT_TIME_WINDOW_HOURS if memo_time_window is None
+                                 else memo_time_window)
+
+    def _load_wasm(self):
+        import tempfile
+        from internal.opa.bundle_cache import find_packages
+        from internal.opa.wasm_engine import WasmPolicy, WASM_ENTRYPOINTS, build_wasm_module
+
+        if self.bundle_cache:
+            packages = self.bundle_cache.packages
+        else:
+            packages = find_packages(self.policies_path)
+        entrypoints = [e for e in WASM_ENTRYPOINTS if e in packages]
+        if not entrypoints:
+            raise Exception(f"No packages to compile to wasm found in {self.policies_path}")
+
+        if self.bundle_cache:
+            return WasmPolicy(self.bundle_cache.get_wasm_module(entrypoints))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            wasm_path = os.path.join(tmp_dir, "policy.wasm")
+            build_wasm_module(self.opa_binary, self.policies_path, entrypoints, wasm_path)
+            return WasmPolicy(wasm_path)
+
+    @property
+    def policy_hash(self) -> str:
+        """Fingerprint of the loaded policies, for callers that persist evaluation results."""
+        if self.bundle_cache:
+            return self.bundle_cache.policy_hash
+        if not hasattr(self, "_policy_hash"):
+            from internal.opa.bundle_cache import hash_policy_tree
+            self._policy_hash = hash_policy_tree(self.policies_path)
+        return self._policy_hash
+
+    def close(self):
+        if self.server:
+            self.server.stop()
+            self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def _load_metadata(self):
-        # Walk through policies directory and parse METADATA
-        import re
-        
-        # Regex to capture rule names
-        # Matches: default rule_name := ... | rule_name := ... | rule_name[...] := ...
-        rule_pattern = re.compile(r'^\s*(?:default\s+)?([a-z_][a-z0-9_]*)(?:\[.+\])?\s*:=')
-
-        for root, _, files in os.walk(self.policies_path):
-            for file in files:
-                if file.endswith(".rego"):
-                    with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        
-                        current_metadata = {}
-                        in_metadata = False
-                        
-                        for line in lines:
-                            line = line.strip()
-                            
-                            # Start of metadata block
-                            if line.startswith("# METADATA"):
-                                current_metadata = {"custom": {}}
-                                in_metadata = True
-                                continue
-
-                            if in_metadata:
-                                if line.startswith("#"):
-                                    # Parse metadata fields
-                                    # Expected format: # key: value
-                                    parts = line.lstrip("# ").split(":", 1)
-                                    if len(parts) == 2:
-                                        key = parts[0].strip()
-                                        val = parts[1].strip()
-                                        
-                                        if key == "scope": current_metadata["scope"] = val
-                                        elif key == "title": current_metadata["title"] = val
-                                        elif key == "description": current_metadata["description"] = val
-                                        elif key == "custom": pass # Start of custom block (YAML-like)
-                                        elif key in ["severity", "threat", "requiredScopes"]:
-                                            current_metadata[key] = val
-                                        # Simple heuristic for list items in remediationSteps or threat
-                                        elif key.startswith("-"):
-                                             # This is very basic YAML parsing simulation
-                                             # Ideally we should parse the whole comment block as YAML
-                                             pass
-                                else:
-                                    # End of metadata block, look for rule name
-                                    # Ignore empty lines
-                                    if not line: continue
-                                    
-                                    match = rule_pattern.match(line)
-                                    if match:
-                                        rule_name = match.group(1)
-                                        self.metadata_cache[rule_name] = current_metadata
-                                    
-                                    # Reset
-                                    in_metadata = False
-                                    current_metadata = {}
+        from internal.opa.policy_metadata import MetadataIndex
+
+        if self.bundle_cache:
+            cached = MetadataIndex.from_json(self.bundle_cache.load_metadata())
+            if cached is not None:
+                self.metadata_cache = cached
+                return
+
+        self._parse_metadata()
+
+        if self.bundle_cache:
+            self.bundle_cache.save_metadata(self.metadata_cache.to_json())
+
+    def _parse_metadata(self):
+        from internal.opa.policy_metadata import MetadataIndex
+        self.metadata_cache = MetadataIndex.from_policies(self.policies_path)
+
+    def select_rules(self, rules_by_package: Dict[str, List[str]]):
+        """Restricts evaluation to the given policy rules of each package.
+
+        Queries then ask OPA for those rules only, so disabled rules are never
+        evaluated. Packages missing from rules_by_package are still evaluated whole.
+        """
+        self.rule_selection = {package: sorted(rules) for package, rules in rules_by_package.items()}
+
+    def _document(self, package: str) -> str:
+        rules = self.rule_selection.get(package)
+        if rules is None:
+            return f"data.{package}"
+        return SELECTED_RULES_QUERY.format(rules=json.dumps(rules), package=package)
+
+    def _select(self, package: str, package_eval: Dict[str, Any]) -> Dict[str, Any]:
+        # For backends that always evaluate the whole package
+        rules = self.rule_selection.get(package)
+        if rules is None or not isinstance(package_eval, dict):
+            return package_eval
+        return {name: package_eval[name] for name in rules if name in package_eval}
+
+    def _memo_key(self, package: str, input_data: Dict[str, Any]):
+        return self.memo.key(package, input_data, self.rule_selection.get(package))
 
     def eval(self, input_data: Dict[str, Any], package: str = "repository") -> List[Dict[str, Any]]:
+        if self.rule_selection.get(package) == []:
+            return []
+        key = self._memo_key(package, input_data) if self.memo else None
+        package_eval = self.memo.get(key) if key else None
+        if package_eval is None:
+            package_eval = self._eval_package(input_data, package)
+            if key:
+                self.memo.put(key, package_eval)
+        return self._to_violations(package_eval, package)
+
+    def _eval_package(self, input_data: Dict[str, Any], package: str) -> Dict[str, Any]:
+        if self.wasm:
+            package_eval = self._select(package, self.wasm.evaluate(package, input_data))
+        elif self.server and package in self.rule_selection:
+            package_eval = self.server.query_adhoc(f"result := {self._document(package)}", input_data).get("result", {})
+        elif self.server:
+            package_eval = self.server.query(package, input_data)
+        else:
+            package_eval = self._eval_subprocess(input_data, package)
+        return package_eval
+
+    def eval_many(self, inputs: Iterable[Tuple[Any, Dict[str, Any]]], package: str = "repository",
+                  batch_size: int = None) -> Iterator[Tuple[Any, List[Dict[str, Any]]]]:
+        """Evaluates many (key, input_data) pairs, batch_size inputs per OPA query.
+
+        Results are yielded as (key, violations) in input order. With workers > 1,
+        batches are evaluated concurrently but at most 2 * workers batches are in
+        flight, so both inputs and outputs can still be streamed.
+        """
+        batch_size = batch_size or self.batch_size
+        for batch, package_evals in self._eval_batches(self._batches(inputs, batch_size), package):
+            for index, (key, _) in enumerate(batch):
+                yield key, self._to_violations(package_evals[index], package)
+
+    def _batches(self, inputs: Iterable[Tuple[Any, Dict[str, Any]]], batch_size: int):
+        iterator = iter(inputs)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            yield batch
+
+    def _eval_batches(self, batches, package: str):
+        if self.workers == 1:
+            for batch in batches:
+                yield batch, self._eval_batch([input_data for _, input_data in batch], package)
+            return
+
+        # Thread pool: the subprocess, server and wasm backends all release the GIL while evaluating
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for batch in batches:
+                future = executor.submit(self._eval_batch, [input_data for _, input_data in batch], package)
+                pending.append((batch, future))
+                if len(pending) >= 2 * self.workers:
+                    done_batch, done_future = pending.popleft()
+                    yield done_batch, done_future.result()
+            while pending:
+                done_batch, done_future = pending.popleft()
+                yield done_batch, done_future.result()
+
+    def _eval_batch(self, inputs: List[Dict[str, Any]], package: str) -> List[Dict[str, Any]]:
+        if self.rule_selection.get(package) == []:
+            return [{} for _ in inputs]
+        if not self.memo:
+            return self._eval_inputs(inputs, package)
+
+        # Only inputs without a memoized result are evaluated, each distinct one once
+        keys = [self._memo_key(package, input_data) for input_data in inputs]
+        results = [None] * len(inputs)
+        pending = {}
+        for index, key in enumerate(keys):
+            if key in pending:
+                # A repeat of an input earlier in this batch
+                self.memo.record_hit()
+                pending[key].append(index)
+                continue
+            results[index] = self.memo.get(key)
+            if results[index] is None:
+                pending[key if key else f"#{index}"] = [index]
+        if pending:
+            evaluated = self._eval_inputs([inputs[indexes[0]] for indexes in pending.values()], package)
+            for indexes, package_eval in zip(pending.values(), evaluated):
+                self.memo.put(keys[indexes[0]], package_eval)
+                for index in indexes:
+                    results[index] = package_eval
+        return results
+
+    def _eval_inputs(self, inputs: List[Dict[str, Any]], package: str) -> List[Dict[str, Any]]:
+        if self.wasm:
+            # In-process evaluation has no per-call overhead to amortize
+            return [self._select(package, self.wasm.evaluate(package, input_data)) for input_data in inputs]
+
+        query = BATCH_QUERY.format(document=self._document(package))
+        batch_input = {"batch": inputs}
+        if self.server:
+            bindings = self.server.query_adhoc(query, batch_input)
+        else:
+            result = self._run_opa_eval(query, batch_input)
+            bindings = result.get("bindings", {}) if result else {}
+
+        # JSON object keys come back as strings
+        batch_result = {int(k): v for k, v in bindings.get("batch_result", {}).items()}
+        return [batch_result.get(i, {}) for i in range(len(inputs))]
+
+    def _eval_subprocess(self, input_data: Dict[str, Any], package: str) -> Dict[str, Any]:
+        result = self._run_opa_eval(self._document(package), input_data)
+        if result:
+            expressions = result.get("expressions", [])
+            if expressions:
+                return expressions[0].get("value", {})
+        return {}
+
+    def _policy_args(self) -> List[str]:
+        if self.bundle_path:
+            return ["-b", self.bundle_path]
+        return ["-d", self.policies_path]
+
+    def _run_opa_eval(self, query: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Runs a single `opa eval` and returns its first result (expressions and bindings)."""
         if not self.opa_binary:
              raise Exception("OPA binary not configured.")
 
@@ -89,8 +295,8 @@ class OpaEngine:
             self.opa_binary,
             "eval",
             "-I", # input from stdin
-            "-d", self.policies_path,
-            f"data.{package}",
+        ] + self._policy_args() + [
+            query,
             "--format", "json"
         ]
 
@@ -110,38 +316,30 @@ class OpaEngine:
                 raise Exception(f"OPA execution failed: {stderr}")
 
             result = json.loads(stdout)
-            
-            violations = []
-            if "result" in result and len(result["result"]) > 0:
-                expressions = result["result"][0].get("expressions", [])
-                if expressions:
-                    package_eval = expressions[0].get("value", {})
-                    for rule_name, value in package_eval.items():
-                         if value is True: # Boolean violation
-                              v = {"rule": rule_name, "details": None, "status": "FAILED"}
-                              self._enrich_violation(v)
-                              violations.append(v)
-                         elif isinstance(value, list) and len(value) > 0: # Set violation
-                              for detail in value:
-                                  v = {"rule": rule_name, "details": detail, "status": "FAILED"}
-                                  self._enrich_violation(v)
-                                  violations.append(v)
-
-            return violations
 
         except FileNotFoundError:
              raise Exception(f"OPA binary not found at {self.opa_binary}")
         except json.JSONDecodeError:
              raise Exception(f"Invalid JSON output from OPA: {stdout}")
 
-    def _enrich_violation(self, violation: Dict[str, Any]):
-        rule = violation["rule"]
-        if rule in self.metadata_cache:
-            meta = self.metadata_cache[rule]
-            violation["policyName"] = meta.get("title", rule)
-            violation["description"] = meta.get("description", "")
-            violation["severity"] = meta.get("severity", "MEDIUM")
-            # For remediation, we might need better parsing, but placeholder for now
-            violation["remediationSteps"] = ["Check policy file for remediation steps."]
+        if "result" in result and len(result["result"]) > 0:
+            return result["result"][0]
+        return {}
 
+    def _to_violations(self, package_eval: Dict[str, Any], package: str) -> List[Dict[str, Any]]:
+        violations = []
+        for rule_name, value in package_eval.items():
+             if value is True: # Boolean violation
+                  v = {"rule": rule_name, "details": None, "status": "FAILED"}
+                  self._enrich_violation(v, package)
+                  violations.append(v)
+             elif isinstance(value, list) and len(value) > 0: # Set violation
+                  for detail in value:
+                      v = {"rule": rule_name, "details": detail, "status": "FAILED"}
+                      self._enrich_violation(v, package)
+                      violations.append(v)
+        return violations
 
+    def _enrich_violation(self, violation: Dict[str, Any], package: str):
+        # The long METADATA fields stay in the index; outputers add them back through metadata_cache.expand
+        self.metadata_cache.annotate(violation, package)
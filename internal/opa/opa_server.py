@@ -0,0 +1,158 @@
+import atexit
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class OpaServer:
+    """Manages a long-lived local `opa run --server` process.
+
+    Policies are loaded once at startup and every evaluation goes through the
+    REST data API over a pooled keep-alive session. The process is health
+    checked and restarted if it dies between or during requests, or stops
+    answering within request_timeout. A restarted server listens on a fresh
+    port, since the old one may still be in TIME_WAIT.
+    """
+
+    def __init__(self, opa_binary: str, policies_path: str, host: str = "127.0.0.1",
+                 port: Optional[int] = None, startup_timeout: float = 15.0, pool_size: int = 10,
+                 bundle: bool = False, request_timeout: float = 60.0):
+        self.opa_binary = opa_binary
+        self.policies_path = policies_path
+        self.bundle = bundle
+        self.host = host
+        self.port = port
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.process: Optional[subprocess.Popen] = None
+        self._stderr = None
+        self._lock = threading.Lock()  # serializes restarts between evaluating threads
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+
+        atexit.register(self.stop)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _free_port(self) -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind((self.host, 0))
+            return s.getsockname()[1]
+
+    def start(self):
+        if self.is_alive():
+            return
+
+        port = self.port or self._free_port()
+        self._stderr = tempfile.TemporaryFile(mode="w+")
+        cmd = [
+            self.opa_binary,
+            "run",
+            "--server",
+            "--addr", f"{self.host}:{port}",
+            "--log-level", "error",
+        ]
+        if self.bundle:
+            cmd.append("--bundle")
+        cmd.append(self.policies_path)
+
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr,
+        )
+        self.port = port
+        self._wait_until_healthy()
+
+    def _wait_until_healthy(self):
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if not self.is_alive():
+                raise Exception(f"OPA server exited during startup: {self._read_stderr()}")
+            if self.health():
+                return
+            time.sleep(0.1)
+        self.stop()
+        raise Exception(f"OPA server did not become healthy within {self.startup_timeout}s")
+
+    def _read_stderr(self) -> str:
+        if not self._stderr:
+            return ""
+        self._stderr.seek(0)
+        return self._stderr.read()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def health(self) -> bool:
+        try:
+            resp = self.session.get(f"{self.base_url}/health", timeout=2)
+            return resp.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def restart(self):
+        self.stop()
+        self.port = None
+        self.start()
+
+    def ensure_running(self):
+        if self.is_alive():
+            return
+        with self._lock:
+            if not self.is_alive():
+                self.restart()
+
+    def _replace(self, process: Optional[subprocess.Popen]):
+        """Restarts the server, unless another thread already replaced process."""
+        with self._lock:
+            if self.process is process or not self.is_alive():
+                self.restart()
+
+    def _post(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        self.ensure_running()
+        process = self.process
+        try:
+            resp = self.session.post(f"{self.base_url}{path}", json=body, timeout=self.request_timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            # The process may have died or wedged mid-request; restart and retry once
+            self._replace(process)
+            resp = self.session.post(f"{self.base_url}{path}", json=body, timeout=self.request_timeout)
+
+        if resp.status_code != 200:
+            raise Exception(f"OPA server request failed ({resp.status_code}): {resp.text}")
+        return resp.json()
+
+    def query(self, package: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluates data.<package> against input_data, returning the package document."""
+        path = "/v1/data/" + package.replace(".", "/")
+        return self._post(path, {"input": input_data}).get("result", {})
+
+    def query_adhoc(self, query: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Runs an ad-hoc query through /v1/query, returning the first set of bindings."""
+        results = self._post("/v1/query", {"query": query, "input": input_data}).get("result", [])
+        return results[0] if results else {}
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        if self._stderr:
+            self._stderr.close()
+            self._stderr = None
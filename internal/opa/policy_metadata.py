@@ -0,0 +1,187 @@
+import os
+import re
+import sys
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import yaml
+
+INDEX_VERSION = 1
+DEFAULT_SEVERITY = "MEDIUM"
+
+package_pattern = re.compile(r'^package\s+([a-zA-Z_][\w.]*)', re.MULTILINE)
+# Matches: default rule_name := ... | rule_name := ... | rule_name[...] := ... | rule_name if { ...
+rule_pattern = re.compile(r'^\s*(?:default\s+)?([a-zA-Z_]\w*)')
+
+
+def _intern(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return sys.intern(str(value).strip())
+
+
+def _text_items(value: Any) -> Tuple[str, ...]:
+    """Normalizes a YAML string or list into a tuple of lines.
+
+    List items that contain ": " are read by YAML as one-entry mappings; they
+    are turned back into the text that was written.
+    """
+    if value is None:
+        return ()
+    if not isinstance(value, list):
+        value = [value]
+    items = []
+    for item in value:
+        if isinstance(item, dict):
+            items.extend(_intern(f"{k}: {v}" if v is not None else f"{k}:") for k, v in item.items())
+        elif item is not None:
+            items.append(_intern(item))
+    return tuple(items)
+
+
+@dataclass(frozen=True)
+class PolicyMetadata:
+    """The METADATA annotation of one policy rule."""
+    rule: str
+    package: str
+    title: str
+    description: str = ""
+    severity: str = DEFAULT_SEVERITY
+    remediation_steps: Tuple[str, ...] = ()
+    threat: Tuple[str, ...] = ()
+    required_scopes: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_annotation(cls, rule: str, package: str, annotation: Dict[str, Any]) -> "PolicyMetadata":
+        custom = annotation.get("custom") or {}
+        scopes = custom.get("requiredScopes")
+        if isinstance(scopes, str):
+            scopes = [s for s in scopes.strip("[] ").split(",") if s.strip()]
+        return cls(
+            rule=_intern(rule),
+            package=_intern(package),
+            title=_intern(annotation.get("title") or rule),
+            description=_intern(annotation.get("description") or ""),
+            severity=_intern(str(custom.get("severity") or DEFAULT_SEVERITY).upper()),
+            remediation_steps=_text_items(custom.get("remediationSteps")),
+            threat=_text_items(custom.get("threat")),
+            required_scopes=_text_items(scopes),
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"rule": self.rule, "package": self.package, "title": self.title, "description": self.description,
+                "severity": self.severity, "remediationSteps": list(self.remediation_steps),
+                "threat": list(self.threat), "requiredScopes": list(self.required_scopes)}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "PolicyMetadata":
+        return cls(rule=_intern(data["rule"]), package=_intern(data["package"]), title=_intern(data["title"]),
+                   description=_intern(data["description"]), severity=_intern(data["severity"]),
+                   remediation_steps=_text_items(data["remediationSteps"]), threat=_text_items(data["threat"]),
+                   required_scopes=_text_items(data["requiredScopes"]))
+
+
+def _annotation_blocks(content: str) -> Iterator[Tuple[List[str], Optional[str]]]:
+    """Yields the YAML lines of each METADATA comment block and the rule that follows it."""
+    lines = content.splitlines()
+    i = 0
+    while i < len(lines):
+        if lines[i].strip() != "# METADATA":
+            i += 1
+            continue
+        block = []
+        i += 1
+        while i < len(lines) and lines[i].lstrip().startswith("#"):
+            # "# key: value" -> "key: value", keeping the indentation after the comment marker
+            text = lines[i].lstrip()[1:]
+            block.append(text[1:] if text.startswith(" ") else text)
+            i += 1
+        while i < len(lines) and not lines[i].strip():
+            i += 1
+        match = rule_pattern.match(lines[i]) if i < len(lines) else None
+        yield block, match.group(1) if match else None
+
+
+def parse_file(content: str) -> List[PolicyMetadata]:
+    match = package_pattern.search(content)
+    package = match.group(1) if match else ""
+    entries = []
+    for block, rule in _annotation_blocks(content):
+        if rule is None:
+            continue
+        try:
+            annotation = yaml.safe_load("\n".join(block)) or {}
+        except yaml.YAMLError as e:
+            raise Exception(f"Invalid METADATA annotation for rule {rule} in package {package}: {e}")
+        if isinstance(annotation, dict):
+            entries.append(PolicyMetadata.from_annotation(rule, package, annotation))
+    return entries
+
+
+class MetadataIndex(Mapping):
+    """Immutable index of policy METADATA by (package, rule), parsed once per policy tree.
+
+    Rule names are only unique within a package (actions and repository both
+    define token_default_permissions_is_read_write, for instance), so entries
+    are keyed by both. Violations only carry the rule, package, policy name and
+    severity (the latter two are the index's own interned strings); the long
+    descriptions, remediation steps and threats stay here and are added back
+    by expand() when a violation is written out.
+    """
+
+    def __init__(self, entries: Dict[Tuple[str, str], PolicyMetadata]):
+        self._entries = dict(entries)
+
+    def __getitem__(self, key: Tuple[str, str]) -> PolicyMetadata:
+        return self._entries[key]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __eq__(self, other):
+        return isinstance(other, MetadataIndex) and self._entries == other._entries
+
+    __hash__ = None
+
+    @classmethod
+    def from_policies(cls, policies_path: str) -> "MetadataIndex":
+        entries = {}
+        for root, dirs, names in os.walk(policies_path):
+            dirs.sort()
+            for name in sorted(names):
+                if name.endswith(".rego") and not name.endswith("_test.rego"):
+                    with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                        for meta in parse_file(f.read()):
+                            entries[(meta.package, meta.rule)] = meta
+        return cls(entries)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"version": INDEX_VERSION, "rules": [meta.to_json() for meta in self._entries.values()]}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> Optional["MetadataIndex"]:
+        """The index stored by to_json, or None if it was written by another version."""
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return None
+        entries = (PolicyMetadata.from_json(entry) for entry in data["rules"])
+        return cls({(meta.package, meta.rule): meta for meta in entries})
+
+    def annotate(self, violation: Dict[str, Any], package: str):
+        """Sets the short fields every violation of package carries."""
+        meta = self._entries.get((package, violation["rule"]))
+        violation["package"] = meta.package if meta is not None else sys.intern(package)
+        if meta is not None:
+            violation["policyName"] = meta.title
+            violation["severity"] = meta.severity
+
+    def expand(self, violation: Dict[str, Any]) -> Dict[str, Any]:
+        """The violation with the full METADATA of its rule, for output."""
+        meta = self._entries.get((violation.get("package"), violation.get("rule")))
+        if meta is None:
+            return violation
+        return {**violation, "policyName": meta.title, "description": meta.description, "severity": meta.severity,
+                "remediationSteps": list(meta.remediation_steps), "threat": list(meta.threat)}
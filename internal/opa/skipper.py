@@ -1,8 +1,16 @@
-from typing import Set, List
+from typing import Any, Dict, List, Optional, Set
+
+SEVERITIES = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+# Severity of a rule whose METADATA does not set one, as reported on its violations
+DEFAULT_SEVERITY = "MEDIUM"
+
 
 class Skipper:
-    def __init__(self, ignore_file: str = None):
+    def __init__(self, ignore_file: str = None, policies: List[str] = None, min_severity: str = None):
         self.ignored_policies: Set[str] = set()
+        # When set, only these rules (by rule name or title) are enabled
+        self.allowed_policies: Set[str] = set(policies or [])
+        self.min_severity = min_severity.upper() if min_severity else None
         if ignore_file:
             self._load_from_file(ignore_file)
 
@@ -18,3 +26,19 @@ class Skipper:
 
     def should_skip(self, policy_name: str) -> bool:
         return policy_name in self.ignored_policies
+
+    def should_skip_rule(self, rule: str, title: Optional[str] = None, severity: Optional[str] = None) -> bool:
+        """True when a rule is ignored, outside the --policy allow-list or below the minimum severity."""
+        names = {rule} if title is None else {rule, title}
+        if names & self.ignored_policies:
+            return True
+        if self.allowed_policies and not names & self.allowed_policies:
+            return True
+        if self.min_severity:
+            severity = (severity or DEFAULT_SEVERITY).upper()
+            if severity in SEVERITIES and SEVERITIES.index(severity) < SEVERITIES.index(self.min_severity):
+                return True
+        return False
+
+    def should_skip_violation(self, violation: Dict[str, Any]) -> bool:
+        return self.should_skip_rule(violation.get("rule", ""), violation.get("policyName"), violation.get("severity"))
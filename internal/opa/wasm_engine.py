@@ -0,0 +1,260 @@
+import calendar
+import json
+import os
+import re
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import click
+
+# Packages compiled into the Wasm module, one entrypoint each
+WASM_ENTRYPOINTS = ["repository", "organization", "member", "actions", "runner_group"]
+
+PAGE_SIZE = 65536
+
+
+def build_wasm_module(opa_binary: str, policies_path: str, entrypoints: List[str], output_path: str):
+    """Compiles the given entrypoints into a single policy.wasm at output_path."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bundle_path = os.path.join(tmp_dir, "bundle.tar.gz")
+        cmd = [opa_binary, "build", "-t", "wasm", "-o", bundle_path]
+        for entrypoint in entrypoints:
+            cmd.extend(["-e", entrypoint])
+        cmd.append(policies_path)
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"OPA wasm build failed: {result.stderr}")
+
+        with tarfile.open(bundle_path, "r:gz") as tar:
+            member = next((m for m in tar.getmembers() if m.name.lstrip("/") == "policy.wasm"), None)
+            if member is None:
+                raise Exception("OPA wasm build produced no policy.wasm")
+            wasm_bytes = tar.extractfile(member).read()
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(wasm_bytes)
+    os.replace(tmp_path, output_path)
+
+
+# ==========================================
+# Host builtins
+# ==========================================
+# Builtins that OPA does not compile into Wasm are called back into the host.
+# These mirror the Go implementations in OPA's topdown package.
+
+rfc3339_pattern = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})[Tt](\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,9}))?([Zz]|[+-]\d{2}:\d{2})$'
+)
+
+
+def _parse_rfc3339_ns(value: str) -> int:
+    match = rfc3339_pattern.match(value)
+    if not match:
+        raise ValueError(f"time.parse_rfc3339_ns: invalid timestamp {value!r}")
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    seconds = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    if offset not in ("Z", "z"):
+        sign = 1 if offset[0] == "+" else -1
+        seconds -= sign * (int(offset[1:3]) * 3600 + int(offset[4:6]) * 60)
+    nanos = int((fraction or "").ljust(9, "0"))
+    return seconds * 1_000_000_000 + nanos
+
+
+def _split_ns(ns: int):
+    seconds, nanos = divmod(ns, 1_000_000_000)
+    return datetime.fromtimestamp(seconds, tz=timezone.utc), nanos
+
+
+def _time_diff(ns1: int, ns2: int) -> List[int]:
+    t1, _ = _split_ns(ns1)
+    t2, _ = _split_ns(ns2)
+    if t1 > t2:
+        t1, t2 = t2, t1
+
+    year = t2.year - t1.year
+    month = t2.month - t1.month
+    day = t2.day - t1.day
+    hour = t2.hour - t1.hour
+    minute = t2.minute - t1.minute
+    second = t2.second - t1.second
+
+    if second < 0:
+        second += 60
+        minute -= 1
+    if minute < 0:
+        minute += 60
+        hour -= 1
+    if hour < 0:
+        hour += 24
+        day -= 1
+    if day < 0:
+        day += calendar.monthrange(t1.year, t1.month)[1]
+        month -= 1
+    if month < 0:
+        month += 12
+        year -= 1
+    return [year, month, day, hour, minute, second]
+
+
+def _time_format(x: Any) -> str:
+    ns = x[0] if isinstance(x, list) else x
+    dt, nanos = _split_ns(int(ns))
+    # Go's RFC3339Nano drops trailing zeros from the fractional second
+    fraction = f".{nanos:09d}".rstrip("0").rstrip(".")
+    return dt.strftime("%Y-%m-%dT%H:%M:%S") + fraction + "Z"
+
+
+class EvalContext:
+    """Per-evaluation state shared by host builtins (time.now_ns is fixed per query)."""
+
+    def __init__(self):
+        self.now_ns = time.time_ns()
+
+
+HOST_BUILTINS: Dict[str, Callable[..., Any]] = {
+    "time.now_ns": lambda ctx: ctx.now_ns,
+    "time.parse_rfc3339_ns": lambda ctx, value: _parse_rfc3339_ns(value),
+    "time.diff": lambda ctx, ns1, ns2: _time_diff(ns1, ns2),
+    "time.format": lambda ctx, x: _time_format(x),
+    "object.keys": lambda ctx, obj: sorted(obj.keys()),
+}
+
+
+class WasmPolicy:
+    """Evaluates an OPA-compiled Wasm module in-process through wasmtime.
+
+    The module is compiled once; each thread gets its own store and instance,
+    since a wasm instance's heap cannot be shared between concurrent evaluations.
+    """
+
+    def __init__(self, wasm_path: str):
+        try:
+            import wasmtime
+        except ImportError:
+            raise Exception("The wasm OPA mode requires the 'wasmtime' package. Install it with 'pip install wasmtime'.")
+
+        self._wasmtime = wasmtime
+        self._local = threading.local()
+        self.engine = wasmtime.Engine()
+        self.module = wasmtime.Module.from_file(self.engine, wasm_path)
+
+        # Instantiate eagerly so unsupported builtins are reported at startup
+        self.entrypoints = self._instance().entrypoints
+
+    def _instance(self) -> "_WasmInstance":
+        instance = getattr(self._local, "instance", None)
+        if instance is None:
+            instance = _WasmInstance(self._wasmtime, self.engine, self.module)
+            self._local.instance = instance
+        return instance
+
+    def evaluate(self, entrypoint: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluates data.<entrypoint> against input_data, returning the package document."""
+        return self._instance().evaluate(entrypoint, input_data)
+
+
+class _WasmInstance:
+    """A single instantiation of the policy module.
+
+    Uses the single-call `opa_eval` export (ABI 1.2+): the input JSON is written
+    after the data heap and the result is read back as a JSON string.
+    """
+
+    def __init__(self, wasmtime, engine, module):
+        self._ctx = None
+        self.store = wasmtime.Store(engine)
+
+        min_pages = 2
+        for imp in module.imports:
+            if imp.module == "env" and imp.name == "memory":
+                min_pages = max(min_pages, imp.type.limits.min)
+        self.memory = wasmtime.Memory(self.store, wasmtime.MemoryType(wasmtime.Limits(min_pages, None)))
+
+        linker = wasmtime.Linker(engine)
+        linker.define(self.store, "env", "memory", self.memory)
+        i32 = wasmtime.ValType.i32()
+        linker.define_func("env", "opa_abort", wasmtime.FuncType([i32], []), self._abort)
+        linker.define_func("env", "opa_println", wasmtime.FuncType([i32], []), self._println)
+        for arity in range(5):
+            params = [i32] * (arity + 2)
+            linker.define_func("env", f"opa_builtin{arity}", wasmtime.FuncType(params, [i32]), self._call_builtin)
+
+        self.instance = linker.instantiate(self.store, module)
+        self.exports = self.instance.exports(self.store)
+
+        self.builtins_by_id = {v: k for k, v in self._dump(self._call("builtins")).items()}
+        missing = [name for name in self.builtins_by_id.values() if name not in HOST_BUILTINS]
+        if missing:
+            raise Exception(f"Policies use builtins not supported by the wasm mode: {', '.join(sorted(missing))}")
+
+        self.entrypoints: Dict[str, int] = self._dump(self._call("entrypoints"))
+
+        self.data_addr = self._load_json({})
+        self.data_heap_ptr = self._call("opa_heap_ptr_get")
+
+    def _call(self, name: str, *args):
+        return self.exports[name](self.store, *args)
+
+    def _read_cstring(self, addr: int) -> bytes:
+        chunks = []
+        end = self.memory.data_len(self.store)
+        while addr < end:
+            chunk = bytes(self.memory.read(self.store, addr, min(addr + 4096, end)))
+            terminator = chunk.find(b"\0")
+            if terminator >= 0:
+                chunks.append(chunk[:terminator])
+                break
+            chunks.append(chunk)
+            addr += len(chunk)
+        return b"".join(chunks)
+
+    def _dump(self, value_addr: int) -> Any:
+        return json.loads(self._read_cstring(self._call("opa_json_dump", value_addr)))
+
+    def _load_json(self, value: Any) -> int:
+        raw = json.dumps(value).encode("utf-8")
+        raw_addr = self._call("opa_malloc", len(raw))
+        self.memory.write(self.store, raw, raw_addr)
+        value_addr = self._call("opa_json_parse", raw_addr, len(raw))
+        if value_addr == 0:
+            raise Exception("Failed to load JSON into the wasm module")
+        return value_addr
+
+    def _abort(self, addr: int):
+        raise Exception(f"OPA wasm aborted: {self._read_cstring(addr).decode('utf-8', errors='replace')}")
+
+    def _println(self, addr: int):
+        # Policy print() output; stdout carries the report
+        click.echo(self._read_cstring(addr).decode("utf-8", errors="replace"), err=True)
+
+    def _call_builtin(self, builtin_id: int, _ctx_addr: int, *arg_addrs: int) -> int:
+        name = self.builtins_by_id[builtin_id]
+        args = [self._dump(addr) for addr in arg_addrs]
+        return self._load_json(HOST_BUILTINS[name](self._ctx, *args))
+
+    def evaluate(self, entrypoint: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        if entrypoint not in self.entrypoints:
+            raise Exception(f"Package '{entrypoint}' is not compiled into the wasm module")
+
+        raw = json.dumps(input_data).encode("utf-8")
+        self._ctx = EvalContext()
+        input_addr = self.data_heap_ptr
+        needed = input_addr + len(raw) - self.memory.data_len(self.store)
+        if needed > 0:
+            self.memory.grow(self.store, -(-needed // PAGE_SIZE))
+        self.memory.write(self.store, raw, input_addr)
+
+        result_addr = self._call("opa_eval", 0, self.entrypoints[entrypoint], self.data_addr,
+                                 input_addr, len(raw), input_addr + len(raw), 0)
+        results = json.loads(self._read_cstring(result_addr))
+
+        if results:
+            return results[0].get("result", {})
+        return {}
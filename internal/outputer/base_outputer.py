@@ -1,16 +1,52 @@
 import json
+import textwrap
 from rich.console import Console
 from rich.table import Table
 from typing import List, Dict
 
 class ConsoleOutputer:
-    def __init__(self, output_format: str = "human"):
+    def __init__(self, output_format: str = "human", metadata=None):
         self.console = Console()
         self.output_format = output_format
+        # MetadataIndex for adding descriptions and remediation steps to JSON output
+        self.metadata = metadata
+        self._buffer: List[Dict] = []
+        self._count = 0
+
+    # Streaming interface: json and markdown rows are printed as violations arrive,
+    # the human table needs every row first and is printed by end().
+    def begin(self):
+        self._buffer = []
+        self._count = 0
+
+    def emit(self, violation: Dict):
+        if self.output_format == "json":
+            prefix = "[\n" if self._count == 0 else ",\n"
+            print(prefix + textwrap.indent(json.dumps(self._expand(violation), indent=2), "  "), end="", flush=True)
+        elif self.output_format == "markdown":
+            if self._count == 0:
+                self._print_markdown_header()
+            print(self._markdown_row(violation), flush=True)
+        else:
+            self._buffer.append(violation)
+        self._count += 1
+
+    def end(self):
+        if self.output_format == "json":
+            print("\n]" if self._count else "[]")
+        elif self.output_format == "markdown":
+            if self._count == 0:
+                print("No violations found.")
+        else:
+            self.print_violations(self._buffer)
+            self._buffer = []
+
+    def _expand(self, violation: Dict) -> Dict:
+        return self.metadata.expand(violation) if self.metadata is not None else violation
 
     def print_violations(self, violations: List[Dict]):
         if self.output_format == "json":
-            print(json.dumps(violations, indent=2))
+            print(json.dumps([self._expand(v) for v in violations], indent=2))
             return
 
         if self.output_format == "markdown":
@@ -53,25 +89,30 @@ class ConsoleOutputer:
             print("No violations found.")
             return
 
+        self._print_markdown_header()
+        for v in violations:
+            print(self._markdown_row(v))
+
+    def _print_markdown_header(self):
         print("# Legitify Security Analysis Results\n")
         print("| Target | Severity | Policy | Details |")
         print("|---|---|---|---|")
+
+    def _markdown_row(self, v: Dict) -> str:
+        target = v.get("target", "N/A")
+        policy_name = v.get("policyName", v.get("rule", "Unknown"))
+        severity = v.get("severity", "MEDIUM")
+        details = v.get("details")
         
-        for v in violations:
-            target = v.get("target", "N/A")
-            policy_name = v.get("policyName", v.get("rule", "Unknown"))
-            severity = v.get("severity", "MEDIUM")
-            details = v.get("details")
-            
-            detail_str = ""
-            if details:
-                if isinstance(details, dict):
-                     detail_str = ", ".join([f"{k}={v}" for k,v in details.items()])
-                else:
-                     detail_str = str(details)
-            
-            # Escape pipes in markdown table
-            detail_str = detail_str.replace("|", "\\|")
-            
-            print(f"| {target} | {severity} | {policy_name} | {detail_str} |")
+        detail_str = ""
+        if details:
+            if isinstance(details, dict):
+                 detail_str = ", ".join([f"{k}={v}" for k,v in details.items()])
+            else:
+                 detail_str = str(details)
+        
+        # Escape pipes in markdown table
+        detail_str = detail_str.replace("|", "\\|")
+        
+        return f"| {target} | {severity} | {policy_name} | {detail_str} |"
 
@@ -0,0 +1,30 @@
+import json
+from typing import Callable, Dict
+
+
+class ListingOutputer:
+    """Streams list-repos / list-orgs entries as they are fetched.
+
+    "text" prints one line per entry and a total at the end; "json" prints a
+    JSON array with one compact object per line, so scripts can consume it.
+    """
+
+    def __init__(self, output_format: str, text_line: Callable[[Dict], str], total_label: str):
+        self.output_format = output_format
+        self.text_line = text_line
+        self.total_label = total_label
+        self._count = 0
+
+    def emit(self, item: Dict):
+        if self.output_format == "json":
+            prefix = "[\n" if self._count == 0 else ",\n"
+            print(prefix + json.dumps(item, separators=(",", ":")), end="", flush=True)
+        else:
+            print(self.text_line(item), flush=True)
+        self._count += 1
+
+    def end(self):
+        if self.output_format == "json":
+            print("\n]" if self._count else "[]")
+        else:
+            print(f"{self.total_label}: {self._count}")
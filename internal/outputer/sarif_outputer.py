@@ -2,8 +2,21 @@ import json
 from typing import List, Dict, Any
 
 class SarifOutputter:
-    def __init__(self):
-        pass
+    def __init__(self, metadata=None):
+        self._buffer: List[Dict] = []
+        # MetadataIndex the rule descriptions, remediation steps and threats come from
+        self.metadata = metadata
+
+    # SARIF lists the rules before the results, so the whole log is written at the end
+    def begin(self):
+        self._buffer = []
+
+    def emit(self, violation: Dict):
+        self._buffer.append(violation)
+
+    def end(self):
+        self.print_violations(self._buffer)
+        self._buffer = []
 
     def print_violations(self, violations: List[Dict]):
         sarif_log = {
@@ -27,6 +40,8 @@ class SarifOutputter:
         results = []
 
         for v in violations:
+            if self.metadata is not None:
+                v = self.metadata.expand(v)
             rule_id = v.get("rule", "unknown")
             policy_name = v.get("policyName", rule_id)
             description = v.get("description", "")
@@ -54,6 +69,16 @@ class SarifOutputter:
                         "level": level
                     }
                 }
+                remediation_steps = v.get("remediationSteps") or []
+                if remediation_steps:
+                    rules_map[rule_id]["help"] = {
+                        "text": "\n".join(remediation_steps)
+                    }
+                rules_map[rule_id]["properties"] = {
+                    "severity": severity.upper(),
+                    "threat": v.get("threat") or [],
+                    "remediationSteps": remediation_steps
+                }
 
             # Create result
             target = v.get("target", "unknown")
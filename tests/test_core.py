@@ -1,7 +1,10 @@
+import json
 import pytest
+from contextlib import nullcontext
 from unittest.mock import MagicMock, patch
 from internal.collectors.github.organization_collector import OrganizationCollector
 from internal.collectors.github.member_collector import MemberCollector
+from internal.collectors.github.repository_collector import RepositoryCollector
 from internal.opa.opa_engine import OpaEngine
 
 def test_organization_collector():
@@ -37,6 +40,76 @@ def test_member_collector():
     assert members[0].is_admin is True
     assert members[1].is_admin is False
 
+def _raw_repo(name):
+    return {"name": name, "id": f"R_{name}", "url": f"https://github.com/test-org/{name}",
+            "isPrivate": True, "isArchived": False, "pushedAt": None, "defaultBranchRef": None}
+
+def _repo_client(*repos):
+    """A mock GitHub client listing repos, whose REST enrichment calls return empty results.
+
+    Tests override only the calls they assert on.
+    """
+    mock_client = MagicMock()
+    mock_client.get_repositories.return_value = list(repos)
+    mock_client.get_repository_secrets.return_value = []
+    mock_client.get_actions_permissions.return_value = {}
+    mock_client.get_rulesets.return_value = []
+    mock_client.check_vulnerability_alerts.return_value = False
+    mock_client.get_security_analysis.return_value = {}
+    return mock_client
+
+def test_repository_collector_concurrent_enrichment():
+    mock_client = _repo_client(*(_raw_repo(f"repo{i}") for i in range(20)))
+    mock_client.get_repository_secrets.side_effect = lambda owner, repo: [{"name": f"{repo}-secret", "updated_at": "2024-01-01"}]
+    mock_client.get_actions_permissions.side_effect = lambda owner, repo: {"repo": repo}
+    mock_client.get_rulesets.side_effect = Exception("boom")
+    mock_client.check_vulnerability_alerts.return_value = True
+
+    collector = RepositoryCollector(mock_client, "test-org", concurrency=8)
+    repos = collector.collect()
+
+    assert [r.name for r in repos] == [f"repo{i}" for i in range(20)]
+    for r in repos:
+        assert r.repo_secrets[0].name == f"{r.name}-secret"
+        assert r.actions_token_permissions == {"repo": r.name}
+        # A failed ruleset lookup does not drop the calls after it
+        assert r.rules_set == []
+        assert r.vulnerability_alerts_enabled is True
+
+def test_repository_collector_graphql_enrichment_falls_back_to_rest():
+    mock_client = _repo_client(_raw_repo("a"), _raw_repo("b"))
+    mock_client.get_repositories_security_settings.return_value = {
+        "R_a": {"vulnerability_alerts_enabled": True, "rules_set": [{"name": "protect-main"}]},
+        # GraphQL could not provide these for "b"
+        "R_b": {"vulnerability_alerts_enabled": None, "rules_set": None},
+    }
+    mock_client.get_rulesets.return_value = [{"name": "from-rest"}]
+
+    collector = RepositoryCollector(mock_client, "test-org", graphql_enrichment=True)
+    a, b = collector.collect()
+
+    mock_client.get_repositories_security_settings.assert_called_once_with(["R_a", "R_b"], owner="test-org")
+    assert a.vulnerability_alerts_enabled is True
+    assert a.rules_set == [{"name": "protect-main"}]
+    assert b.vulnerability_alerts_enabled is False
+    assert b.rules_set == [{"name": "from-rest"}]
+    mock_client.get_rulesets.assert_called_once_with("test-org", "b")
+    mock_client.check_vulnerability_alerts.assert_called_once_with("test-org", "b")
+
+def test_repository_collector_collect_by_name_skips_org_listing():
+    mock_client = _repo_client()
+    mock_client.get_repositories_by_name.return_value = {"test-org/b": _raw_repo("b")}
+    mock_client.check_vulnerability_alerts.return_value = True
+
+    repos = RepositoryCollector(mock_client, "test-org").collect_by_name(["b", "missing"])
+
+    mock_client.get_repositories.assert_not_called()
+    mock_client.get_repositories_by_name.assert_called_once_with(["test-org/b", "test-org/missing"],
+                                                                 include_collaborators=True, include_webhooks=True)
+    assert [r.name for r in repos] == ["b"]
+    assert repos[0].vulnerability_alerts_enabled is True
+    mock_client.get_repository_secrets.assert_called_once_with("test-org", "b")
+
 @patch("subprocess.Popen")
 @patch("shutil.which")
 @patch("os.walk")
@@ -57,3 +130,751 @@ def test_opa_engine(mock_open, mock_walk, mock_which, mock_popen):
 
     assert len(violations) == 1
     assert violations[0]["rule"] == "rule1"
+
+@patch("internal.opa.opa_server.OpaServer.health", return_value=True)
+@patch("subprocess.Popen")
+@patch("shutil.which")
+@patch("os.walk")
+def test_opa_engine_server_mode(mock_walk, mock_which, mock_popen, mock_health):
+    mock_which.return_value = "/usr/bin/opa"
+    mock_walk.return_value = []
+
+    mock_process = MagicMock()
+    mock_process.poll.return_value = None
+    mock_popen.return_value = mock_process
+
+    engine = OpaEngine("/policies", mode="server")
+    cmd = mock_popen.call_args[0][0]
+    assert cmd[:3] == ["/usr/bin/opa", "run", "--server"]
+
+    mock_response = MagicMock(status_code=200)
+    mock_response.json.return_value = {"result": {"rule1": True, "rule2": False}}
+    engine.server.session.post = MagicMock(return_value=mock_response)
+
+    violations = engine.eval({"some": "input"}, package="repository")
+    assert [v["rule"] for v in violations] == ["rule1"]
+    assert engine.server.session.post.call_args[0][0].endswith("/v1/data/repository")
+
+    # A dead process is restarted before the next evaluation
+    mock_process.poll.return_value = 1
+    restarted_process = MagicMock()
+    restarted_process.poll.return_value = None
+    mock_popen.return_value = restarted_process
+    engine.eval({"some": "input"}, package="repository")
+    assert mock_popen.call_count == 2
+
+    # A wedged server times out, and is replaced by one on a fresh port
+    import requests
+    assert engine.server.session.post.call_args.kwargs["timeout"] == engine.server.request_timeout
+    engine.server.session.post = MagicMock(side_effect=[requests.ReadTimeout(), mock_response])
+    with patch.object(engine.server, "_free_port", return_value=43210):
+        violations = engine.eval({"some": "input"}, package="repository")
+    assert [v["rule"] for v in violations] == ["rule1"]
+    assert mock_popen.call_count == 3
+    assert "127.0.0.1:43210" in mock_popen.call_args[0][0]
+    assert engine.server.session.post.call_args[0][0].startswith("http://127.0.0.1:43210/")
+
+    engine.close()
+
+@patch("subprocess.Popen")
+@patch("shutil.which")
+@patch("os.walk")
+def test_opa_engine_eval_many(mock_walk, mock_which, mock_popen):
+    mock_which.return_value = "/usr/bin/opa"
+    mock_walk.return_value = []
+
+    def fake_opa(*args, **kwargs):
+        process = MagicMock()
+        process.returncode = 0
+        def communicate(input):
+            batch = json.loads(input)["batch"]
+            # Only entities named "bad" violate rule1
+            batch_result = {str(i): {"rule1": x["name"] == "bad"} for i, x in enumerate(batch)}
+            return json.dumps({"result": [{"expressions": [{"value": True}], "bindings": {"batch_result": batch_result}}]}), ""
+        process.communicate.side_effect = communicate
+        return process
+    mock_popen.side_effect = fake_opa
+
+    engine = OpaEngine("/policies", batch_size=2)
+    inputs = ((name, {"name": name}) for name in ["good", "bad", "bad", "good", "bad"])
+    results = list(engine.eval_many(inputs, package="repository"))
+
+    assert mock_popen.call_count == 3
+    assert "input.batch[i]" in mock_popen.call_args[0][0][5]
+    assert [key for key, _ in results] == ["good", "bad", "bad", "good", "bad"]
+    assert [len(violations) for _, violations in results] == [0, 1, 1, 0, 1]
+
+@patch("subprocess.run")
+@patch("shutil.which")
+def test_opa_engine_bundle_cache(mock_which, mock_run, tmp_path):
+    mock_which.return_value = "/usr/bin/opa"
+    policies = tmp_path / "policies"
+    policies.mkdir()
+    (policies / "repository.rego").write_text(
+        "package repository\n\n"
+        "# METADATA\n"
+        "# title: Rule One\n"
+        "# custom:\n"
+        "#   severity: HIGH\n"
+        "default rule1 := true\n"
+    )
+    cache_dir = tmp_path / "cache"
+
+    def fake_build(cmd, **kwargs):
+        open(cmd[cmd.index("-o") + 1], "w").close()
+        return MagicMock(returncode=0)
+    mock_run.side_effect = fake_build
+
+    engine = OpaEngine(str(policies), cache_dir=str(cache_dir))
+    assert mock_run.call_count == 1
+    assert ["-e", "repository"] == mock_run.call_args[0][0][5:7]
+    assert engine.bundle_path.startswith(str(cache_dir))
+    assert engine._policy_args() == ["-b", engine.bundle_path]
+    assert engine.metadata_cache[("repository", "rule1")].severity == "HIGH"
+
+    # Unchanged policies reuse both the bundle and the metadata index
+    with patch.object(OpaEngine, "_parse_metadata") as mock_parse:
+        cached = OpaEngine(str(policies), cache_dir=str(cache_dir))
+    assert mock_run.call_count == 1
+    mock_parse.assert_not_called()
+    assert cached.bundle_path == engine.bundle_path
+    assert cached.metadata_cache == engine.metadata_cache
+
+    # Editing a policy invalidates the entry
+    (policies / "repository.rego").write_text("package repository\n\ndefault rule2 := true\n")
+    rebuilt = OpaEngine(str(policies), cache_dir=str(cache_dir))
+    assert mock_run.call_count == 2
+    assert rebuilt.bundle_path != engine.bundle_path
+
+@patch("shutil.which")
+@patch("os.walk")
+def test_opa_engine_eval_many_parallel_keeps_order(mock_walk, mock_which):
+    import threading
+    import time
+    mock_which.return_value = "/usr/bin/opa"
+    mock_walk.return_value = []
+
+    engine = OpaEngine("/policies", batch_size=1, workers=4)
+    threads = set()
+
+    def fake_batch(inputs, package):
+        threads.add(threading.get_ident())
+        # Later batches finish first
+        time.sleep(0.01 * (10 - inputs[0]["n"]))
+        return [{"rule1": x["n"] % 2 == 0} for x in inputs]
+
+    with patch.object(engine, "_eval_batch", side_effect=fake_batch):
+        results = list(engine.eval_many(((n, {"n": n}) for n in range(10)), package="repository"))
+
+    assert [key for key, _ in results] == list(range(10))
+    assert [len(v) for _, v in results] == [1, 0] * 5
+    assert len(threads) > 1
+
+def test_incremental_scan_reuses_unchanged_repositories(tmp_path):
+    from cli.analyze import _analyze_org_repos_incremental
+    from internal.common.incremental_state import IncrementalState
+    from internal.opa.skipper import Skipper
+
+    mock_client = _repo_client(_raw_repo("a"), _raw_repo("b"))
+
+    engine = MagicMock()
+    engine.eval_many.side_effect = lambda inputs, package: (
+        (repo, [{"policyName": f"{repo.name}-policy"}]) for repo, _ in inputs
+    )
+    state_path = str(tmp_path / "state.json")
+
+    def scan():
+        state = IncrementalState(state_path, "hash1")
+        violations = []
+        collector = RepositoryCollector(mock_client, "test-org")
+        _analyze_org_repos_incremental(collector, "test-org", engine, violations.append, Skipper(None), state)
+        state.save()
+        return state, violations
+
+    state, violations = scan()
+    assert state.rescanned == 2 and state.reused == 0
+    assert mock_client.get_repository_secrets.call_count == 2
+
+    # "b" was pushed to since the previous run
+    changed = _raw_repo("b")
+    changed["pushedAt"] = "2024-06-01T00:00:00Z"
+    mock_client.get_repositories.return_value = [_raw_repo("a"), changed]
+    state, violations = scan()
+
+    assert state.rescanned == 1 and state.reused == 1
+    assert mock_client.get_repository_secrets.call_count == 3
+    assert mock_client.get_repository_secrets.call_args[0] == ("test-org", "b")
+    assert sorted((v["target"], v["policyName"]) for v in violations) == [("a", "a-policy"), ("b", "b-policy")]
+
+    # A new admin collaborator moves neither marker but changes the listing
+    with_admin = _raw_repo("a")
+    with_admin["collaborators"] = {"nodes": [{"login": "mallory", "permission": "ADMIN"}]}
+    mock_client.get_repositories.return_value = [with_admin, changed]
+    state, violations = scan()
+
+    assert state.rescanned == 1 and state.reused == 1
+    assert mock_client.get_repository_secrets.call_args[0] == ("test-org", "a")
+
+    # A policy change invalidates every stored result
+    assert IncrementalState(state_path, "hash2").repos == {}
+
+def test_snapshot_round_trip(tmp_path, capsys):
+    from cli.analyze import _analyze_repos, _eval_entity, _analyze_snapshot
+    from internal.common.snapshot import SnapshotWriter
+    from internal.opa.skipper import Skipper
+
+    mock_client = _repo_client(_raw_repo("a"), _raw_repo("b"))
+    mock_client.check_vulnerability_alerts.return_value = True
+    repos = RepositoryCollector(mock_client, "test-org").collect()
+
+    engine = MagicMock()
+    engine.eval.return_value = []
+    engine.eval_many.side_effect = lambda inputs, package: ((key, []) for key, _ in inputs)
+
+    snapshot_dir = str(tmp_path / "snapshot")
+    with SnapshotWriter(snapshot_dir) as snapshot:
+        _eval_entity(engine, "organization", "test-org", {"organization": {"name": "test-org"}}, [].append, Skipper(None), snapshot)
+        _analyze_repos(repos, engine, [].append, Skipper(None), snapshot=snapshot)
+
+    # Offline evaluation sees exactly the inputs built during collection
+    seen = {}
+    def fake_eval_many(inputs, package):
+        for target, input_data in inputs:
+            seen[(package, target)] = input_data
+            yield target, [{"policyName": f"{package}-policy"}]
+    engine.eval_many.side_effect = fake_eval_many
+
+    violations = []
+    _analyze_snapshot(snapshot_dir, ["organization", "repository"], engine, violations.append, Skipper(None))
+
+    assert seen[("organization", "test-org")] == {"organization": {"name": "test-org"}}
+    assert seen[("repository", "a")]["repository"]["vulnerability_alerts_enabled"] is True
+    assert sorted(v["target"] for v in violations) == ["a", "b", "test-org"]
+    assert "incomplete" not in capsys.readouterr().err
+
+    # A scan that fails part way leaves a snapshot marked as incomplete
+    with pytest.raises(Exception, match="connection reset"), SnapshotWriter(snapshot_dir) as snapshot:
+        snapshot.write("repository", "a", seen[("repository", "a")])
+        raise Exception("connection reset")
+    _analyze_snapshot(snapshot_dir, ["repository"], engine, [].append, Skipper(None))
+    assert "results are incomplete" in capsys.readouterr().err
+
+def test_repository_collector_streams_one_page_at_a_time():
+    fetched = []
+    def listing(org, **options):
+        for i in range(120):
+            fetched.append(i)
+            yield _raw_repo(f"repo{i}")
+
+    mock_client = _repo_client()
+    mock_client.get_repositories.side_effect = listing
+
+    stream = RepositoryCollector(mock_client, "test-org").stream()
+    first = next(stream)
+
+    assert first.name == "repo0"
+    # Only the first page has been listed and enriched
+    assert len(fetched) == 50
+    assert mock_client.get_repository_secrets.call_count == 50
+    assert len(list(stream)) == 119
+
+def test_prefetch_overlaps_with_bounded_queue():
+    import threading
+    import time
+    from internal.common.pipeline import prefetch
+
+    produced = []
+    release = threading.Event()
+    def producer():
+        for i in range(10):
+            produced.append(i)
+            yield i
+        release.wait(1)
+
+    items = prefetch(producer(), maxsize=3)
+    assert next(items) == 0
+    # The producer runs ahead, but stops once the queue is full
+    deadline = time.monotonic() + 1
+    while len(produced) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 4 <= len(produced) <= 5
+    release.set()
+    assert list(items) == list(range(1, 10))
+
+def test_prefetch_reraises_producer_errors():
+    from internal.common.pipeline import prefetch
+
+    def producer():
+        yield 1
+        raise ValueError("collection failed")
+
+    items = prefetch(producer())
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="collection failed"):
+        next(items)
+
+def test_ordered_emitter_releases_tasks_in_planned_order():
+    from internal.common.pipeline import OrderedEmitter
+
+    emitted = []
+    ordered = OrderedEmitter(emitted.append, 3)
+    first, second, third = (ordered.channel(i) for i in range(3))
+
+    third("c1")
+    second("b1")
+    first("a1")
+    assert emitted == ["a1"]  # the head streams, later tasks wait
+    ordered.finish(2)
+    assert emitted == ["a1"]
+    ordered.finish(0)
+    assert emitted == ["a1", "b1"]
+    second("b2")
+    assert emitted == ["a1", "b1", "b2"]
+    ordered.finish(1)
+    assert emitted == ["a1", "b1", "b2", "c1"]
+
+def test_analyze_github_org_runs_namespaces_concurrently_and_isolates_errors():
+    import threading
+    from cli.analyze import _analyze_github_org
+    from internal.common.config import Config
+    from internal.common.types import Member
+    from internal.opa.skipper import Skipper
+
+    # Members and Actions only get past the barrier if they are collected at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    def members():
+        barrier.wait()
+        return [Member(login="alice", role="ADMIN")]
+    def actions():
+        barrier.wait()
+        return []
+
+    config = Config(orgs=["test-org"], repos=[], token="t", output_format="json", output_scheme="default",
+                    policies_path="./policies", namespaces=[], scorecard="no", failed_only=False, scm_type="github")
+    engine = MagicMock()
+    engine.eval.side_effect = lambda input_data, package: [{"policyName": f"{package}-policy"}]
+    violations = []
+
+    with patch("internal.collectors.github.organization_collector.OrganizationCollector.collect",
+               side_effect=Exception("403 Forbidden")), \
+         patch("internal.collectors.github.member_collector.MemberCollector.collect", side_effect=members), \
+         patch("internal.collectors.github.actions_collector.ActionsCollector.collect", side_effect=actions), \
+         pytest.raises(Exception, match="Organization details of test-org failed"):
+        _analyze_github_org(MagicMock(), config, "test-org", ["organization", "member", "actions"],
+                            engine, violations.append, Skipper(None))
+
+    # The failing organization namespace does not stop the others, but fails the scan once they finish
+    assert violations == [{"policyName": "member-policy", "target": "test-org (Members)"}]
+
+def test_analyze_github_fails_after_the_other_organizations_finish():
+    from cli.analyze import _analyze_github
+    from internal.common.config import Config
+    from internal.opa.skipper import Skipper
+
+    config = Config(orgs=["org-a", "org-b", "org-c"], repos=[], token="t", output_format="json",
+                    output_scheme="default", policies_path="./policies", namespaces=[], scorecard="no",
+                    failed_only=False, scm_type="github")
+    config.org_concurrency = 2
+    client = MagicMock(response_cache=None)
+    client.negative_cache.report.return_value = []
+    scanned = []
+
+    def analyze_org(client, config, org, namespaces, engine, emit, *args):
+        scanned.append(org)
+        if org == "org-a":
+            raise Exception("502 Bad Gateway")
+        emit({"target": org})
+
+    violations = []
+    with patch("cli.analyze._github_client", return_value=client), \
+         patch("cli.analyze._check_token_scopes"), \
+         patch("cli.analyze._analyze_github_org", side_effect=analyze_org), \
+         pytest.raises(Exception, match="1 organizations failed: org-a"):
+        _analyze_github(config, ["organization"], MagicMock(), violations.append, Skipper(None))
+
+    assert sorted(scanned) == ["org-a", "org-b", "org-c"]
+    assert violations == [{"target": "org-b"}, {"target": "org-c"}]
+
+def test_collection_plan_skips_calls_only_ignored_policies_need(tmp_path):
+    from internal.opa.collection_plan import CollectionPlan
+    from internal.opa.skipper import Skipper
+
+    full_plan = CollectionPlan.from_policies("policies")
+    assert full_plan.skipped_steps("repository") == []
+
+    ignore_file = tmp_path / "ignore.txt"
+    ignore_file.write_text("repository_secret_is_stale\nvulnerability_alerts_not_enabled\n")
+    plan = CollectionPlan.from_policies("policies", Skipper(str(ignore_file)))
+    assert plan.skipped_steps("repository") == ["repo_secrets", "vulnerability_alerts_enabled"]
+    assert plan.fingerprint() != full_plan.fingerprint()
+
+    mock_client = _repo_client(_raw_repo("a"))
+    RepositoryCollector(mock_client, "test-org", plan=plan).collect()
+
+    mock_client.get_repository_secrets.assert_not_called()
+    mock_client.check_vulnerability_alerts.assert_not_called()
+    mock_client.get_rulesets.assert_called_once_with("test-org", "a")
+
+def test_collection_plan_follows_helper_rules_and_imports(tmp_path):
+    from internal.opa.collection_plan import CollectionPlan
+
+    (tmp_path / "common").mkdir()
+    (tmp_path / "common" / "util.rego").write_text("package common.util\n\nstale(s) {\n    s.updated_at\n}\n")
+    (tmp_path / "repository.rego").write_text(
+        "package repository\n\nimport data.common.util as util\n\n"
+        "# METADATA\n# title: Stale Secret\ndefault stale_secret := false\n\n"
+        "stale_secret := true if {\n    s := secrets[_]\n    util.stale(s)\n}\n\n"
+        "secrets := input.repository_secrets\n\n"
+        "unused := input.hooks\n"
+    )
+    plan = CollectionPlan.from_policies(str(tmp_path))
+
+    assert plan.needs("repository", "repo_secrets")
+    # Only read by a rule no policy uses
+    assert not plan.needs("repository", "hooks")
+    assert not plan.needs_package("organization")
+
+def test_work_queue_requeues_expired_and_failed_units(tmp_path):
+    from internal.common.work_queue import WorkQueue, DONE, FAILED
+
+    queue = WorkQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    assert queue.add([{"id": "org/member"}, {"id": "org/repository/0"}]) == 2
+    assert queue.add([{"id": "org/member"}]) == 0
+
+    # worker-a crashes holding its lease; the unit goes to worker-b once the lease expires
+    assert queue.lease("worker-a", lease_seconds=-1)["id"] == "org/member"
+    assert queue.lease("worker-b")["id"] == "org/member"
+    assert not queue.complete("org/member", "worker-a", [{"policyName": "stale"}])
+    assert queue.complete("org/member", "worker-b", [{"policyName": "p", "target": "org (Members)"}])
+
+    assert queue.lease("worker-b")["id"] == "org/repository/0"
+    queue.fail("org/repository/0", "worker-b", "boom")
+    assert queue.lease("worker-b")["id"] == "org/repository/0"
+    queue.fail("org/repository/0", "worker-b", "boom")
+    assert queue.lease("worker-b") is None
+
+    assert queue.counts() == {DONE: 1, FAILED: 1}
+    assert queue.failures() == [{"id": "org/repository/0", "attempts": 2, "error": "boom"}]
+    assert list(queue.results()) == [{"policyName": "p", "target": "org (Members)"}]
+
+def test_work_queue_worker_and_merge(tmp_path):
+    from cli.analyze import _run_work_queue_worker, _merge_work_queue, _queue_plan_meta
+    from internal.opa.collection_plan import CollectionPlan
+    from internal.common.config import Config
+    from internal.common.work_queue import WorkQueue
+    from internal.opa.skipper import Skipper
+
+    path = str(tmp_path / "queue.db")
+    queue = WorkQueue(path)
+    queue.set_meta("policy_hash", "h1")
+    plan = CollectionPlan.from_policies("policies")
+    for key, value in _queue_plan_meta(plan).items():
+        queue.set_meta(key, value)
+    queue.add([{"id": f"org/repository/{i}", "org": "org", "namespace": "repository", "repos": [f"r{i}"]}
+               for i in range(3)])
+    queue.close()
+
+    attempts = []
+    def run_unit(client, config, unit, engine, emit, skipper, plan=None):
+        attempts.append(unit["id"])
+        if unit["id"] == "org/repository/1" and attempts.count(unit["id"]) == 1:
+            raise Exception("secondary rate limit")
+        emit({"policyName": "p", "target": unit["repos"][0]})
+
+    config = Config(orgs=[], repos=[], token="t", output_format="json", output_scheme="default",
+                    policies_path="./policies", namespaces=[], scorecard="no", failed_only=False, scm_type="github",
+                    work_queue=path, queue_role="worker")
+    engine = MagicMock(policy_hash="h1")
+    with patch("cli.analyze._github_client"), patch("cli.analyze._run_work_unit", side_effect=run_unit):
+        _run_work_queue_worker(config, engine, Skipper(None), plan=plan)
+
+    # The failed unit is retried, and the merged report keeps the planned order
+    assert attempts == ["org/repository/0", "org/repository/1", "org/repository/1", "org/repository/2"]
+    merged = []
+    _merge_work_queue(path, merged.append)
+    assert [v["target"] for v in merged] == ["r0", "r1", "r2"]
+
+    # A worker started with another rule selection refuses to run
+    narrowed = CollectionPlan.from_policies("policies", Skipper(None, min_severity="HIGH"))
+    with pytest.raises(Exception, match="different rule selection"):
+        _run_work_queue_worker(config, engine, Skipper(None, min_severity="HIGH"), plan=narrowed)
+
+    engine.policy_hash = "h2"
+    with pytest.raises(Exception, match="different policies"):
+        _run_work_queue_worker(config, engine, Skipper(None), plan=plan)
+
+def test_checkpoint_resumes_after_the_last_finished_page(tmp_path):
+    from cli.analyze import _analyze_github_org
+    from internal.common.checkpoint import ScanCheckpoint
+    from internal.common.config import Config
+    from internal.common.types import Member
+    from internal.opa.skipper import Skipper
+
+    crash = {"enabled": True}
+    def pages(org, cursor=None, **options):
+        if cursor is None:
+            yield [_raw_repo("a"), _raw_repo("b")], "c1"
+        if crash["enabled"]:
+            raise Exception("connection reset")
+        yield [_raw_repo("c")], "c2"
+
+    mock_client = _repo_client()
+    mock_client.get_repository_pages.side_effect = pages
+
+    engine = MagicMock()
+    engine.eval.side_effect = lambda input_data, package: [{"policyName": f"{package}-policy"}]
+    engine.eval_many.side_effect = lambda inputs, package: ((repo, [{"policyName": "repo-policy"}]) for repo, _ in inputs)
+    config = Config(orgs=["test-org"], repos=[], token="t", output_format="json", output_scheme="default",
+                    policies_path="./policies", namespaces=[], scorecard="no", failed_only=False, scm_type="github")
+    path = str(tmp_path / "checkpoint.jsonl")
+
+    def scan(resume):
+        checkpoint = ScanCheckpoint(path, "key", resume=resume)
+        violations = []
+        # A crashed repository listing fails the scan after the other namespaces finish
+        failure = pytest.raises(Exception, match="Repositories of test-org failed") if crash["enabled"] else nullcontext()
+        with patch("internal.collectors.github.member_collector.MemberCollector.collect",
+                   return_value=[Member(login="alice", role="ADMIN")]) as members, failure:
+            _analyze_github_org(mock_client, config, "test-org", ["member", "repository"], engine, violations.append,
+                                Skipper(None), checkpoint=checkpoint)
+        checkpoint.close()
+        return sorted(v["target"] for v in violations), members.call_count
+
+    # The scan dies after the first repository page
+    assert scan(resume=False) == (["a", "b", "test-org (Members)"], 1)
+
+    crash["enabled"] = False
+    assert scan(resume=True) == (["a", "b", "c", "test-org (Members)"], 0)
+    assert mock_client.get_repository_pages.call_args.kwargs["cursor"] == "c1"
+    assert mock_client.get_repository_secrets.call_count == 3
+
+    # A finished scan replays everything; another scope does not resume from it
+    assert scan(resume=True) == (["a", "b", "c", "test-org (Members)"], 0)
+    with pytest.raises(Exception, match="different scan"):
+        ScanCheckpoint(path, "other-key", resume=True)
+
+def test_checkpoint_drops_a_partially_written_line(tmp_path):
+    from internal.common.checkpoint import ScanCheckpoint
+
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = ScanCheckpoint(str(path), "key")
+    checkpoint.record_unit("org/member", [{"policyName": "p"}])
+    checkpoint.close()
+    with open(path, "a") as f:
+        f.write('{"unit": "org/actions", "viol')
+
+    checkpoint = ScanCheckpoint(str(path), "key", resume=True)
+    checkpoint.record_unit("org/actions", [])
+    checkpoint.close()
+    resumed = ScanCheckpoint(str(path), "key", resume=True)
+    assert resumed.completed("org/member") == [{"policyName": "p"}]
+    assert resumed.completed("org/actions") == []
+
+@patch("subprocess.Popen")
+@patch("shutil.which")
+def test_opa_engine_memoizes_results_of_identical_policy_inputs(mock_which, mock_popen, tmp_path):
+    mock_which.return_value = "/usr/bin/opa"
+    policies = tmp_path / "policies"
+    policies.mkdir()
+    (policies / "repository.rego").write_text(
+        "package repository\n\n"
+        "# METADATA\n"
+        "# title: Forking allowed\n"
+        "forking_allowed := true if {\n"
+        "    input.repository.allow_forking\n"
+        "}\n"
+    )
+    (policies / "member.rego").write_text(
+        "package member\n\n"
+        "stale := true if {\n"
+        "    time.now_ns() > input.last_active\n"
+        "}\n"
+    )
+
+    evaluated = []
+    def fake_opa(*args, **kwargs):
+        process = MagicMock()
+        process.returncode = 0
+        def communicate(input):
+            batch = json.loads(input)["batch"]
+            evaluated.extend(x["repository"]["name"] for x in batch)
+            batch_result = {str(i): {"forking_allowed": x["repository"]["allow_forking"]} for i, x in enumerate(batch)}
+            return json.dumps({"result": [{"bindings": {"batch_result": batch_result}}]}), ""
+        process.communicate.side_effect = communicate
+        return process
+    mock_popen.side_effect = fake_opa
+
+    def repo(name, allow_forking):
+        return name, {"repository": {"name": name, "url": f"https://github.com/o/{name}", "allow_forking": allow_forking}}
+    inputs = [repo("a", True), repo("b", False), repo("c", True), repo("d", True)]
+    memo_dir = str(tmp_path / "memo")
+
+    engine = OpaEngine(str(policies), memo=True, memo_dir=memo_dir)
+    results = list(engine.eval_many(iter(inputs), package="repository"))
+    # Names and URLs are not read by any rule, so "c" and "d" reuse the result of "a"
+    assert evaluated == ["a", "b"]
+    assert [(key, len(v)) for key, v in results] == [("a", 1), ("b", 0), ("c", 1), ("d", 1)]
+    assert (engine.memo.hits, engine.memo.misses) == (2, 2)
+
+    # A later run with the same policies reuses the results on disk
+    engine = OpaEngine(str(policies), memo=True, memo_dir=memo_dir)
+    assert [len(v) for _, v in engine.eval_many(iter(inputs), package="repository")] == [1, 0, 1, 1]
+    assert evaluated == ["a", "b"]
+
+    # Clock-dependent packages can be left out of the memo entirely
+    engine = OpaEngine(str(policies), memo=True, memo_time_window=0)
+    assert engine.memo.key("member", {"last_active": 0}) is None
+    assert engine.memo.key("repository", {"repository": {"allow_forking": True}}) is not None
+
+@patch("subprocess.Popen")
+@patch("shutil.which")
+def test_opa_engine_only_queries_enabled_rules(mock_which, mock_popen, tmp_path):
+    from internal.opa.collection_plan import CollectionPlan
+    from internal.opa.skipper import Skipper
+
+    mock_which.return_value = "/usr/bin/opa"
+    policies = tmp_path / "policies"
+    policies.mkdir()
+    (policies / "repository.rego").write_text(
+        "package repository\n\n"
+        "# METADATA\n"
+        "# title: Forking allowed\n"
+        "# custom:\n"
+        "#   severity: LOW\n"
+        "forking_allowed := true if {\n"
+        "    input.repository.allow_forking\n"
+        "}\n\n"
+        "# METADATA\n"
+        "# title: Repository is public\n"
+        "# custom:\n"
+        "#   severity: HIGH\n"
+        "public := true if {\n"
+        "    input.repository.is_private == false\n"
+        "}\n\n"
+        "# METADATA\n"
+        "# title: Repository is archived\n"
+        "# custom:\n"
+        "#   severity: CRITICAL\n"
+        "archived := true if {\n"
+        "    input.repository.is_archived\n"
+        "}\n"
+    )
+
+    skipper = Skipper(None, policies=["Repository is public", "forking_allowed", "archived"], min_severity="high")
+    plan = CollectionPlan.from_policies(str(policies), skipper)
+    assert plan.enabled_rules == {"repository": ["archived", "public"]}
+
+    mock_process = MagicMock()
+    mock_process.communicate.return_value = (json.dumps({"result": [{"bindings": {"batch_result": {
+        "0": {"public": True, "archived": False}}}}]}), "")
+    mock_process.returncode = 0
+    mock_popen.return_value = mock_process
+
+    engine = OpaEngine(str(policies))
+    engine.select_rules(plan.enabled_rules)
+    results = list(engine.eval_many(iter([("a", {"repository": {"is_private": False}})]), package="repository"))
+
+    query = mock_popen.call_args[0][0][-3]
+    assert 'name := ["archived", "public"][_]' in query
+    assert "forking_allowed" not in query
+    assert [v["rule"] for v in results[0][1]] == ["public"]
+
+    # A package whose rules are all disabled is not evaluated at all
+    mock_popen.reset_mock()
+    engine.select_rules({"repository": []})
+    assert engine.eval({"repository": {}}, package="repository") == []
+    mock_popen.assert_not_called()
+
+def test_metadata_index_parses_annotations_and_expands_violations(tmp_path, capsys):
+    from internal.opa.policy_metadata import MetadataIndex
+    from internal.outputer.base_outputer import ConsoleOutputer
+    from internal.outputer.sarif_outputer import SarifOutputter
+
+    policies = tmp_path / "policies"
+    policies.mkdir()
+    (policies / "repository.rego").write_text(
+        "package repository\n\n"
+        "# METADATA\n"
+        "# scope: rule\n"
+        "# title: Forking allowed\n"
+        "# description: Forks leak code.\n"
+        "# custom:\n"
+        "#   severity: high\n"
+        "#   remediationSteps:\n"
+        "#     - 1. Go to the settings page: Settings -> General\n"
+        "#     - 2. Disable forking\n"
+        "#   requiredScopes: [read:org,repo]\n"
+        "#   threat: Forks outlive access removal.\n"
+        "forking_allowed := true if {\n"
+        "    input.repository.allow_forking\n"
+        "}\n"
+    )
+
+    index = MetadataIndex.from_policies(str(policies))
+    meta = index[("repository", "forking_allowed")]
+    assert (meta.title, meta.severity, meta.package) == ("Forking allowed", "HIGH", "repository")
+    assert meta.remediation_steps == ("1. Go to the settings page: Settings -> General", "2. Disable forking")
+    assert meta.threat == ("Forks outlive access removal.",)
+    assert meta.required_scopes == ("read:org", "repo")
+    assert MetadataIndex.from_json(index.to_json()) == index
+    assert MetadataIndex.from_json({"forking_allowed": {"title": "old format"}}) is None
+
+    # Violations only carry the short fields, shared with the index
+    violations = [{"rule": "forking_allowed", "details": None, "status": "FAILED"} for _ in range(2)]
+    for v in violations:
+        index.annotate(v, "repository")
+        v["target"] = "a"
+    assert set(violations[0]) == {"rule", "package", "details", "status", "policyName", "severity", "target"}
+    assert violations[0]["policyName"] is violations[1]["policyName"] is meta.title
+
+    outputer = ConsoleOutputer(output_format="json", metadata=index)
+    outputer.begin()
+    outputer.emit(violations[0])
+    outputer.end()
+    printed = json.loads(capsys.readouterr().out)
+    assert printed[0]["remediationSteps"] == list(meta.remediation_steps)
+    assert printed[0]["threat"] == ["Forks outlive access removal."]
+
+    outputer = SarifOutputter(metadata=index)
+    outputer.begin()
+    outputer.emit(violations[0])
+    outputer.end()
+    rule = json.loads(capsys.readouterr().out)["runs"][0]["tool"]["driver"]["rules"][0]
+    assert rule["fullDescription"]["text"] == "Forks leak code."
+    assert rule["help"]["text"].startswith("1. Go to the settings page")
+    assert rule["properties"]["threat"] == ["Forks outlive access removal."]
+
+def test_metadata_index_keeps_same_named_rules_of_different_packages_apart():
+    from internal.opa.policy_metadata import MetadataIndex
+
+    index = MetadataIndex.from_policies("policies/github")
+    rule = "token_default_permissions_is_read_write"
+    actions, repository = index[("actions", rule)], index[("repository", rule)]
+    assert actions.title != repository.title
+
+    for package, meta in (("actions", actions), ("repository", repository)):
+        violation = {"rule": rule, "details": None, "status": "FAILED"}
+        index.annotate(violation, package)
+        assert violation["policyName"] == meta.title
+        assert index.expand(violation)["remediationSteps"] == list(meta.remediation_steps)
+
+def test_analyze_closes_streamed_report_when_collection_fails():
+    from click.testing import CliRunner
+    from cli.analyze import analyze
+    from internal.opa.policy_metadata import MetadataIndex
+
+    engine = MagicMock(memo=None, metadata_cache=MetadataIndex({}))
+
+    def failing_scan(config, namespaces, engine, emit, *args):
+        emit({"rule": "rule1", "details": None, "status": "FAILED", "target": "a"})
+        raise Exception("connection reset")
+
+    with patch("internal.opa.opa_engine.OpaEngine", return_value=engine), \
+         patch("cli.analyze._analyze_github", side_effect=failing_scan):
+        result = CliRunner().invoke(analyze, ["--token", "t", "--org", "test-org", "--output-format", "json",
+                                              "--no-policy-cache"])
+
+    assert result.exit_code == 1
+    # The violations emitted before the failure still form a complete JSON array on stdout
+    assert [v["rule"] for v in json.loads(result.stdout)] == ["rule1"]
+    assert "Error during analysis: connection reset" in result.stderr
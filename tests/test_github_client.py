@@ -0,0 +1,319 @@
+import time
+from unittest.mock import MagicMock, patch
+from internal.clients.github_client import GitHubClient
+from internal.clients.rate_limiter import RateLimitScheduler
+
+def _response(status_code, headers=None, body=None, text=""):
+    response = MagicMock(status_code=status_code, headers=headers or {}, text=text)
+    response.json.return_value = body
+    return response
+
+def test_client_uses_pooled_retrying_session():
+    client = GitHubClient("token", pool_size=32, max_retries=4)
+    adapter = client.session.get_adapter("https://api.github.com")
+    assert adapter._pool_maxsize == 32
+    assert adapter.max_retries.total == 4
+    assert 502 in adapter.max_retries.status_forcelist
+    assert client.session.headers["Authorization"] == "Bearer token"
+
+def test_client_honors_retry_after_on_secondary_rate_limit():
+    client = GitHubClient("token")
+    client.scheduler.pause = MagicMock()
+    client.session.request = MagicMock(side_effect=[
+        _response(403, headers={"Retry-After": "7"}),
+        _response(200, body={"ok": True}),
+    ])
+
+    assert client._get_rest("/orgs/test-org/hooks") == {"ok": True}
+    client.scheduler.pause.assert_called_once_with("rest", 7)
+
+def test_client_does_not_retry_permission_errors():
+    client = GitHubClient("token")
+    client.scheduler.pause = MagicMock()
+    client.session.request = MagicMock(return_value=_response(403, text="Resource not accessible by integration"))
+
+    assert client._get_rest("/orgs/test-org/hooks") is None
+    assert client.session.request.call_count == 1
+    client.scheduler.pause.assert_not_called()
+
+def test_repositories_security_settings_maps_to_rest_shape():
+    client = GitHubClient("token")
+    client.session.request = MagicMock(return_value=_response(200, body={
+        "data": {"nodes": [
+            {"id": "R_1", "hasVulnerabilityAlertsEnabled": True,
+             "rulesets": {"pageInfo": {"hasNextPage": False}, "nodes": [
+                 {"id": "RRS_1", "databaseId": 42, "name": "main", "target": "BRANCH", "enforcement": "ACTIVE",
+                  "createdAt": "2024-01-01T00:00:00Z", "updatedAt": "2024-01-02T00:00:00Z",
+                  "source": {"__typename": "Organization", "login": "test-org"}}]}},
+            {"id": "R_2", "hasVulnerabilityAlertsEnabled": None, "rulesets": None},
+        ]},
+        "errors": [{"path": ["nodes", 1, "hasVulnerabilityAlertsEnabled"], "message": "Must have admin rights"}],
+    }))
+
+    settings = client.get_repositories_security_settings(["R_1", "R_2"])
+
+    assert settings["R_1"]["vulnerability_alerts_enabled"] is True
+    assert settings["R_1"]["rules_set"] == [{
+        "id": 42, "node_id": "RRS_1", "name": "main", "target": "branch", "source_type": "Organization",
+        "source": "test-org", "enforcement": "active",
+        "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-02T00:00:00Z",
+    }]
+    assert settings["R_2"] == {"vulnerability_alerts_enabled": None, "rules_set": None}
+
+def test_get_repositories_by_name_batches_aliased_lookups():
+    client = GitHubClient("token")
+    client.session.request = MagicMock(side_effect=[
+        _response(200, body={
+            "data": {**{f"r{i}": {"name": f"repo{i}", "id": f"R_{i}"} for i in range(20)}},
+        }),
+        _response(200, body={
+            "data": {"r0": {"name": "repo20", "id": "R_20"}, "r1": None},
+            "errors": [{"type": "NOT_FOUND", "path": ["r1"], "message": "Could not resolve to a Repository"}],
+        }),
+    ])
+
+    names = [f"test-org/repo{i}" for i in range(21)] + ["other-org/missing"]
+    found = client.get_repositories_by_name(names)
+
+    # 22 repositories, 20 aliases per query
+    assert client.session.request.call_count == 2
+    first_query = client.session.request.call_args_list[0].kwargs["json"]
+    assert "r19: repository(owner: $owner19, name: $name19)" in first_query["query"]
+    assert "fragment RepositoryFields on Repository" in first_query["query"]
+    assert first_query["variables"]["owner0"] == "test-org" and first_query["variables"]["name0"] == "repo0"
+    assert found["test-org/repo20"]["id"] == "R_20"
+    assert "other-org/missing" not in found
+    assert len(found) == 21
+
+@patch("internal.clients.rate_limiter.time.sleep")
+@patch("internal.clients.rate_limiter.time.time", return_value=1000.0)
+def test_scheduler_sleeps_until_reset_when_exhausted(mock_time, mock_sleep):
+    scheduler = RateLimitScheduler(max_concurrency=8)
+    scheduler.update_from_headers("rest", {"X-RateLimit-Remaining": "0", "X-RateLimit-Limit": "5000", "X-RateLimit-Reset": "1030"})
+
+    def advance(seconds):
+        mock_time.return_value += seconds
+    mock_sleep.side_effect = advance
+
+    with scheduler.slot("rest"):
+        pass
+    mock_sleep.assert_called_once_with(30.0)
+    # The GraphQL budget is tracked separately and was never blocked
+    with scheduler.slot("graphql"):
+        pass
+    assert mock_sleep.call_count == 1
+
+def test_scheduler_adapts_concurrency_and_pacing_to_budget():
+    scheduler = RateLimitScheduler(max_concurrency=8)
+    assert scheduler.concurrency_limit("rest") == 8
+
+    reset_at = time.time() + 1000
+    scheduler.update_from_headers("rest", {"X-RateLimit-Remaining": "4000", "X-RateLimit-Limit": "5000", "X-RateLimit-Reset": str(reset_at)})
+    assert scheduler.concurrency_limit("rest") == 8
+    assert scheduler._pacing_interval(scheduler.budgets["rest"], time.time()) == 0.0
+
+    scheduler.update_from_headers("rest", {"X-RateLimit-Remaining": "500", "X-RateLimit-Limit": "5000", "X-RateLimit-Reset": str(reset_at)})
+    assert scheduler.concurrency_limit("rest") == 2
+    # 500 requests left for ~1000 seconds: one every ~2 seconds
+    assert 1.9 < scheduler._pacing_interval(scheduler.budgets["rest"], time.time()) <= 2.0
+
+def test_rest_responses_are_served_from_etag_cache(tmp_path):
+    client = GitHubClient("token", cache_dir=str(tmp_path))
+    client.session.request = MagicMock(return_value=_response(200, headers={"ETag": 'W/"abc"'}, body={"enabled": True}))
+    assert client.get_actions_permissions("test-org", "repo") == {"enabled": True}
+
+    # A later run sends the validator and gets a 304 with no body
+    client = GitHubClient("token", cache_dir=str(tmp_path))
+    client.session.request = MagicMock(return_value=_response(304))
+    assert client.get_actions_permissions("test-org", "repo") == {"enabled": True}
+    assert client.session.request.call_args[1]["headers"]["If-None-Match"] == 'W/"abc"'
+    assert client.response_cache.hits == 1
+    assert client.response_cache.hit_ratio() == 1.0
+
+    # Entries are not shared between tokens
+    other = GitHubClient("other-token", cache_dir=str(tmp_path))
+    other.session.request = MagicMock(return_value=_response(200, body={"enabled": False}))
+    assert other.get_actions_permissions("test-org", "repo") == {"enabled": False}
+    assert "If-None-Match" not in other.session.request.call_args[1]["headers"]
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    import os
+    from internal.clients.response_cache import ResponseCache
+    cache = ResponseCache(str(tmp_path), "token", max_bytes=1000)
+    for i in range(10):
+        cache.store(f"https://api.github.com/{i}", {"ETag": str(i)}, {"data": "x" * 100})
+        os.utime(cache.disk._path(cache._key(f"https://api.github.com/{i}")), (i, i))
+
+    assert cache.disk.size <= 1000
+    assert cache.disk.evictions > 0
+    assert cache.get("https://api.github.com/0") is None
+    assert cache.get("https://api.github.com/9") is not None
+
+def test_list_repos_streams_minimal_paginated_listing():
+    import json
+    from click.testing import CliRunner
+    from cli.list_repos import list_repos
+
+    def page(names, has_next, cursor):
+        return _response(200, body={"data": {"organization": {"repositories": {
+            "pageInfo": {"hasNextPage": has_next, "endCursor": cursor},
+            "nodes": [{"name": n, "nameWithOwner": f"test-org/{n}", "url": f"https://github.com/test-org/{n}",
+                       "isPrivate": False, "pushedAt": None} for n in names],
+        }}}})
+
+    with patch("requests.Session.request", side_effect=[page(["a", "b"], True, "c1"), page(["c"], False, None)]) as request:
+        result = CliRunner().invoke(list_repos, ["--token", "t", "--org", "test-org", "--format", "json"])
+
+    assert [r["full_name"] for r in json.loads(result.output)] == ["test-org/a", "test-org/b", "test-org/c"]
+    first_query = request.call_args_list[0].kwargs["json"]
+    assert "repositories(first: 100" in first_query["query"]
+    assert "collaborators" not in first_query["query"]
+    assert request.call_args_list[1].kwargs["json"]["variables"]["cursor"] == "c1"
+
+def test_list_repos_closes_streamed_listing_when_a_page_fails():
+    import json
+    from click.testing import CliRunner
+    from cli.list_repos import list_repos
+
+    first_page = _response(200, body={"data": {"organization": {"repositories": {
+        "pageInfo": {"hasNextPage": True, "endCursor": "c1"},
+        "nodes": [{"name": "a", "nameWithOwner": "test-org/a", "url": "https://github.com/test-org/a",
+                   "isPrivate": False, "pushedAt": None}],
+    }}}})
+    with patch("requests.Session.request", side_effect=[first_page, Exception("connection reset")]):
+        result = CliRunner().invoke(list_repos, ["--token", "t", "--org", "test-org", "--format", "json"])
+
+    assert result.exit_code == 1
+    assert [r["full_name"] for r in json.loads(result.stdout)] == ["test-org/a"]
+    assert "connection reset" in result.stderr
+
+def test_missing_scope_short_circuits_endpoint_class_for_the_org():
+    client = GitHubClient("token")
+    client.session.request = MagicMock(return_value=_response(
+        403, headers={"X-OAuth-Scopes": "read:org", "X-Accepted-OAuth-Scopes": "repo"}, text="Forbidden"))
+
+    for i in range(50):
+        assert client.get_repository_secrets("test-org", f"repo{i}") == []
+
+    # One failing call, then every other repository is skipped
+    assert client.session.request.call_count == 1
+    assert client.negative_cache.report() == [
+        "Skipped 49 calls to /repos/{repo}/actions/secrets in test-org: 403 Forbidden, token lacks one of the scopes: repo"
+    ]
+
+def test_missing_scope_of_one_pooled_token_hands_calls_to_the_others():
+    from internal.clients.credentials import PersonalAccessToken
+
+    client = GitHubClient("token-a", credentials=[PersonalAccessToken("token-b")])
+    def request(method, url, headers=None, **kwargs):
+        if headers["Authorization"] == "Bearer token-a":
+            return _response(403, headers={"X-OAuth-Scopes": "read:org", "X-Accepted-OAuth-Scopes": "repo"},
+                             text="Forbidden")
+        return _response(200, body={"secrets": [{"name": "S"}]})
+    client.session.request = MagicMock(side_effect=request)
+
+    for i in range(5):
+        assert client.get_repository_secrets("test-org", f"repo{i}") == [{"name": "S"}]
+
+    used = [call.kwargs["headers"]["Authorization"] for call in client.session.request.call_args_list]
+    # token-a is only tried once; token-b still has access, so nothing is skipped
+    assert used == ["Bearer token-a"] + ["Bearer token-b"] * 5
+    assert client.negative_cache.report() == []
+
+def test_per_repository_failures_only_block_after_threshold_without_success():
+    from internal.clients.negative_cache import NegativeResultCache
+
+    client = GitHubClient("token")
+    client.negative_cache = NegativeResultCache(threshold=3)
+    client.session.request = MagicMock(side_effect=[
+        _response(200, body={"enabled": True}),
+        *[_response(404, text="Not Found") for _ in range(5)],
+    ])
+    for i in range(6):
+        client.get_actions_permissions("test-org", f"repo{i}")
+    # Succeeded once, so the 404s are per-repository results and never block
+    assert client.session.request.call_count == 6
+
+    client.session.request = MagicMock(return_value=_response(403, text="Must have admin rights"))
+    for i in range(10):
+        client.get_actions_permissions("other-org", f"repo{i}")
+    assert client.session.request.call_count == 3
+
+def test_token_scope_parsing():
+    from internal.clients.negative_cache import parse_scopes, missing_scopes
+
+    assert parse_scopes("[read:org,repo]") == {"read:org", "repo"}
+    assert parse_scopes("repo, admin:org") == {"repo", "admin:org"}
+    assert missing_scopes({"read:org", "repo"}, {"admin:org", "repo"}) == set()
+    assert missing_scopes({"admin:org_hook", "repo"}, {"repo"}) == {"admin:org_hook"}
+    assert missing_scopes({"read:repo_hook", "admin:repo_hook"}, {"repo"}) == set()
+
+def test_token_scope_check_only_covers_evaluated_policies(capsys):
+    from cli.analyze import _check_token_scopes
+    from internal.opa.policy_metadata import MetadataIndex
+    from internal.opa.skipper import Skipper
+
+    client = MagicMock()
+    client.get_token_scopes.return_value = {"repo", "read:org", "admin:org_hook"}
+    engine = MagicMock(metadata_cache=MetadataIndex.from_policies("policies/github"))
+
+    _check_token_scopes(client, engine, Skipper(None), ["organization", "repository", "member"])
+    warnings = capsys.readouterr().err
+    # Hook policies are covered by repo, and enterprise policies are not part of the scan
+    assert "repo_hook" not in warnings
+    assert "admin:enterprise" not in warnings
+    assert "'admin:org'" in warnings
+
+def test_credential_pool_spreads_requests_by_remaining_budget():
+    from internal.clients.credentials import PersonalAccessToken
+
+    client = GitHubClient("token-a", credentials=[PersonalAccessToken("token-b"), PersonalAccessToken("token-c", "org-c")])
+    client.session.request = MagicMock(side_effect=[
+        _response(200, headers={"X-RateLimit-Remaining": "100", "X-RateLimit-Limit": "5000"}, body={}),
+        _response(200, headers={"X-RateLimit-Remaining": "4000", "X-RateLimit-Limit": "5000"}, body={}),
+        _response(200, body={}),
+        _response(200, body={}),
+    ])
+    for i in range(3):
+        client.get_actions_permissions("test-org", f"repo{i}")
+    used = [call.kwargs["headers"]["Authorization"] for call in client.session.request.call_args_list]
+    # The org-bound token is never used for another org, and token-a is left alone once it runs low
+    assert used == ["Bearer token-a", "Bearer token-b", "Bearer token-b"]
+
+    client.get_actions_permissions("org-c", "repo")
+    assert client.session.request.call_args.kwargs["headers"]["Authorization"] == "Bearer token-c"
+
+def test_rate_limited_credential_hands_over_to_the_next_one():
+    from internal.clients.credentials import PersonalAccessToken
+
+    client = GitHubClient("token-a", credentials=[PersonalAccessToken("token-b")])
+    client.session.request = MagicMock(side_effect=[
+        _response(403, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(time.time() + 600)}),
+        _response(200, body={"ok": True}),
+    ])
+
+    assert client._get_rest("/orgs/test-org/hooks") == {"ok": True}
+    used = [call.kwargs["headers"]["Authorization"] for call in client.session.request.call_args_list]
+    assert used == ["Bearer token-a", "Bearer token-b"]
+
+def test_app_installation_refreshes_its_token_before_expiry():
+    from internal.clients.credentials import AppInstallation
+
+    session = MagicMock()
+    session.request.side_effect = [
+        _response(201, body={"token": "ghs_1", "expires_at": "2030-01-01T00:00:00Z"}),
+        _response(201, body={"token": "ghs_2", "expires_at": "2030-01-01T01:00:00Z"}),
+        _response(200, body={"account": {"login": "Test-Org"}}),
+    ]
+    app = AppInstallation("1", "42", "key", session=session)
+    app._app_jwt = MagicMock(return_value="jwt")
+
+    with patch("internal.clients.credentials.time.time", return_value=1000.0):
+        assert app.get_token() == "ghs_1"
+        assert app.get_token() == "ghs_1"
+    # Within the refresh margin of the expiry
+    with patch("internal.clients.credentials.time.time", return_value=1893456000.0 - 60):
+        assert app.get_token() == "ghs_2"
+    assert session.request.call_args_list[0].args == ("POST", "https://api.github.com/app/installations/42/access_tokens")
+
+    assert app.can_access("test-org") and not app.can_access("other-org") and not app.can_access(None)
@@ -0,0 +1,70 @@
+import os
+import shutil
+import pytest
+from internal.opa.wasm_engine import HOST_BUILTINS, EvalContext, _parse_rfc3339_ns, _time_diff, _time_format
+
+POLICIES_PATH = os.path.join(os.path.dirname(__file__), '..', 'policies', 'github')
+
+def test_parse_rfc3339_ns():
+    assert _parse_rfc3339_ns("1970-01-01T00:00:01Z") == 1_000_000_000
+    assert _parse_rfc3339_ns("1970-01-01T00:00:00.5Z") == 500_000_000
+    assert _parse_rfc3339_ns("1970-01-01T02:00:00+02:00") == 0
+    with pytest.raises(ValueError):
+        _parse_rfc3339_ns("yesterday")
+
+def test_time_diff_matches_opa():
+    jan_31 = _parse_rfc3339_ns("2023-01-31T12:00:00Z")
+    mar_01 = _parse_rfc3339_ns("2023-03-01T11:00:00Z")
+    # Borrowing uses the length of the earlier month, like Go's time.diff
+    assert _time_diff(mar_01, jan_31) == [0, 1, 0, 23, 0, 0]
+    assert _time_diff(jan_31, mar_01) == _time_diff(mar_01, jan_31)
+    assert _time_diff(jan_31, jan_31) == [0, 0, 0, 0, 0, 0]
+
+def test_time_format():
+    assert _time_format(0) == "1970-01-01T00:00:00Z"
+    assert _time_format(1_500_000_000) == "1970-01-01T00:00:01.5Z"
+
+def test_now_ns_is_fixed_per_evaluation():
+    ctx = EvalContext()
+    assert HOST_BUILTINS["time.now_ns"](ctx) == HOST_BUILTINS["time.now_ns"](ctx)
+
+PARITY_INPUTS = {
+    "repository": [
+        {"repository": {"name": "unprotected", "is_archived": False, "pushed_at": "2020-01-01T00:00:00Z", "default_branch": None},
+         "hooks": [{"name": "web", "url": "http://example.com", "config": {"insecure_ssl": "1"}}],
+         "collaborators": [{"login": f"user{i}", "permissions": {"admin": True}} for i in range(5)]},
+        {"repository": {"name": "protected", "is_archived": False, "pushed_at": "2999-01-01T00:00:00Z",
+                        "default_branch": {"name": "main", "branch_protection_rule": {"requires_status_checks": True, "required_approving_review_count": 2}}},
+         "hooks": [], "collaborators": [], "vulnerability_alerts_enabled": True,
+         "actions_token_permissions": {"default_workflow_permissions": "read"}, "rules_set": []},
+    ],
+    "organization": [
+        {"organization": {"login": "org", "two_factor_requirement_enabled": False}, "hooks": [], "saml_enabled": False},
+    ],
+    "member": [
+        {"members": [{"login": "admin", "is_admin": True, "last_active": -1}, {"login": "dev", "is_admin": False, "last_active": -1}]},
+    ],
+    "actions": [
+        {"actions": {"actions_permissions": {"enabled_repositories": "all", "allowed_actions": "all"}, "token_permissions": {"default_workflow_permissions": "write"}}},
+    ],
+    "runner_group": [
+        {"runner_group": {"name": "Default", "allows_public_repositories": True, "restricted_to_workflows": False}},
+    ],
+}
+
+@pytest.mark.skipif(not shutil.which("opa"), reason="OPA binary not installed")
+@pytest.mark.parametrize("package", sorted(PARITY_INPUTS))
+def test_wasm_matches_subprocess(package, tmp_path):
+    pytest.importorskip("wasmtime")
+    from internal.opa.opa_engine import OpaEngine
+
+    subprocess_engine = OpaEngine(POLICIES_PATH)
+    wasm_engine = OpaEngine(POLICIES_PATH, mode="wasm", cache_dir=str(tmp_path))
+
+    def normalized(violations):
+        return sorted(violations, key=lambda v: (v["rule"], repr(v["details"])))
+
+    for input_data in PARITY_INPUTS[package]:
+        expected = normalized(subprocess_engine.eval(input_data, package=package))
+        actual = normalized(wasm_engine.eval(input_data, package=package))
+        assert actual == expected